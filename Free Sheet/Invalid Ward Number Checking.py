@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 import arcpy
 import os
+import sys
+# The validator suite lives in the repository root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mdb_validator.scanner import scan_folder
 import re
 import csv
 import Tkinter as tk
@@ -94,12 +98,8 @@ def extract_ward_code_from_filename(filename):
 
 def find_mdb_files(folder):
     """Recursively find all .mdb files in a directory."""
-    mdb_files = []
-    for root, _, files in os.walk(folder):
-        for file in files:
-            if file.lower().endswith('.mdb'):
-                mdb_files.append(os.path.join(root, file))
-    return mdb_files
+    # Same scan as the validator suite, without its default exclusions
+    return scan_folder(folder, (".mdb",), exclude=None)
 
 
 def check_and_report(input_folder):
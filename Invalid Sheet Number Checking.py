@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import os
+from mdb_validator.scanner import scan_folder
 import arcpy
 import csv
 
@@ -12,19 +13,8 @@ dict_scale = {
 
 
 def find_mdb_files(directory, exception):
-    mdb_files = []
-    # Get mdb_validator .mdb files
-    for root, dirnames, filenames in os.walk(directory):
-        if any(x in root.lower() for x in exception):  # Skip directories in exception list
-            continue  # Use continue instead of break
-
-        dirnames[:] = [d for d in dirnames if not any(x in os.path.join(root, d).lower() for x in exception)]  # Exclude subdirectories
-
-        for filename in filenames:
-            if filename.endswith('.mdb') and not any(x in os.path.join(root, filename).lower() for x in exception):  # Ensure files are excluded
-                mdb_files.append(os.path.join(root, filename))
-
-    return mdb_files
+    # Same scan as the validator suite: skips every path containing an exception entry
+    return scan_folder(directory, (".mdb",), exclude=["*{}*".format(x.lower()) for x in exception])
 
 
 # Function to check data and generate a report
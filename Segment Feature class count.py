@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import arcpy
 import os
+from mdb_validator.scanner import scan_folder
 import csv
 import codecs
 import Tkinter as tk
@@ -51,15 +52,8 @@ def process_segments_mdb_files():
 
 # Function to find .mdb files
 def find_mdb_files(directory, exception):
-    mdb_files = []
-    for root, dirnames, filenames in os.walk(directory):
-        if any(x in root.lower() for x in exception):
-            continue
-        dirnames[:] = [d for d in dirnames if not any(x in os.path.join(root, d).lower() for x in exception)]
-        for filename in filenames:
-            if filename.endswith('.mdb') and not any(x in os.path.join(root, filename).lower() for x in exception):
-                mdb_files.append(os.path.join(root, filename))
-    return mdb_files
+    # Same scan as the validator suite: skips every path containing an exception entry
+    return scan_folder(directory, (".mdb",), exclude=["*{}*".format(x.lower()) for x in exception])
 
 
 # GUI Setup
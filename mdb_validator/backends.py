@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import numpy as np
+from geometry import from_wkb, from_gpkg_blob
+from logs import get_logger
+
+log = get_logger("backends")
+
+arcpy_available = True
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+    arcpy_available = False
+    log.warning("[init] arcpy not found. Only the GeoPackage backend is available.")
+
+# Cursor token returning the geometry as a geometry.Geometry of NumPy arrays, on every backend
+SHAPE_ARRAYS = "SHAPE@ARRAYS"
+
+# Values TableToNumPyArray writes for nulls, masked out again afterwards. Fields of
+# other types (dates, blobs, geometry tokens) are read through a cursor instead.
+NULL_SENTINELS = {
+    "SmallInteger": -32768,
+    "Integer": -2147483648,
+    "Single": float('nan'),
+    "Double": float('nan'),
+    "String": u"\x01",
+}
+NON_NULL_TOKENS = ("OID@", "SHAPE@AREA", "SHAPE@LENGTH")
+
+
+def columns_from_rows(rows, field_count):
+    """Turn cursor rows into one masked object array per field (masked where the value is None)"""
+    rows = list(rows)
+    columns = []
+    for values in (zip(*rows) if rows else [()] * field_count):
+        data = np.empty(len(values), dtype=object)
+        data[:] = values
+        columns.append(np.ma.masked_array(data, mask=np.array([value is None for value in values], dtype=bool)))
+    return columns
+
+
+class ArcpyBackend(object):
+    """Personal geodatabases (.mdb) read through arcpy"""
+    name = "arcpy"
+    file_extensions = (".mdb",)
+    supports_geoprocessing = True
+
+    def list_feature_classes(self, mdb_path):
+        """Every feature class of the MDB, at its root and in its feature datasets"""
+        feature_classes = []
+        arcpy.env.workspace = mdb_path
+        # The root always, even next to feature datasets; get_feature_classes picks what it reads
+        datasets = [""] + (arcpy.ListDatasets() or [])
+        for dataset in datasets:
+            arcpy.env.workspace = os.path.join(mdb_path, dataset) if dataset else mdb_path
+            for fc in arcpy.ListFeatureClasses():
+                full_path = os.path.join(mdb_path, dataset, fc) if dataset else os.path.join(mdb_path, fc)
+                feature_classes.append(self.describe(full_path, fc, dataset))
+        return feature_classes
+
+    def describe(self, full_path, name=None, dataset=""):
+        describe = arcpy.Describe(full_path)
+        extent = describe.extent
+        return {
+            "name": name or os.path.basename(full_path),
+            "dataset": dataset,
+            "path": full_path,
+            "shape_type": describe.shapeType,
+            "extent": [extent.XMin, extent.YMin, extent.XMax, extent.YMax],
+            "fields": [[f.name, f.type] for f in arcpy.ListFields(full_path)],
+            "row_count": int(arcpy.GetCount_management(full_path)[0]),
+        }
+
+    def search_cursor(self, full_path, fields):
+        if SHAPE_ARRAYS not in fields:
+            return arcpy.da.SearchCursor(full_path, fields)
+        return _ArcpyArraysCursor(full_path, fields)
+
+    def read_columns(self, full_path, fields, field_types=None):
+        """Read whole columns with TableToNumPyArray; nulls come back masked"""
+        if field_types is None:
+            field_types = dict((f.name, f.type) for f in arcpy.ListFields(full_path))
+        field_types = dict((name.lower(), field_type) for name, field_type in field_types.items())
+
+        null_values = {}
+        for field in fields:
+            if field.upper() in NON_NULL_TOKENS:
+                continue
+            field_type = field_types.get(field.lower())
+            if field_type not in NULL_SENTINELS:
+                with self.search_cursor(full_path, fields) as cursor:
+                    return columns_from_rows(cursor, len(fields))
+            null_values[field] = NULL_SENTINELS[field_type]
+
+        table = arcpy.da.TableToNumPyArray(full_path, fields, skip_nulls=False, null_value=null_values)
+        columns = []
+        for index, field in enumerate(fields):
+            values = table[table.dtype.names[index]]
+            if field not in null_values:
+                columns.append(np.ma.masked_array(values, mask=np.zeros(len(values), dtype=bool)))
+            elif values.dtype.kind == 'f':
+                columns.append(np.ma.masked_invalid(values))
+            else:
+                columns.append(np.ma.masked_array(values, mask=values == null_values[field]))
+        return columns
+
+    def exists(self, full_path):
+        return arcpy.Exists(full_path)
+
+
+class _ArcpyArraysCursor(object):
+    """SearchCursor that turns the SHAPE@ARRAYS token into a geometry.Geometry via SHAPE@WKB"""
+
+    def __init__(self, full_path, fields):
+        self.index = list(fields).index(SHAPE_ARRAYS)
+        fields = list(fields)
+        fields[self.index] = "SHAPE@WKB"
+        self.cursor = arcpy.da.SearchCursor(full_path, fields)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        del self.cursor
+        return False
+
+    def __iter__(self):
+        index = self.index
+        for row in self.cursor:
+            row = list(row)
+            row[index] = from_wkb(row[index])
+            yield tuple(row)
+
+
+class GeoPackageBackend(object):
+    """GeoPackage exports of the MDBs (one .gpkg per MDB, one table per feature class).
+
+    Geometry is decoded into NumPy arrays; Shape_Area and Shape_Length are computed
+    from it when the export did not keep them, so validators see the same fields as in
+    the personal geodatabase. Field names are matched case-insensitively like in Jet.
+    """
+    name = "geopackage"
+    file_extensions = (".gpkg",)
+    supports_geoprocessing = False
+
+    SHAPE_TYPES = {
+        "POLYGON": "Polygon", "MULTIPOLYGON": "Polygon", "CURVEPOLYGON": "Polygon", "MULTISURFACE": "Polygon",
+        "LINESTRING": "Polyline", "MULTILINESTRING": "Polyline", "MULTICURVE": "Polyline",
+        "POINT": "Point", "MULTIPOINT": "Multipoint",
+    }
+    FIELD_TYPES = {"INTEGER": "Integer", "INT": "Integer", "SMALLINT": "SmallInteger", "MEDIUMINT": "Integer",
+                   "TINYINT": "SmallInteger", "BOOLEAN": "SmallInteger", "REAL": "Double", "DOUBLE": "Double",
+                   "FLOAT": "Single", "TEXT": "String", "DATE": "Date", "DATETIME": "Date", "BLOB": "Blob"}
+    VIRTUAL_FIELDS = ("Shape_Area", "Shape_Length")
+
+    def __init__(self):
+        self._schemas = {}
+
+    def _split(self, full_path):
+        gpkg_path, table = os.path.split(full_path)
+        if not gpkg_path.lower().endswith(".gpkg"):
+            raise ValueError("[geopackage] Not a GeoPackage feature class path: {}".format(full_path))
+        return gpkg_path, table
+
+    def _connect(self, gpkg_path):
+        connection = sqlite3.connect(gpkg_path)
+        # Byte strings on Python 2, like arcpy cursors hand to csv
+        connection.text_factory = str
+        return connection
+
+    def _schema(self, connection, gpkg_path, table):
+        """Columns, primary key and geometry column of a table, cached per path"""
+        key = (gpkg_path, table)
+        if key not in self._schemas:
+            columns = connection.execute('PRAGMA table_info("{}")'.format(table.replace('"', '""'))).fetchall()
+            geometry = connection.execute(
+                "SELECT column_name, geometry_type_name FROM gpkg_geometry_columns WHERE table_name = ?",
+                (table,)).fetchone()
+            self._schemas[key] = {
+                "columns": [(column[1], column[2]) for column in columns],
+                "pk": next((column[1] for column in columns if column[5]), None),
+                "geometry_column": geometry[0] if geometry else None,
+                "geometry_type": geometry[1].upper() if geometry else None,
+            }
+        return self._schemas[key]
+
+    def list_feature_classes(self, gpkg_path):
+        connection = self._connect(gpkg_path)
+        try:
+            tables = connection.execute(
+                "SELECT table_name, min_x, min_y, max_x, max_y FROM gpkg_contents "
+                "WHERE data_type = 'features' ORDER BY table_name").fetchall()
+            return [self._describe(connection, gpkg_path, row[0], row[1:]) for row in tables]
+        finally:
+            connection.close()
+
+    def describe(self, full_path, name=None, dataset=""):
+        gpkg_path, table = self._split(full_path)
+        connection = self._connect(gpkg_path)
+        try:
+            extent = connection.execute(
+                "SELECT min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name = ?", (table,)).fetchone()
+            return self._describe(connection, gpkg_path, table, extent or (None, None, None, None))
+        finally:
+            connection.close()
+
+    def _describe(self, connection, gpkg_path, table, extent):
+        schema = self._schema(connection, gpkg_path, table)
+        shape_type = self.SHAPE_TYPES.get(schema["geometry_type"], schema["geometry_type"])
+
+        canonical = dict((field.lower(), field) for field in self.VIRTUAL_FIELDS)
+        has_objectid = any(column.lower() == "objectid" for column, column_type in schema["columns"])
+
+        fields = []
+        for column, column_type in schema["columns"]:
+            if column == schema["pk"]:
+                fields.append([column if has_objectid else "OBJECTID", "OID"])
+            elif column == schema["geometry_column"]:
+                fields.append(["Shape", "Geometry"])
+            elif column.lower() in canonical:
+                fields.append([canonical[column.lower()], "Double"])
+            else:
+                fields.append([column, self.FIELD_TYPES.get(column_type.split("(")[0].upper(), "String")])
+        names = [name.lower() for name, field_type in fields]
+        if shape_type == "Polygon" and "shape_area" not in names:
+            fields.append(["Shape_Area", "Double"])
+        if shape_type in ("Polygon", "Polyline") and "shape_length" not in names:
+            fields.append(["Shape_Length", "Double"])
+
+        table_sql = '"{}"'.format(table.replace('"', '""'))
+        row_count = connection.execute("SELECT COUNT(*) FROM {}".format(table_sql)).fetchone()[0]
+        if any(value is None for value in extent):
+            extent = self._compute_extent(connection, schema, table_sql)
+
+        return {
+            "name": table,
+            "dataset": "",
+            "path": os.path.join(gpkg_path, table),
+            "shape_type": shape_type,
+            "extent": list(extent),
+            "fields": fields,
+            "row_count": row_count,
+        }
+
+    def _compute_extent(self, connection, schema, table_sql):
+        extent = [float('nan')] * 4
+        if not schema["geometry_column"]:
+            return extent
+        for (blob,) in connection.execute('SELECT "{}" FROM {}'.format(schema["geometry_column"], table_sql)):
+            geometry = from_gpkg_blob(blob)
+            box = geometry.extent if geometry else None
+            if box:
+                extent = [min(extent[0], box[0]) if extent[0] == extent[0] else box[0],
+                          min(extent[1], box[1]) if extent[1] == extent[1] else box[1],
+                          max(extent[2], box[2]) if extent[2] == extent[2] else box[2],
+                          max(extent[3], box[3]) if extent[3] == extent[3] else box[3]]
+        return extent
+
+    def search_cursor(self, full_path, fields):
+        return _GeoPackageCursor(self, full_path, fields)
+
+    def read_columns(self, full_path, fields, field_types=None):
+        """Read whole columns with one fetchall; nulls come back masked"""
+        with self.search_cursor(full_path, fields) as cursor:
+            return columns_from_rows(cursor, len(fields))
+
+    def exists(self, full_path):
+        if full_path.lower().endswith(".gpkg"):
+            return os.path.exists(full_path)
+        try:
+            gpkg_path, table = self._split(full_path)
+        except ValueError:
+            return False
+        if not os.path.exists(gpkg_path):
+            return False
+        connection = self._connect(gpkg_path)
+        try:
+            return connection.execute(
+                "SELECT 1 FROM gpkg_contents WHERE table_name = ?", (table,)).fetchone() is not None
+        finally:
+            connection.close()
+
+
+class _GeoPackageCursor(object):
+    """Read-only cursor over a GeoPackage table yielding tuples like arcpy.da.SearchCursor.
+
+    Supports plain field names plus the OID@, SHAPE@AREA, SHAPE@LENGTH and SHAPE@ARRAYS tokens.
+    """
+
+    def __init__(self, backend, full_path, fields):
+        gpkg_path, table = backend._split(full_path)
+        self.connection = backend._connect(gpkg_path)
+        schema = backend._schema(self.connection, gpkg_path, table)
+        columns = dict((name.lower(), name) for name, column_type in schema["columns"])
+
+        select = []
+        self.getters = []
+        for field in fields:
+            token = field.upper()
+            if token in ("OID@", "OBJECTID") and ("objectid" not in columns or token == "OID@"):
+                select.append(schema["pk"])
+                self.getters.append(("column", len(select) - 1))
+            elif token in ("SHAPE@ARRAYS", "SHAPE@", "SHAPE"):
+                self.getters.append(("geometry", None))
+            elif token in ("SHAPE@AREA", "SHAPE_AREA") and (token == "SHAPE@AREA" or "shape_area" not in columns):
+                self.getters.append(("area", None))
+            elif token in ("SHAPE@LENGTH", "SHAPE_LENGTH") and (token == "SHAPE@LENGTH" or "shape_length" not in columns):
+                self.getters.append(("length", None))
+            elif field.lower() in columns:
+                select.append(columns[field.lower()])
+                self.getters.append(("column", len(select) - 1))
+            else:
+                self.connection.close()
+                raise RuntimeError("Cannot find field '{}' in {}".format(field, full_path))
+
+        self.needs_geometry = any(kind != "column" for kind, _ in self.getters)
+        if self.needs_geometry:
+            select.append(schema["geometry_column"])
+        self.geometry_index = len(select) - 1
+        self.sql = "SELECT {} FROM \"{}\"".format(
+            ", ".join('"{}"'.format(column.replace('"', '""')) for column in select) or "1",
+            table.replace('"', '""'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.close()
+        return False
+
+    def __iter__(self):
+        getters = self.getters
+        for row in self.connection.execute(self.sql):
+            geometry = from_gpkg_blob(row[self.geometry_index]) if self.needs_geometry else None
+            values = []
+            for kind, index in getters:
+                if kind == "column":
+                    values.append(row[index])
+                elif kind == "geometry":
+                    values.append(geometry)
+                elif kind == "area":
+                    values.append(geometry.area if geometry else None)
+                else:
+                    values.append(geometry.length if geometry else None)
+            yield tuple(values)
+
+
+_backends = {}
+_active_backend = None
+
+
+def get_backend(name=None):
+    """Return a backend by name, or the active one (arcpy when available, else GeoPackage)"""
+    global _active_backend
+    if name is None:
+        if _active_backend is None:
+            _active_backend = get_backend("arcpy" if arcpy_available else "geopackage")
+        return _active_backend
+
+    if name not in _backends:
+        if name == "arcpy":
+            if not arcpy_available:
+                raise ValueError("[backends] arcpy is not installed; use the GeoPackage backend")
+            _backends[name] = ArcpyBackend()
+        elif name == "geopackage":
+            _backends[name] = GeoPackageBackend()
+        else:
+            raise ValueError("[backends] Unknown backend: {}".format(name))
+    return _backends[name]
+
+
+def set_backend(name):
+    """Make the named backend the one used by find_mdb_files, get_feature_classes and search_cursor"""
+    global _active_backend
+    _active_backend = get_backend(name)
+    log.info("[backends] Using %s backend", name)
+    return _active_backend
+
+
+def require_geoprocessing(tag):
+    """Raise if the active backend cannot run arcpy geoprocessing tools"""
+    backend = get_backend()
+    if not backend.supports_geoprocessing:
+        raise ValueError("{} Needs arcpy geoprocessing, not available with the {} backend".format(tag, backend.name))
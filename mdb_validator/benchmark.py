@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+"""Time the validators on synthetic cadastral data: python -m mdb_validator.benchmark [options].
+
+Each synthetic MDB holds a grid of square parcels with constructions and boundary
+segments, plus a known number of injected defects (bad ward, sheet and parcel
+numbers, suspicious flags, duplicate and overlapping parcels, small areas, duplicate
+constructions and segments, keys repeated across MDBs). Datasets are written as
+GeoPackages, or as personal geodatabases through arcpy with --backend arcpy.
+
+Every validator is timed end to end through run_validation and then stage by stage
+(prepare_validation, validate_mdb per MDB, finish_validation). The timings, row and
+finding counts and the dataset description are written as JSON.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import random
+import shutil
+import struct
+import sqlite3
+import argparse
+import platform
+import tempfile
+from backends import arcpy, arcpy_available, set_backend
+from utils import find_mdb_files
+from progress import Tally, set_reporter
+from engine import SinglePassEngine
+from parallel import ParallelValidationRunner
+from jobs import VALIDATORS, SCALES, GRIDSHEETS, TOLERANCES, create_validators, configure_validator
+
+SCALE_PREFIXES = {"500": "5554", "600": "5553", "1200": "5555", "1250": "5556",
+                  "2400": "5557", "2500": "5558", "4800": "5559"}
+
+PARCEL_FIELDS = [("WARDNO", "INTEGER"), ("GRIDS1", "TEXT"), ("PARCELNO", "INTEGER"), ("suspicious", "TEXT")]
+CONSTRUCTION_FIELDS = [("ParFID", "INTEGER")]
+SEGMENT_FIELDS = [("ParFID", "INTEGER")]
+
+# Largest move of a grid node, as a share of the parcel size
+NODE_JITTER = 0.15
+
+# Defect kinds injected into every MDB, each defect_rate of the parcels (at least one)
+DEFECTS = ["bad_ward", "bad_sheet", "bad_parcel_no", "suspicious", "duplicate_parcels", "overlaps",
+           "small_areas", "duplicate_constructions", "duplicate_segments", "cross_mdb_duplicates"]
+
+
+def _square(x, y, size):
+    return [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+
+
+def _edges(ring):
+    return [[ring[i], ring[i + 1]] for i in range(len(ring) - 1)]
+
+
+def build_mdb_tables(mdb_index, rows, cols, parcel_size, defect_rate, scale, construction_rate, rng,
+                     reference_keys=None):
+    """Tables of one synthetic MDB as {name: (shape type, fields, [(values, coordinates)])}, defect counts
+    and the keys of its parcels that got no defect (to repeat in other MDBs)"""
+    ward = mdb_index % 9 + 1
+    grids1 = "{}{:03d}".format(SCALE_PREFIXES[scale], mdb_index)
+    x0 = mdb_index * (cols + 2) * parcel_size
+    count = rows * cols
+    defects = max(1, int(count * defect_rate)) if defect_rate > 0 else 0
+    injected = dict((kind, 0) for kind in DEFECTS)
+
+    # Grid nodes shared by neighbouring parcels, moved a little so parcels tile without
+    # being identical squares (equal edge lengths would all count as duplicate segments)
+    jitter = parcel_size * NODE_JITTER
+    nodes = {}
+    for row in range(rows + 1):
+        for col in range(cols + 1):
+            nodes[(row, col)] = (x0 + col * parcel_size + rng.uniform(-jitter, jitter),
+                                 row * parcel_size + rng.uniform(-jitter, jitter))
+
+    parcels = []
+    for row in range(rows):
+        for col in range(cols):
+            ring = [nodes[(row, col)], nodes[(row, col + 1)], nodes[(row + 1, col + 1)], nodes[(row + 1, col)],
+                    nodes[(row, col)]]
+            parcels.append([[ward, grids1, len(parcels) + 1, ""], ring])
+
+    defective = set()
+
+    def pick(kind):
+        chosen = rng.sample(range(count), min(defects, count))
+        injected[kind] += len(chosen)
+        defective.update(chosen)
+        return chosen
+
+    for index in pick("bad_ward"):
+        parcels[index][0][0] = 12
+    for index in pick("bad_sheet"):
+        parcels[index][0][1] = "9999{:03d}".format(mdb_index)
+    for index in pick("bad_parcel_no"):
+        parcels[index][0][2] = 10000 + index
+    for index in pick("suspicious"):
+        parcels[index][0][3] = "YES"
+
+    # Copies of existing parcels: same key, stacked on the original
+    for index in pick("duplicate_parcels"):
+        parcels.append([list(parcels[index][0]), list(parcels[index][1])])
+    # New parcels shifted half a parcel, overlapping two neighbours
+    next_number = count + 1
+    for index in pick("overlaps"):
+        x = x0 + index % cols * parcel_size
+        y = index // cols * parcel_size
+        parcels.append([[ward, grids1, next_number, ""], _square(x + parcel_size / 2.0, y, parcel_size)])
+        next_number += 1
+    # 1 x 1 m parcels in a row below the grid
+    for position in range(len(pick("small_areas"))):
+        parcels.append([[ward, grids1, next_number, ""], _square(x0 + position * 2.0, -2 * parcel_size, 1.0)])
+        next_number += 1
+    # Keys of the first MDB's parcels, on new parcels above the grid
+    if reference_keys:
+        for position, key in enumerate(rng.sample(reference_keys, min(defects, len(reference_keys)))):
+            parcels.append([list(key) + [""],
+                            _square(x0 + position * parcel_size, (rows + 1) * parcel_size, parcel_size)])
+            injected["cross_mdb_duplicates"] += 1
+
+    constructions = []
+    segments = []
+    for fid, (values, ring) in enumerate(parcels[:count], start=1):
+        if rng.random() < construction_rate:
+            # Inside the parcel whatever the node jitter
+            x = x0 + (fid - 1) % cols * parcel_size
+            y = (fid - 1) // cols * parcel_size
+            margin = parcel_size * 0.3
+            constructions.append(([fid], _square(x + margin, y + margin, parcel_size * 0.4)))
+        for edge in _edges(ring):
+            segments.append(([fid], edge))
+    if constructions:
+        for index in rng.sample(range(len(constructions)), min(defects, len(constructions))):
+            constructions.append(constructions[index])
+            injected["duplicate_constructions"] += 1
+    for index in rng.sample(range(len(segments)), min(defects, len(segments))):
+        segments.append(segments[index])
+        injected["duplicate_segments"] += 1
+
+    tables = {
+        "Parcel": ("Polygon", PARCEL_FIELDS, [(values, ring) for values, ring in parcels]),
+        "Construction": ("Polygon", CONSTRUCTION_FIELDS, constructions),
+        "Segments": ("Polyline", SEGMENT_FIELDS, segments),
+    }
+    clean_keys = [tuple(parcels[index][0][:3]) for index in range(count) if index not in defective]
+    return tables, injected, clean_keys
+
+
+def _wkb(shape_type, coordinates):
+    points = b"".join(struct.pack('<dd', x, y) for x, y in coordinates)
+    if shape_type == "Polygon":
+        return struct.pack('<BII', 1, 3, 1) + struct.pack('<I', len(coordinates)) + points
+    return struct.pack('<BII', 1, 2, len(coordinates)) + points
+
+
+def write_geopackage(path, tables):
+    """Write the tables as a GeoPackage with one feature table each (undefined Cartesian SRS)"""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA application_id = 1196444487")
+        connection.execute("PRAGMA user_version = 10200")
+        connection.execute("CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, "
+                           "organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, "
+                           "definition TEXT NOT NULL, description TEXT)")
+        connection.execute("INSERT INTO gpkg_spatial_ref_sys VALUES "
+                           "('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', NULL)")
+        connection.execute("CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, "
+                           "data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '', "
+                           "last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')), "
+                           "min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER)")
+        connection.execute("CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, "
+                           "geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, "
+                           "m TINYINT NOT NULL, PRIMARY KEY (table_name, column_name))")
+
+        header = b"GP" + struct.pack('<BBi', 0, 1, -1)
+        for name, (shape_type, fields, rows) in sorted(tables.items()):
+            coordinates = [point for values, ring in rows for point in ring] or [(0.0, 0.0)]
+            extent = (min(x for x, y in coordinates), min(y for x, y in coordinates),
+                      max(x for x, y in coordinates), max(y for x, y in coordinates))
+            connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, min_x, min_y, max_x, "
+                               "max_y, srs_id) VALUES (?, 'features', ?, ?, ?, ?, ?, -1)", (name, name) + extent)
+            connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, -1, 0, 0)",
+                               (name, "POLYGON" if shape_type == "Polygon" else "LINESTRING"))
+            columns = ", ".join('"{}" {}'.format(field, field_type) for field, field_type in fields)
+            connection.execute('CREATE TABLE "{}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom BLOB, {})'.format(
+                name, columns))
+            connection.executemany(
+                'INSERT INTO "{}" (geom, {}) VALUES (?, {})'.format(
+                    name, ", ".join('"{}"'.format(field) for field, field_type in fields),
+                    ", ".join("?" for field in fields)),
+                ([sqlite3.Binary(header + _wkb(shape_type, ring))] + list(values) for values, ring in rows))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def write_personal_gdb(path, tables):
+    """Write the tables as feature classes of a new personal geodatabase"""
+    if arcpy.Exists(path):
+        arcpy.Delete_management(path)
+    arcpy.CreatePersonalGDB_management(os.path.dirname(path), os.path.basename(path))
+    field_types = {"INTEGER": "LONG", "TEXT": "TEXT"}
+    for name, (shape_type, fields, rows) in sorted(tables.items()):
+        arcpy.CreateFeatureclass_management(path, name, "POLYGON" if shape_type == "Polygon" else "POLYLINE")
+        full_path = os.path.join(path, name)
+        for field, field_type in fields:
+            arcpy.AddField_management(full_path, field, field_types[field_type])
+        with arcpy.da.InsertCursor(full_path, [field for field, field_type in fields] + ["SHAPE@"]) as cursor:
+            for values, ring in rows:
+                points = arcpy.Array([arcpy.Point(x, y) for x, y in ring])
+                shape = arcpy.Polygon(points) if shape_type == "Polygon" else arcpy.Polyline(points)
+                cursor.insertRow(list(values) + [shape])
+
+
+def generate_dataset(folder, mdbs=4, rows=40, cols=40, parcel_size=20.0, defect_rate=0.01, scale="500",
+                     construction_rate=0.5, seed=1, backend_name="geopackage"):
+    """Write mdbs synthetic MDBs (GeoPackages for the geopackage backend) into folder; return their description"""
+    rng = random.Random(seed)
+    extension = ".gpkg" if backend_name == "geopackage" else ".mdb"
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    start = time.time()
+    injected = dict((kind, 0) for kind in DEFECTS)
+    features = {}
+    reference_keys = None
+    for mdb_index in range(mdbs):
+        tables, mdb_injected, clean_keys = build_mdb_tables(mdb_index, rows, cols, parcel_size, defect_rate, scale,
+                                                construction_rate, rng, reference_keys)
+        if reference_keys is None:
+            reference_keys = clean_keys
+        path = os.path.join(folder, "Synthetic_{:04d}{}".format(mdb_index + 1, extension))
+        if backend_name == "geopackage":
+            write_geopackage(path, tables)
+        else:
+            write_personal_gdb(path, tables)
+        for kind, count in mdb_injected.items():
+            injected[kind] += count
+        for name, (shape_type, fields, table_rows) in tables.items():
+            features[name] = features.get(name, 0) + len(table_rows)
+
+    return {
+        "folder": folder,
+        "backend": backend_name,
+        "mdbs": mdbs,
+        "grid": [rows, cols],
+        "parcel_size": parcel_size,
+        "defect_rate": defect_rate,
+        "scale": scale,
+        "seed": seed,
+        "features": features,
+        "injected": injected,
+        "generate_seconds": time.time() - start,
+    }
+
+
+class _Quiet(object):
+    """Send the validators' console output to the null device while timing them"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            self.stdout = sys.stdout
+            self.devnull = open(os.devnull, 'w')
+            sys.stdout = self.devnull
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled:
+            sys.stdout = self.stdout
+            self.devnull.close()
+        return False
+
+
+def _timed_run(job):
+    """(seconds, rows, findings, error) of one run_validation"""
+    tally = Tally()
+    set_reporter(tally)
+    start = time.time()
+    error = None
+    try:
+        job.run_validation()
+    except Exception as e:
+        error = str(e)
+    finally:
+        set_reporter(None)
+    return time.time() - start, tally.rows, tally.findings, error
+
+
+def time_stages(validator, folder):
+    """Seconds spent in prepare_validation, in validate_mdb per MDB and in finish_validation"""
+    stages = {}
+    start = time.time()
+    validator.prepare_validation()
+    stages["prepare"] = time.time() - start
+
+    mdb_files = find_mdb_files(folder)
+    scratch = tempfile.mkdtemp(prefix="mdb_validator_benchmark_")
+    per_mdb = []
+    results = []
+    try:
+        for mdb in mdb_files:
+            with open(os.path.join(scratch, "stage.csv"), 'wb') as f:
+                writer = csv.writer(f) if validator.report_name else None
+                start = time.time()
+                try:
+                    results.append(validator.validate_mdb(mdb, writer))
+                finally:
+                    per_mdb.append(time.time() - start)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    stages["validate_mdb"] = {
+        "count": len(per_mdb),
+        "total": sum(per_mdb),
+        "mean": sum(per_mdb) / len(per_mdb) if per_mdb else 0.0,
+        "max": max(per_mdb) if per_mdb else 0.0,
+    }
+
+    if hasattr(validator, 'finish_validation'):
+        start = time.time()
+        validator.finish_validation(mdb_files, [result for result in results if result is not None])
+        stages["finish"] = time.time() - start
+    return stages
+
+
+def _entry(key, name, runs):
+    """Result record of repeated (seconds, rows, findings, error) runs; the fastest run counts"""
+    return {
+        "validator": key,
+        "name": name,
+        "seconds": min(seconds for seconds, rows, findings, error in runs),
+        "runs": [seconds for seconds, rows, findings, error in runs],
+        "rows": runs[-1][1],
+        "findings": runs[-1][2],
+        "error": runs[-1][3],
+    }
+
+
+def benchmark_validators(folder, keys, options, repeat=1, stages=True, workers=1, quiet=True):
+    """Time each validator in keys on folder; also the single-pass engine and the parallel runner"""
+    results = []
+    with _Quiet(quiet):
+        selected = create_validators(keys)
+    # create_validators keeps VALIDATORS order
+    selected_keys = [key for key, name, validator_class in VALIDATORS if key in keys]
+    for key, (name, validator) in zip(selected_keys, selected):
+        with _Quiet(quiet):
+            configure_validator(validator, folder, **options)
+            entry = _entry(key, name, [_timed_run(validator) for _ in range(repeat)])
+            if stages and entry["error"] is None and hasattr(validator, 'validate_mdb'):
+                try:
+                    entry["stages"] = time_stages(validator, folder)
+                except Exception as e:
+                    entry["stages"] = {"error": str(e)}
+        results.append(entry)
+
+    # Only the validators that ran on their own (e.g. not arcpy-only ones on GeoPackages)
+    usable = [validator for key, (name, validator) in zip(selected_keys, selected)
+              if key in set(entry["validator"] for entry in results if entry["error"] is None)]
+    grouped = []
+    row_validators = [validator for validator in usable if hasattr(validator, 'begin_feature_class')]
+    if len(row_validators) > 1:
+        grouped.append(("single_pass", "Single-pass row checks", lambda: SinglePassEngine(row_validators)))
+    per_mdb_validators = [validator for validator in usable if hasattr(validator, 'validate_mdb')]
+    if workers > 1 and per_mdb_validators:
+        grouped.append(("parallel", "Parallel validation ({} workers)".format(workers),
+                        lambda: ParallelValidationRunner(per_mdb_validators, workers)))
+    for key, name, create_runner in grouped:
+        with _Quiet(quiet):
+            runner = create_runner()
+            runner.set_folder_path(folder)
+            results.append(_entry(key, name, [_timed_run(runner) for _ in range(repeat)]))
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m mdb_validator.benchmark",
+        description="Time the validators on synthetic cadastral datasets.")
+    parser.add_argument("--folder", help="dataset folder (default: a temporary folder, removed afterwards)")
+    parser.add_argument("--reuse", action="store_true", help="time the MDBs already in --folder instead of generating")
+    parser.add_argument("--mdbs", type=int, default=4, help="number of MDB files")
+    parser.add_argument("--rows", type=int, default=40, help="parcel rows per MDB")
+    parser.add_argument("--cols", type=int, default=40, help="parcel columns per MDB")
+    parser.add_argument("--parcel-size", dest="parcel_size", type=float, default=20.0, help="parcel side in metres")
+    parser.add_argument("--defect-rate", dest="defect_rate", type=float, default=0.01,
+                        help="share of parcels given each kind of defect")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--validators", help="comma-separated validators to time (default: all)")
+    parser.add_argument("--scale", choices=SCALES, default=SCALES[0])
+    parser.add_argument("--workers", type=int, default=1, help="also time the parallel runner with this many workers")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per validator; the fastest is reported")
+    parser.add_argument("--no-stages", dest="stages", action="store_false", help="only time whole runs")
+    parser.add_argument("--backend", choices=["arcpy", "geopackage"],
+                        help="data source (default: arcpy when available, else geopackage)")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write, - for standard output")
+    parser.add_argument("--verbose", action="store_true", help="show the validators' own output")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    backend_name = args.backend or ("arcpy" if arcpy_available else "geopackage")
+    set_backend(backend_name)
+    keys = [key.strip() for key in args.validators.split(",")] if args.validators else \
+        [key for key, name, validator_class in VALIDATORS]
+
+    folder = args.folder or tempfile.mkdtemp(prefix="mdb_validator_dataset_")
+    try:
+        if args.reuse:
+            dataset = {"folder": folder, "backend": backend_name, "mdbs": len(find_mdb_files(folder))}
+        else:
+            print("[benchmark] Generating {} synthetic MDBs of {} x {} parcels in {}".format(
+                args.mdbs, args.rows, args.cols, folder))
+            dataset = generate_dataset(folder, args.mdbs, args.rows, args.cols, args.parcel_size, args.defect_rate,
+                                       args.scale, seed=args.seed, backend_name=backend_name)
+
+        options = {"scale": args.scale, "gridsheet": GRIDSHEETS[1], "tolerance": TOLERANCES[0]}
+        print("[benchmark] Timing {} validators".format(len(keys)))
+        results = benchmark_validators(folder, keys, options, args.repeat, args.stages, args.workers,
+                                       quiet=not args.verbose)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "dataset": dataset,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print("[benchmark] Timings written to {}".format(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import sqlite3
+from backends import get_backend
+from logs import get_logger
+
+log = get_logger("catalog")
+
+CATALOG_NAME = ".mdb_catalog.sqlite"
+# Bumped when the stored entries change meaning; older catalogs are emptied on open
+# (2: the MDB root is listed even when the MDB has feature datasets)
+CATALOG_VERSION = 2
+
+_active_catalog = None
+
+
+def _native(value):
+    """json hands back unicode on Python 2; keep names as the byte strings arcpy and csv expect"""
+    return value if isinstance(value, str) else value.encode('utf-8')
+
+
+class MDBCatalog(object):
+    """On-disk cache of each MDB's schema keyed by path, mtime and size.
+
+    For every MDB it stores the feature classes with their dataset, full path, shape
+    type, fields and row count, so unchanged files skip the backend List/Describe calls
+    on later validators and later runs.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.catalog_path = os.path.join(folder_path, CATALOG_NAME)
+        self._entries = {}
+        self._feature_classes = {}
+        self.connection = sqlite3.connect(self.catalog_path, timeout=60)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS mdb_catalog ("
+            "path TEXT PRIMARY KEY, mtime REAL, size INTEGER, feature_classes TEXT)")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != CATALOG_VERSION:
+            self.connection.execute("DELETE FROM mdb_catalog")
+            self.connection.execute("PRAGMA user_version = {:d}".format(CATALOG_VERSION))
+        self.connection.commit()
+        log.info("[catalog] Using MDB catalog: %s", self.catalog_path)
+
+    def close(self):
+        self.connection.close()
+
+    def describe_mdb(self, mdb_path):
+        """Return the cached feature class entries of an MDB, describing it again if it changed"""
+        stat = os.stat(mdb_path)
+        key = (stat.st_mtime, stat.st_size)
+
+        cached = self._entries.get(mdb_path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        row = self.connection.execute(
+            "SELECT mtime, size, feature_classes FROM mdb_catalog WHERE path = ?", (mdb_path,)).fetchone()
+        if row and (row[0], row[1]) == key:
+            feature_classes = json.loads(row[2])
+            for entry in feature_classes:
+                entry["name"] = _native(entry["name"])
+                entry["dataset"] = _native(entry["dataset"])
+                entry["path"] = os.path.join(mdb_path, entry["dataset"], entry["name"]) \
+                    if entry["dataset"] else os.path.join(mdb_path, entry["name"])
+                entry["fields"] = [[_native(name), _native(field_type)] for name, field_type in entry["fields"]]
+        else:
+            log.debug("[catalog] Describing %s", mdb_path)
+            feature_classes = get_backend().list_feature_classes(mdb_path)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO mdb_catalog (path, mtime, size, feature_classes) VALUES (?, ?, ?, ?)",
+                (mdb_path, key[0], key[1], json.dumps(feature_classes)))
+            self.connection.commit()
+
+        self._entries[mdb_path] = (key, feature_classes)
+        for entry in feature_classes:
+            self._feature_classes[entry["path"]] = entry
+        return feature_classes
+
+    def describe_feature_class(self, full_path):
+        """Return the cached entry of a feature class path, or None if it is not in a catalogued MDB"""
+        entry = self._feature_classes.get(full_path)
+        if entry is None:
+            return None
+
+        # Re-check the owning MDB so a file changed mid-run is described again
+        mdb_path = full_path
+        extensions = get_backend().file_extensions
+        while mdb_path and not mdb_path.lower().endswith(extensions):
+            mdb_path = os.path.dirname(mdb_path)
+        if mdb_path:
+            self.describe_mdb(mdb_path)
+        return self._feature_classes.get(full_path)
+
+
+def open_catalog(folder_path):
+    """Activate the catalog stored in folder_path for get_feature_classes and friends"""
+    global _active_catalog
+    if _active_catalog and _active_catalog.folder_path == folder_path:
+        return _active_catalog
+
+    close_catalog()
+    try:
+        _active_catalog = MDBCatalog(folder_path)
+    except sqlite3.Error as e:
+        # A read-only or locked share just means running without the cache
+        log.warning("[catalog] Catalog disabled for %s: %s", folder_path, e)
+        _active_catalog = None
+    return _active_catalog
+
+
+def close_catalog():
+    global _active_catalog
+    if _active_catalog:
+        _active_catalog.close()
+    _active_catalog = None
+
+
+def active_catalog():
+    return _active_catalog
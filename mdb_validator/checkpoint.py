@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Resumable runs: a checkpoint journal of the (validator, MDB) units a run completed.
+
+The journal lives in .mdb_validator_checkpoint in the validated folder. For every MDB
+done, the report fragments of its units are moved there first and then one JSON line
+per unit is appended and synced to disk, so after a crash the journal only names units
+whose fragments are complete (a torn last line is skipped). Resuming skips the units
+journaled for the same validator settings and an MDB of the same size and mtime, and
+the reports are merged from the fragments in find_mdb_files order, exactly as a run in
+one go writes them. The journal is removed once a run completes without failures.
+"""
+import os
+import json
+import shutil
+import tempfile
+from utils import find_mdb_files
+from parallel import validate_files, merge_fragments, fragment_path
+from incremental import mdb_key, validator_key
+from logs import get_logger
+
+log = get_logger("checkpoint")
+
+JOURNAL_DIR_NAME = ".mdb_validator_checkpoint"
+JOURNAL_NAME = "journal.jsonl"
+
+
+class Journal(object):
+    """Append-only record of the completed units of a folder's runs, by (validator key, MDB key)"""
+
+    def __init__(self, folder_path):
+        self.directory = os.path.join(folder_path, JOURNAL_DIR_NAME)
+        self.path = os.path.join(self.directory, JOURNAL_NAME)
+        self.units = {}
+        self._file = None
+
+    def open(self):
+        """Load the units of earlier runs and open the journal for appending"""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        torn = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line cut short by a crash; its units are simply done again
+                        log.warning("[checkpoint] Skipping a damaged journal line in %s", self.path)
+                        continue
+                    self.units[(entry["validator"], entry["mdb"])] = entry
+        self._file = open(self.path, 'a')
+        if torn:
+            # Start after a torn last line, not on it
+            self._file.write("\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Remove the journal and its fragments (after a run completed without failures)"""
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.units = {}
+
+    def fragment(self, key, mdb):
+        return os.path.join(self.directory, key, mdb_key(mdb) + ".csv")
+
+    def completed(self, key, mdb):
+        """Whether the unit was journaled for this MDB as it is now (same size and mtime)"""
+        entry = self.units.get((key, mdb_key(mdb)))
+        if entry is None:
+            return False
+        stat = os.stat(mdb)
+        return entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def result(self, key, mdb):
+        result = self.units[(key, mdb_key(mdb))]["result"]
+        # JSON turns result tuples into lists
+        return tuple(result) if isinstance(result, list) else result
+
+    def record(self, mdb, units):
+        """Journal the (validator key, result, fragment path or None) units completed for one MDB"""
+        # Stat after validating: the geodatabase topology check writes to the MDB
+        stat = os.stat(mdb)
+        lines = []
+        for key, result, fragment in units:
+            target = self.fragment(key, mdb)
+            if not os.path.exists(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            if os.path.exists(target):
+                os.remove(target)
+            if fragment and os.path.exists(fragment):
+                shutil.move(fragment, target)
+            entry = {"validator": key, "mdb": mdb_key(mdb), "path": mdb,
+                     "size": stat.st_size, "mtime": stat.st_mtime, "result": result}
+            lines.append(json.dumps(entry) + "\n")
+            self.units[(key, entry["mdb"])] = entry
+        self._file.writelines(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+class ResumableValidationRunner(object):
+    """Validate the MDBs of a folder, journaling every completed MDB so an interrupted run can resume.
+
+    Units an earlier run of the same folder completed are skipped; a failing MDB is
+    reported, left out of the journal (so the next resume retries it) and does not stop
+    the run. With more than one worker the MDBs are validated in worker processes.
+    """
+
+    def __init__(self, validators, workers=1):
+        self.validators = list(validators)
+        self.workers = workers
+        self.folder_path = ""
+        self.status_var = None
+        self.failures = []
+        log.debug("[__init__] Initialized ResumableValidationRunner")
+
+    def set_status_var(self, status_var):
+        log.debug("[set_status_var] Setting status_var")
+        self.status_var = status_var
+
+    def set_folder_path(self, folder_path):
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
+        self.folder_path = folder_path
+
+    def _update_status(self, message):
+        if self.status_var:
+            self.status_var.set(message)
+        log.info(message)
+
+    def run_validation(self):
+        log.info("[checkpoint] Starting resumable validation")
+
+        if not self.folder_path:
+            raise ValueError("[checkpoint] Folder path not set")
+        if not self.validators:
+            raise ValueError("[checkpoint] No validators selected")
+
+        for validator in self.validators:
+            validator.prepare_validation()
+
+        mdb_files = find_mdb_files(self.folder_path)
+        if not mdb_files:
+            raise ValueError("[checkpoint] No MDB files found in the specified folder")
+
+        journal = Journal(self.folder_path)
+        journal.open()
+        keys = [validator_key(validator) for validator in self.validators]
+
+        tasks = []
+        for mdb_index, mdb in enumerate(mdb_files):
+            pending = [validator_index for validator_index, key in enumerate(keys) if not journal.completed(key, mdb)]
+            if pending:
+                tasks.append((mdb_index, mdb, pending))
+        pending_validators = dict((mdb_index, pending) for mdb_index, mdb, pending in tasks)
+
+        self._update_status("[checkpoint] {} of {} MDB files left to validate".format(len(tasks), len(mdb_files)))
+
+        # Inside the journal directory, so fragments are moved into it without copying
+        partial_dir = tempfile.mkdtemp(prefix="partial_", dir=journal.directory)
+        self.failures = []
+
+        def progress(done, total, mdb_index, mdb_results, mdb_errors):
+            mdb = mdb_files[mdb_index]
+            for validator_index, error in mdb_errors.items():
+                self.failures.append((mdb, self.validators[validator_index].__class__.__name__, error))
+                log.error("[checkpoint] Error in %s for %s: %s",
+                          self.validators[validator_index].__class__.__name__, mdb, error)
+            journal.record(mdb, [(keys[validator_index], mdb_results.get(validator_index),
+                                  fragment_path(partial_dir, validator_index, mdb_index))
+                                 for validator_index in pending_validators[mdb_index]
+                                 if validator_index not in mdb_errors])
+            self._update_status("[checkpoint] Processed ({}/{}) {}".format(done, total, os.path.basename(mdb)))
+
+        try:
+            results, errors = validate_files(self.validators, tasks, partial_dir, self.workers, progress)
+        finally:
+            journal.close()
+            shutil.rmtree(partial_dir, ignore_errors=True)
+
+        for validator_index, validator in enumerate(self.validators):
+            key = keys[validator_index]
+            if validator.report_name:
+                parts = [(mdb, journal.fragment(key, mdb) if journal.completed(key, mdb) else None,
+                          errors.get((validator_index, mdb_index)))
+                         for mdb_index, mdb in enumerate(mdb_files)]
+                merge_fragments(validator, os.path.join(self.folder_path, validator.report_name), parts)
+
+            if hasattr(validator, 'finish_validation'):
+                stored = [journal.result(key, mdb) for mdb in mdb_files if journal.completed(key, mdb)]
+                validator.finish_validation(mdb_files, [result for result in stored if result is not None])
+
+        if self.failures:
+            self._update_status("[checkpoint] Completed with {} failed MDB checks; resume to retry them".format(
+                len(self.failures)))
+        else:
+            journal.discard()
+            self._update_status("[checkpoint] Resumable validation completed")
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""Headless entry point: python -m mdb_validator FOLDER [options] or --job JOBFILE.
+
+Job files are JSON (or YAML when PyYAML is installed). Top-level keys are defaults
+for every job; "jobs" lists the per-folder runs, e.g.
+
+    {"scale": "500", "validators": ["invalid_ward", "duplicate_parcels"], "workers": 4,
+     "jobs": [{"folder": "D:/districts/kaski"}, {"folder": "D:/districts/syangja", "scale": "1200"}]}
+
+Exit status is 0 when everything ran, 1 when any validator or MDB failed and 2 for
+bad arguments or job files.
+"""
+import os
+import sys
+import json
+import argparse
+from catalog import open_catalog, close_catalog
+from column_cache import open_column_cache, close_column_cache
+from scanner import open_manifest, close_manifest, DEFAULT_EXCLUDE, SCAN_THREADS
+from backends import set_backend
+from progress import active_reporter, set_reporter, validator_scope
+from profiling import RunProfile
+from reports import REPORT_FORMATS, set_report_format
+from slivers import parse_thresholds, format_thresholds, DEFAULT_THRESHOLDS
+from logs import get_logger, configure_logging, ProgressLogger, LEVELS, PROGRESS_INTERVAL
+from jobs import VALIDATORS, SCALES, GRIDSHEETS, TOLERANCES, create_validators, configure_validator, \
+    build_jobs, job_failures
+
+yaml_available = True
+try:
+    import yaml
+except ImportError:
+    yaml = None
+    yaml_available = False
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+log = get_logger("cli")
+
+DEFAULTS = {
+    "folder": None,
+    "validators": [key for key, name, validator_class in VALIDATORS],
+    "scale": SCALES[0],
+    "gridsheet": GRIDSHEETS[1],
+    "point_in_sheet": False,
+    "tolerance": TOLERANCES[0],
+    "keep_topology": False,
+    "in_memory_topology": True,
+    "snapshot_topology": True,
+    "min_gap_area": 0.0,
+    "geometry_duplicates": False,
+    "sliver_thresholds": None,
+    "workers": 1,
+    "incremental": False,
+    "resume": False,
+    "catalog": True,
+    "column_cache": True,
+    "backend": None,
+    "profile": False,
+    "cprofile": 0,
+    "log_level": "INFO",
+    "log_file": None,
+    "progress_interval": PROGRESS_INTERVAL,
+    "include": [],
+    "exclude": list(DEFAULT_EXCLUDE),
+    "scan_threads": SCAN_THREADS,
+    "report_format": "csv",
+}
+
+
+def load_job_file(path):
+    """Read a JSON or YAML job file into a list of job option dicts"""
+    with open(path, 'r') as f:
+        text = f.read()
+    if path.lower().endswith(('.yml', '.yaml')):
+        if not yaml_available:
+            raise ValueError("[cli] PyYAML is not installed; use a JSON job file: {}".format(path))
+        document = yaml.safe_load(text)
+    else:
+        document = json.loads(text)
+
+    if not isinstance(document, dict):
+        raise ValueError("[cli] Job file must contain a mapping: {}".format(path))
+    defaults = dict((key, value) for key, value in document.items() if key != "jobs")
+    entries = document.get("jobs") or [{}]
+    return [dict(defaults, **entry) for entry in entries]
+
+
+def _native(value):
+    """JSON/YAML strings are unicode on Python 2; arcpy paths and csv want byte strings"""
+    if isinstance(value, list):
+        return [_native(item) for item in value]
+    if not isinstance(value, str) and hasattr(value, 'encode'):
+        return value.encode('utf-8')
+    return value
+
+
+def resolve_job(options, overrides):
+    """Merge defaults, job file entry and command line overrides, and check the result"""
+    job = dict(DEFAULTS)
+    job.update(options)
+    job.update(dict((key, value) for key, value in overrides.items() if value is not None))
+    job = dict((key, _native(value)) for key, value in job.items())
+
+    unknown = set(job) - set(DEFAULTS)
+    if unknown:
+        raise ValueError("[cli] Unknown job options: {}".format(", ".join(sorted(unknown))))
+    if not job["folder"]:
+        raise ValueError("[cli] No folder given")
+    if not os.path.isdir(job["folder"]):
+        raise ValueError("[cli] Invalid folder path: {}".format(job["folder"]))
+    for key in ("validators", "include", "exclude"):
+        if isinstance(job[key], str):
+            job[key] = [item.strip() for item in job[key].split(",") if item.strip()]
+    if not job["validators"]:
+        raise ValueError("[cli] No validators selected")
+    if str(job["scale"]) not in SCALES:
+        raise ValueError("[cli] Invalid scale value: {}".format(job["scale"]))
+    job["scale"] = str(job["scale"])
+    job["workers"] = int(job["workers"])
+    job["cprofile"] = int(job["cprofile"])
+    if str(job["log_level"]).upper() not in LEVELS:
+        raise ValueError("[cli] Invalid log level: {}".format(job["log_level"]))
+    job["progress_interval"] = float(job["progress_interval"])
+    job["scan_threads"] = int(job["scan_threads"])
+    job["min_gap_area"] = float(job["min_gap_area"])
+    if job["min_gap_area"] < 0:
+        raise ValueError("[cli] Invalid minimum gap area: {}".format(job["min_gap_area"]))
+    if job["report_format"] not in REPORT_FORMATS:
+        raise ValueError("[cli] Invalid report format: {}".format(job["report_format"]))
+    if job["sliver_thresholds"]:
+        # Checked here so a typo is a usage error, not a failure of every folder
+        parse_thresholds(job["sliver_thresholds"])
+    return job
+
+
+def run_job(job):
+    """Run one folder's validators; return the list of (name, error) failures"""
+    configure_logging(job["log_level"], job["log_file"])
+    log.info("[cli] Validating %s", job["folder"])
+    if job["backend"]:
+        set_backend(job["backend"])
+    set_report_format(job["report_format"])
+
+    selected = create_validators(job["validators"])
+    for name, validator in selected:
+        configure_validator(validator, job["folder"],
+                            scale=job["scale"],
+                            gridsheet=job["gridsheet"],
+                            point_in_sheet=bool(job["point_in_sheet"]),
+                            tolerance=job["tolerance"],
+                            keep_topology=bool(job["keep_topology"]),
+                            in_memory=bool(job["in_memory_topology"]),
+                            snapshot=bool(job["snapshot_topology"]),
+                            min_gap_area=job["min_gap_area"],
+                            geometry_duplicates=bool(job["geometry_duplicates"]),
+                            sliver_thresholds=job["sliver_thresholds"])
+
+    jobs = build_jobs(selected, job["folder"], workers=job["workers"], incremental=bool(job["incremental"]),
+                      resume=bool(job["resume"]))
+
+    if job["catalog"]:
+        open_catalog(job["folder"])
+    else:
+        close_catalog()
+    if job["column_cache"]:
+        open_column_cache(job["folder"])
+    else:
+        close_column_cache()
+    open_manifest(job["folder"], job["include"], job["exclude"], job["scan_threads"])
+
+    previous_reporter = active_reporter()
+    reporter = previous_reporter
+    if job["progress_interval"] > 0:
+        reporter = ProgressLogger(reporter, job["progress_interval"])
+    profile = None
+    if job["profile"] or job["cprofile"]:
+        reporter = profile = RunProfile(reporter, cprofile_top=job["cprofile"])
+    set_reporter(reporter)
+
+    failures = []
+    try:
+        for name, validator, validator_count in jobs:
+            log.info("[cli] Running %s...", name)
+            try:
+                with validator_scope(name):
+                    validator.run_validation()
+            except Exception as e:
+                log.error("[cli] Error in %s: %s", name, e)
+                failures.append((name, str(e)))
+                continue
+            for mdb, validator_name, error in job_failures(validator):
+                failures.append(("{} ({})".format(validator_name, mdb), error))
+            log.info("[cli] Completed %s", name)
+    finally:
+        close_catalog()
+        close_column_cache()
+        close_manifest()
+        set_reporter(previous_reporter)
+        if profile:
+            log.info("[cli] Run profile written to %s", profile.write(job["folder"]))
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m mdb_validator",
+        description="Run the MDB validation suite without the GUI.")
+    parser.add_argument("folder", nargs="?", help="folder containing the MDB files")
+    parser.add_argument("--job", help="JSON or YAML job file with one or more folders to validate")
+    parser.add_argument("--validators", help="comma-separated validators to run (default: all)")
+    parser.add_argument("--scale", choices=SCALES)
+    parser.add_argument("--gridsheet", help="gridsheet in the templates folder (default: {})".format(GRIDSHEETS[1]))
+    parser.add_argument("--point-in-sheet", dest="point_in_sheet", action="store_true", default=None,
+                        help="place parcels on sheets by label point; report wrong and multiple sheets separately")
+    parser.add_argument("--tolerance", help="cluster tolerance, e.g. '0.001 Meters'")
+    parser.add_argument("--keep-topology", dest="keep_topology", action="store_true", default=None)
+    parser.add_argument("--geodatabase-topology", dest="in_memory_topology", action="store_false", default=None,
+                        help="build the topology inside each MDB instead of checking in memory")
+    parser.add_argument("--in-place-topology", dest="snapshot_topology", action="store_false", default=None,
+                        help="with --geodatabase-topology, build it in the MDB itself instead of a scratch copy")
+    parser.add_argument("--min-gap-area", dest="min_gap_area", type=float, metavar="SQM",
+                        help="smallest gap between parcels to report (default: anything above the cluster tolerance)")
+    parser.add_argument("--geometry-duplicates", dest="geometry_duplicates", action="store_true", default=None,
+                        help="match duplicate segments and constructions by geometry within the cluster tolerance")
+    parser.add_argument("--sliver-thresholds", dest="sliver_thresholds", metavar="SPEC",
+                        help="small area and sliver thresholds per feature class, e.g. 'Parcel:min_width=1' "
+                             "(default: {})".format(format_thresholds(DEFAULT_THRESHOLDS)))
+    parser.add_argument("--workers", type=int, help="parallel worker processes")
+    parser.add_argument("--include", help="comma-separated globs of the MDB paths (relative to the folder) to check")
+    parser.add_argument("--exclude", help="comma-separated globs of folders and MDBs to skip (default: {})".format(
+        ",".join(DEFAULT_EXCLUDE)))
+    parser.add_argument("--scan-threads", dest="scan_threads", type=int,
+                        help="threads listing the top-level subfolders (default: {})".format(SCAN_THREADS))
+    parser.add_argument("--incremental", action="store_true", default=None,
+                        help="only re-check new or changed MDB files")
+    parser.add_argument("--resume", action="store_true", default=None,
+                        help="journal every finished MDB and skip those an interrupted run already finished")
+    parser.add_argument("--no-catalog", dest="catalog", action="store_false", default=None,
+                        help="do not cache MDB schemas between runs")
+    parser.add_argument("--no-column-cache", dest="column_cache", action="store_false", default=None,
+                        help="do not keep the key Parcel columns in memory-mapped files between validators and runs")
+    parser.add_argument("--backend", choices=["arcpy", "geopackage"])
+    parser.add_argument("--report-format", dest="report_format", choices=list(REPORT_FORMATS),
+                        help="format of the reports (default: csv; parquet needs pyarrow)")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="write run_profile.json with times and counts per validator, MDB and stage")
+    parser.add_argument("--cprofile", type=int, metavar="N",
+                        help="also keep cProfile dumps of the N slowest MDBs (implies --profile)")
+    parser.add_argument("--log-level", dest="log_level", choices=LEVELS,
+                        help="console and log file level (default: INFO; DEBUG shows every MDB and feature class)")
+    parser.add_argument("--log-file", dest="log_file", help="also append the log to this file as JSON lines")
+    parser.add_argument("--progress-interval", dest="progress_interval", type=float, metavar="SECONDS",
+                        help="seconds between progress lines (default: {:g}; 0 for none)".format(PROGRESS_INTERVAL))
+    parser.add_argument("--list-validators", action="store_true", help="list validator names and exit")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.list_validators:
+        for key, name, validator_class in VALIDATORS:
+            print("{:<30} {}".format(key, name))
+        return EXIT_OK
+
+    overrides = dict((key, getattr(args, key)) for key in DEFAULTS if hasattr(args, key))
+    try:
+        entries = load_job_file(args.job) if args.job else [{}]
+        jobs = [resolve_job(entry, overrides) for entry in entries]
+    except (IOError, ValueError) as e:
+        log.error("[cli] %s", e)
+        return EXIT_USAGE
+
+    failures = []
+    for job in jobs:
+        try:
+            failures += [(job["folder"], name, error) for name, error in run_job(job)]
+        except ValueError as e:
+            # Bad settings for this folder (unknown validator, missing backend, ...)
+            log.error("[cli] %s", e)
+            failures.append((job["folder"], "setup", str(e)))
+
+    if failures:
+        log.error("[cli] %d failures:", len(failures))
+        for folder, name, error in failures:
+            log.error("[cli]   %s - %s: %s", folder, name, error)
+        return EXIT_FAILED
+
+    log.info("[cli] All validations completed")
+    return EXIT_OK
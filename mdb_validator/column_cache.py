@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""On-disk columnar cache of the key Parcel attributes, memory-mapped on read.
+
+The first read_columns call on a Parcel feature class of an MDB reads every column of
+CACHED_FIELDS it has in one pass and saves each as a .npy file (values, plus a mask of
+the nulls) under .mdb_validator_columns in the validated folder. Later reads of those
+columns, by the other validators of the run or by later runs, map the files instead of
+opening the MDB again: nothing is copied until a check touches the rows, and the pages
+belong to the file cache rather than to the process, so memory stays flat on large
+folders.
+
+Entries are keyed by the MDB's path, size and mtime; a changed MDB gets a new entry and
+the old ones are removed. Columns that have no fixed-width NumPy type (mixed or unusual
+value types) are not cached and are read from the MDB as before.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from backends import get_backend
+from logs import get_logger
+
+log = get_logger("column_cache")
+
+CACHE_DIR_NAME = ".mdb_validator_columns"
+INDEX_NAME = "columns.json"
+
+# Feature class: the columns read for it in the first pass
+CACHED_FIELDS = {
+    "Parcel": ["PARCELNO", "WARDNO", "GRIDS1", "suspicious", "Shape_Area"],
+}
+
+_active_cache = None
+
+
+def _digest(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def _owning_mdb(full_path):
+    """(MDB path, feature class path inside it) of a feature class path, or (None, None)"""
+    mdb_path = full_path
+    extensions = get_backend().file_extensions
+    while mdb_path and not mdb_path.lower().endswith(extensions):
+        parent = os.path.dirname(mdb_path)
+        mdb_path = parent if parent != mdb_path else ""
+    if not mdb_path:
+        return None, None
+    return mdb_path, os.path.relpath(full_path, mdb_path)
+
+
+def storable(column):
+    """(values, mask) of a masked column with the values in a fixed-width dtype, or None if they have none.
+
+    Object columns are narrowed to what their values hold, so tolist() on the stored
+    column gives back the same Python values: str, unicode, int or float.
+    """
+    values = np.ma.getdata(column)
+    mask = np.ma.getmaskarray(column)
+    if values.dtype != object:
+        return (values, mask) if values.dtype.kind in "biufSU" else None
+
+    present = values[~mask].tolist()
+    types = set(type(value) for value in present)
+    if not types or types == set([str]):
+        if any(value.endswith("\x00") for value in present):
+            # NumPy strips trailing NULs from fixed-width strings
+            return None
+        dtype = "S{}".format(max([len(value) for value in present] + [1]))
+        filler = ""
+    elif types == set([unicode]):
+        dtype = "U{}".format(max([len(value) for value in present] + [1]))
+        filler = u""
+    elif types <= set([int, long]) and all(-2 ** 63 <= value < 2 ** 63 for value in present):
+        dtype, filler = np.int64, 0
+    elif types == set([float]):
+        dtype, filler = np.float64, 0.0
+    else:
+        return None
+    stored = np.empty(len(values), dtype=dtype)
+    stored[~mask] = present
+    stored[mask] = filler
+    return stored, mask
+
+
+def _load(path, rows):
+    # An empty array cannot be mapped
+    return np.load(path, mmap_mode='r' if rows else None)
+
+
+class ColumnCache(object):
+    """The cached Parcel columns of a folder's MDBs, by MDB path, size and mtime"""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.directory = os.path.join(folder_path, CACHE_DIR_NAME)
+        log.info("[column_cache] Using column cache: %s", self.directory)
+
+    def _entry_dir(self, mdb_path, fc_path):
+        """Directory of one feature class of an MDB as it is now; older versions of the MDB get other ones"""
+        stat = os.stat(mdb_path)
+        mdb_dir = os.path.join(self.directory, _digest(os.path.normcase(os.path.abspath(mdb_path))))
+        state = _digest("{}|{!r}".format(stat.st_size, stat.st_mtime))[:12]
+        return mdb_dir, os.path.join(mdb_dir, state, _digest(fc_path)[:12])
+
+    def read_columns(self, full_path, fields, read_source, describe):
+        """Cached columns of fields of a feature class, or None when they are not all cacheable.
+
+        read_source(full_path, fields) reads columns from the MDB and describe(full_path)
+        gives its (shape type, field names); both are only used to fill the cache.
+        """
+        cached_fields = CACHED_FIELDS.get(os.path.basename(full_path))
+        if not cached_fields or not fields:
+            return None
+        wanted = [field.lower() for field in fields]
+        if not set(wanted) <= set(field.lower() for field in cached_fields):
+            return None
+        mdb_path, fc_path = _owning_mdb(full_path)
+        if mdb_path is None:
+            return None
+
+        mdb_dir, entry_dir = self._entry_dir(mdb_path, fc_path)
+        index = self._read_index(entry_dir)
+        if index is None:
+            try:
+                index = self._extract(full_path, cached_fields, describe(full_path)[1], read_source, mdb_dir,
+                                      entry_dir)
+            except (IOError, OSError) as e:
+                log.warning("[column_cache] Cannot cache the columns of %s: %s", full_path, e)
+                return None
+        if not set(wanted) <= set(index["columns"]):
+            return None
+
+        columns = []
+        for field in wanted:
+            name = index["columns"][field]
+            values = _load(os.path.join(entry_dir, name + ".npy"), index["rows"])
+            mask = _load(os.path.join(entry_dir, name + ".mask.npy"), index["rows"])
+            columns.append(np.ma.masked_array(values, mask=mask, copy=False))
+        return columns
+
+    def _read_index(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, INDEX_NAME), 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _extract(self, full_path, cached_fields, field_names, read_source, mdb_dir, entry_dir):
+        """Read the cached fields the feature class has, save the storable ones and return the index"""
+        present = dict((name.lower(), name) for name in field_names)
+        fields = [present[field.lower()] for field in cached_fields if field.lower() in present]
+        log.debug("[column_cache] Caching %s of %s", ", ".join(fields), full_path)
+
+        columns = read_source(full_path, fields) if fields else []
+        # Earlier versions of this MDB are stale now
+        for name in os.listdir(mdb_dir) if os.path.isdir(mdb_dir) else []:
+            if os.path.join(mdb_dir, name) != os.path.dirname(entry_dir):
+                shutil.rmtree(os.path.join(mdb_dir, name), ignore_errors=True)
+        if not os.path.isdir(entry_dir):
+            os.makedirs(entry_dir)
+
+        index = {"rows": len(columns[0]) if columns else 0, "columns": {}}
+        for field, column in zip(fields, columns):
+            stored = storable(column)
+            if stored is None:
+                log.debug("[column_cache] Not caching %s of %s (no fixed-width type)", field, full_path)
+                continue
+            name = _digest(field.lower())[:12]
+            for suffix, array in zip((".npy", ".mask.npy"), stored):
+                self._save(os.path.join(entry_dir, name + suffix), array)
+            index["columns"][field.lower()] = name
+
+        # Written last, so an interrupted extraction leaves no index and is simply done again
+        self._save_index(entry_dir, index)
+        return index
+
+    def _save(self, path, array):
+        handle, temp_path = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    def _save_index(self, entry_dir, index):
+        handle, temp_path = tempfile.mkstemp(suffix=".json", dir=entry_dir)
+        with os.fdopen(handle, 'w') as f:
+            json.dump(index, f)
+        path = os.path.join(entry_dir, INDEX_NAME)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+
+def open_column_cache(folder_path):
+    """Activate the column cache of folder_path for read_columns"""
+    global _active_cache
+    if _active_cache and _active_cache.folder_path == folder_path:
+        return _active_cache
+    try:
+        directory = os.path.join(folder_path, CACHE_DIR_NAME)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        _active_cache = ColumnCache(folder_path)
+    except OSError as e:
+        # A read-only share just means reading the MDBs every time
+        log.warning("[column_cache] Column cache disabled for %s: %s", folder_path, e)
+        _active_cache = None
+    return _active_cache
+
+
+def close_column_cache():
+    global _active_cache
+    _active_cache = None
+
+
+def active_column_cache():
+    return _active_cache
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def flag_values(column, is_invalid):
+    """Boolean mask of the rows whose value fails a rule.
+
+    is_invalid is called once per distinct value (and once with None for nulls) rather
+    than once per row, so the per-row work stays in NumPy.
+    """
+    nulls = np.ma.getmaskarray(column)
+    values = np.ma.getdata(column)
+    flagged = np.zeros(len(values), dtype=bool)
+
+    present = ~nulls
+    if present.any():
+        uniques, inverse = np.unique(values[present], return_inverse=True)
+        invalid = np.array([bool(is_invalid(value)) for value in uniques.tolist()], dtype=bool)
+        flagged[present] = invalid[inverse]
+    if nulls.any() and is_invalid(None):
+        flagged |= nulls
+    return flagged
+
+
+def flagged_rows(columns, mask):
+    """Materialize only the rows selected by mask, as tuples with None for nulls, in table order"""
+    indexes = np.nonzero(mask)[0]
+    if not len(indexes):
+        return []
+    return list(zip(*[column[indexes].tolist() for column in columns]))
+
+
+def iter_rows(columns):
+    """Every row of the columns as a tuple, for checks that still work a row at a time"""
+    return zip(*[column.tolist() for column in columns])
+
+
+def count_keys(columns, min_count=1):
+    """(key tuple, count) of every key across the columns occurring at least min_count times, in key order.
+
+    Keys are counted in one pass, with a sort of a NumPy structured array when no value
+    is null and a dict otherwise; only keys that pass min_count are materialized.
+    """
+    if not columns or not len(columns[0]):
+        return []
+
+    if not any(np.ma.getmaskarray(column).any() for column in columns) and \
+            all(np.ma.getdata(column).dtype != object for column in columns):
+        keys = np.rec.fromarrays([np.ma.getdata(column) for column in columns])
+        uniques, counts = np.unique(keys, return_counts=True)
+        selected = counts >= min_count
+        return list(zip([tuple(key) for key in uniques[selected].tolist()], counts[selected].tolist()))
+
+    counts = {}
+    for key in iter_rows(columns):
+        counts[key] = counts.get(key, 0) + 1
+    return sorted((key, count) for key, count in counts.items() if count >= min_count)
+
+
+def duplicate_keys(columns):
+    """(key tuple, count) of every key occurring more than once, in key order (a Frequency_analysis replacement)"""
+    return count_keys(columns, min_count=2)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from utils import find_mdb_files, get_feature_classes, describe_feature_class, read_columns
+from columnar import count_keys
+from incremental import RESULTS_DIR_NAME, mdb_key
+from sorted_runs import key_text, write_run, merged_groups, prune_runs
+from progress import mdb_progress, check_cancelled, rows_scanned, findings_written
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("cross_mdb_duplicates")
+
+KEY_FIELDS = ["WARDNO", "GRIDS1", "PARCELNO"]
+RUNS_DIR_NAME = "cross_mdb_keys"
+
+
+class CrossMDBDuplicatesValidator:
+    """Parcel keys repeated anywhere in the folder, across MDB boundaries.
+
+    Every MDB is written out as one sorted run of (key, count) next to the incremental
+    results, and the runs are combined by a k-way merge (an external sort), so memory
+    holds one MDB's keys while scanning and one line per run while merging.
+    """
+    report_name = None
+    output_name = "11_cross_mdb_duplicate_parcels_report.csv"
+    report_header = ["WARDNO", "GRIDS1", "PARCELNO", "Frequency", "MDB Count", "Source Files"]
+
+    def __init__(self):
+        log.debug("[__init__] Initializing CrossMDBDuplicatesValidator")
+        self.folder_path = ""
+        self.status_var = None
+
+    def set_status_var(self, status_var):
+        log.debug("[set_status_var] Setting status_var")
+        self.status_var = status_var
+
+    def set_folder_path(self, folder_path):
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
+        self.folder_path = folder_path
+
+    def _update_status(self, message):
+        if self.status_var:
+            self.status_var.set(message)
+        log.info(message)
+
+    def _runs_dir(self):
+        return os.path.join(self.folder_path, RESULTS_DIR_NAME, RUNS_DIR_NAME)
+
+    def prepare_validation(self):
+        if not self.folder_path:
+            raise ValueError("[cross_mdb_duplicates] Folder path not set")
+        if not os.path.exists(self._runs_dir()):
+            os.makedirs(self._runs_dir())
+
+    def validate_mdb(self, mdb, writer):
+        """Write the sorted (key, count) run of every Parcel class in mdb; return (mdb, run path, key count)"""
+        counts = {}
+        for fc_name, full_path in get_feature_classes(mdb, ["Parcel"]):
+            check_cancelled()
+            if describe_feature_class(full_path)[0] != "Polygon":
+                log.debug("[cross_mdb_duplicates] Skipping non-polygon feature class: %s", fc_name)
+                continue
+            columns = read_columns(full_path, KEY_FIELDS)
+            rows_scanned(len(columns[0]) if columns else 0)
+            for key, count in count_keys(columns):
+                key = tuple(key_text(value) for value in key)
+                counts[key] = counts.get(key, 0) + count
+
+        run_path = os.path.join(self._runs_dir(), mdb_key(mdb) + ".csv")
+        write_run(run_path, counts)
+        return mdb, run_path, len(counts)
+
+    def finish_validation(self, mdb_files, results):
+        """Merge the per-MDB runs into the folder-wide report of keys occurring more than once"""
+        results = [(str(mdb), str(run_path), key_count) for mdb, run_path, key_count in results
+                   if os.path.exists(str(run_path))]
+        sources = [mdb for mdb, run_path, key_count in results]
+        run_paths = [run_path for mdb, run_path, key_count in results]
+        prune_runs(self._runs_dir(), run_paths)
+
+        self._update_status("[cross_mdb_duplicates] Merging parcel keys of {} MDB files".format(len(run_paths)))
+        output_csv = os.path.join(self.folder_path, self.output_name)
+        temp_dir = tempfile.mkdtemp(prefix="mdb_validator_keys_")
+        groups = 0
+        try:
+            with open_report(output_csv, self.report_header) as writer:
+                for key, frequency, mdb_indexes in merged_groups(run_paths, temp_dir):
+                    # Same PARCELNO 0 filter as the per-feature-class duplicate report
+                    if frequency < 2 or key[2] == "0":
+                        continue
+                    writer.writerow(list(key) + [frequency, len(mdb_indexes),
+                                                 "; ".join(sources[mdb_index] for mdb_index in mdb_indexes)])
+                    groups += 1
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        findings_written(groups)
+
+        self._update_status("[cross_mdb_duplicates] Found {} duplicate parcel keys across the folder".format(groups))
+
+    def run_validation(self):
+        log.info("[cross_mdb_duplicates] Starting cross-MDB duplicate parcel validation")
+
+        self.prepare_validation()
+
+        mdb_files = find_mdb_files(self.folder_path)
+        if not mdb_files:
+            raise ValueError("[cross_mdb_duplicates] No MDB files found in the specified folder")
+
+        log.info("[cross_mdb_duplicates] Found %s MDB files", len(mdb_files))
+
+        results = []
+        total_mdb = len(mdb_files)
+        for index, mdb in enumerate(mdb_files, start=1):
+            try:
+                mdb_progress(index, total_mdb, mdb)
+                base_name = os.path.basename(mdb)
+                if self.status_var:
+                    self.status_var.set("Processing ({}/{}) {}".format(index, total_mdb, base_name))
+
+                log.debug("[cross_mdb_duplicates] Processing (%s/%s) %s...", index, total_mdb, base_name)
+
+                results.append(self.validate_mdb(mdb, None))
+
+            except Exception as e:
+                error_message = "[cross_mdb_duplicates] Error processing {}: {}".format(mdb, str(e))
+                if self.status_var:
+                    self.status_var.set(error_message)
+                log.error(error_message)
+                continue
+
+        self.finish_validation(mdb_files, results)
+
+        if self.status_var:
+            self.status_var.set("Cross-MDB duplicate parcels validation completed")
+
+        log.info("[cross_mdb_duplicates] Cross-MDB duplicate parcels validation completed")
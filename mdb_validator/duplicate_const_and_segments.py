@@ -1,107 +1,203 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-import uuid
-from utils import find_mdb_files, get_feature_classes
+import shutil
+import tempfile
+import numpy as np
+from utils import find_mdb_files, get_feature_classes, describe_feature_class, read_columns, search_cursor
+from columnar import duplicate_keys
+from backends import SHAPE_ARRAYS
+from geometry import fingerprint, snap
+from topology_engine import parse_tolerance
+from incremental import RESULTS_DIR_NAME, mdb_key
+from sorted_runs import write_run, merged_groups, prune_runs
+from progress import mdb_progress, check_cancelled, rows_scanned, findings_written, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("duplicate_const_and_segments")
+
+RUNS_DIR_NAME = "geometry_fingerprints"
 
 
 class DuplicateConstAndSegmentsValidator:
+    """Duplicate Construction and Segments features.
+
+    By default features are duplicates when ParFID, Shape_Area and Shape_Length (ParFID
+    and Shape_Length for Segments) are equal. With match_geometry they are duplicates
+    when their vertices snap to the same cluster tolerance grid (geometry.fingerprint,
+    which does not tell a polygon's holes from its outer rings); the fingerprints of
+    every MDB are then also merged into a folder-wide report.
+    """
+    report_name = "09_duplicate_segments_construction_report.csv"
+    report_header = ["Source File", "ParFID", "Shape_Area", "Shape_Length", "Frequency"]
+    geometry_report_name = "12_cross_mdb_duplicate_geometries_report.csv"
+    geometry_report_header = ["Feature Class", "Fingerprint", "X", "Y", "Frequency", "MDB Count", "Source Files"]
+
     def __init__(self):
-        print("[__init__] Initializing Duplicate Const And Segments Validator")
+        log.debug("[__init__] Initializing Duplicate Const And Segments Validator")
         self.folder_path = ""
         self.status_var = None
+        self.match_geometry = False
+        self.cluster_tolerance = "0.001 Meters"
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
-    def run_validation(self):
-        print("[duplicate_segments_and_const] Starting duplicate const and segments validation")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[duplicate_segments_and_const] Folder path not set")
+        if self.match_geometry and not os.path.exists(self._runs_dir()):
+            os.makedirs(self._runs_dir())
+
+    def _runs_dir(self):
+        return os.path.join(self.folder_path, RESULTS_DIR_NAME, RUNS_DIR_NAME)
+
+    def validate_mdb(self, mdb, writer):
+        # One schema lookup for both classes
+        features = get_feature_classes(mdb, ["Construction", "Segments"])
+
+        const = [(fc_name, full_path) for fc_name, full_path in features if fc_name == "Construction"]
+        log.debug("[duplicate_segments_and_const] Found %s Constructions feature classes in %s",
+                  len(const), os.path.basename(mdb))
+
+        seg = [(fc_name, full_path) for fc_name, full_path in features if fc_name == "Segments"]
+        log.debug("[duplicate_segments_and_const] Found %s Segments feature classes in %s",
+                  len(seg), os.path.basename(mdb))
+
+        if self.match_geometry:
+            return self._validate_geometry(mdb, const + seg, writer)
+
+        for fc_name, full_path in const:
+            log.debug("[duplicate_segments_and_const] Checking feature class: %s", fc_name)
+
+            if describe_feature_class(full_path)[0] != "Polygon":
+                log.debug("[duplicate_segments_and_const] Skipping non-polygon feature class: %s", fc_name)
+                continue
+
+            columns = read_columns(full_path, ["ParFID", "Shape_Area", "Shape_Length"])
+            rows_scanned(len(columns[0]) if columns else 0)
+            for key, frequency in duplicate_keys(columns):
+                if str(key[2]) != "0":
+                    writer.writerow([full_path, key[0], key[1], key[2], frequency])
+
+        for fc_name, full_path in seg:
+            log.debug("[duplicate_segments_and_const] Checking feature class: %s", fc_name)
+
+            columns = read_columns(full_path, ["ParFID", "Shape_Length"])
+            rows_scanned(len(columns[0]) if columns else 0)
+            for key, frequency in duplicate_keys(columns):
+                if str(key[1]) != "0":
+                    writer.writerow([full_path, key[0], "  ", key[1], frequency])
+
+    def _validate_geometry(self, mdb, features, writer):
+        """Report features sharing a fingerprint; return (mdb, fingerprint run path, fingerprint count)"""
+        tolerance = parse_tolerance(self.cluster_tolerance)
+        counts = {}
+        for fc_name, full_path in features:
+            log.debug("[duplicate_segments_and_const] Fingerprinting feature class: %s", fc_name)
+            check_cancelled()
+
+            # fingerprint: [first shape, ParFIDs]
+            groups = {}
+            rows = 0
+            with search_cursor(full_path, ["ParFID", SHAPE_ARRAYS]) as cursor:
+                for par_fid, shape in cursor:
+                    rows += 1
+                    if shape is None or shape.is_empty:
+                        continue
+                    key = fingerprint(shape, tolerance)
+                    if key in groups:
+                        groups[key][1].append(par_fid)
+                    else:
+                        groups[key] = [shape, [par_fid]]
+            rows_scanned(rows)
+
+            for key, (shape, par_fids) in sorted(groups.items()):
+                # Lower left corner on the tolerance grid, the same for every shape with this fingerprint
+                corner = np.vstack([snap(array, tolerance) for array in shape.arrays()]).min(axis=0)
+                corner = [str(corner[0] * tolerance), str(corner[1] * tolerance)]
+                counts[tuple([fc_name, key] + corner)] = len(par_fids)
+                if len(par_fids) > 1:
+                    area = shape.area if fc_name == "Construction" else "  "
+                    par_fid = "; ".join(sorted(set(str(value) for value in par_fids)))
+                    writer.writerow([full_path, par_fid, area, shape.length, len(par_fids)])
+
+        run_path = os.path.join(self._runs_dir(), mdb_key(mdb) + ".csv")
+        write_run(run_path, counts)
+        return mdb, run_path, len(counts)
+
+    def finish_validation(self, mdb_files, results):
+        """Merge the fingerprints of every MDB into the folder-wide duplicate geometry report"""
+        if not self.match_geometry:
+            return
+        results = [(str(mdb), str(run_path), count) for mdb, run_path, count in results
+                   if os.path.exists(str(run_path))]
+        sources = [mdb for mdb, run_path, count in results]
+        run_paths = [run_path for mdb, run_path, count in results]
+        prune_runs(self._runs_dir(), run_paths)
+
+        output_csv = os.path.join(self.folder_path, self.geometry_report_name)
+        temp_dir = tempfile.mkdtemp(prefix="mdb_validator_geometry_")
+        groups = 0
+        try:
+            with open_report(output_csv, self.geometry_report_header) as writer:
+                for key, frequency, mdb_indexes in merged_groups(run_paths, temp_dir):
+                    if frequency < 2:
+                        continue
+                    writer.writerow(list(key) + [frequency, len(mdb_indexes),
+                                                 "; ".join(sources[mdb_index] for mdb_index in mdb_indexes)])
+                    groups += 1
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        findings_written(groups)
+
+        log.info("[duplicate_segments_and_const] Found %s duplicate geometries across the folder", groups)
 
-        output_csv = os.path.join(self.folder_path, "09_duplicate_segments_construction_report.csv")
+    def run_validation(self):
+        log.info("[duplicate_segments_and_const] Starting duplicate const and segments validation")
+
+        self.prepare_validation()
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
 
         if not mdb_files:
             raise ValueError("[duplicate_segments_and_const] No MDB files found in the specified folder")
 
-        print("[duplicate_segments_and_const] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Source File", "ParFID","Shape_Area", "Shape_Length", "Frequency"])
+        log.info("[duplicate_segments_and_const] Found %s MDB files", len(mdb_files))
 
+        results = []
+        with open_report(output_csv, self.report_header) as writer:
             total_mdb = len(mdb_files)
 
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, total_mdb, base_name))
 
-                    print("[duplicate_segments_and_const] Processing ({}/{}) {}...".format(index, total_mdb, base_name))
-
-                    const = get_feature_classes(mdb, ["Construction"])
-                    print("[duplicate_segments_and_const] Found {} Constructions feature classes in {}".format(len(const), base_name))
-
-                    seg = get_feature_classes(mdb, ["Segments"])
-                    print("[duplicate_segments_and_const] Found {} Segments feature classes in {}".format(len(seg), base_name))
+                    log.debug("[duplicate_segments_and_const] Processing (%s/%s) %s...", index, total_mdb, base_name)
 
-                    for fc_name, full_path in const:
-                        print("[duplicate_segments_and_const] Checking feature class: {}".format(fc_name))
-
-                        if arcpy.Describe(full_path).shapeType != "Polygon":
-                            print("[duplicate_segments_and_const] Skipping non-polygon feature class: {}".format(fc_name))
-                            continue
-
-                        frequency_table = "in_memory/freq_" + uuid.uuid4().hex
-                        print("[duplicate_segments_and_const] Running Frequency_analysis on: {}".format(fc_name))
-
-                        arcpy.Frequency_analysis(full_path, frequency_table, ["ParFID","Shape_Area", "Shape_Length"])
-
-                        with arcpy.da.SearchCursor(frequency_table,
-                                                   ["ParFID","Shape_Area", "Shape_Length", "FREQUENCY"]) as cursor:
-                            for row in cursor:
-                                if str(row[2]) != "0" and row[3] > 1:
-                                    writer.writerow([full_path, row[0], row[1], row[2], row[3]])
-
-                        if arcpy.Exists(frequency_table):
-                            arcpy.Delete_management(frequency_table)
-                            print("[duplicate_segments_and_const] Deleted in-memory frequency table")
-
-                    for fc_name, full_path in seg:
-                        print("[duplicate_segments_and_const] Checking feature class: {}".format(fc_name))
-
-                        frequency_table = "in_memory/freq_" + uuid.uuid4().hex
-                        print("[duplicate_segments_and_const] Running Frequency_analysis on: {}".format(fc_name))
-
-                        arcpy.Frequency_analysis(full_path, frequency_table, ["ParFID", "Shape_Length"])
-
-                        with arcpy.da.SearchCursor(frequency_table,
-                                                   ["ParFID", "Shape_Length", "FREQUENCY"]) as cursor:
-                            for row in cursor:
-                                if str(row[1]) != "0" and row[2] > 1:
-                                    writer.writerow([full_path, row[0], "  ", row[1], row[2]])
-
-                        if arcpy.Exists(frequency_table):
-                            arcpy.Delete_management(frequency_table)
-                            print("[duplicate_segments_and_const] Deleted in-memory frequency table")
+                    result = self.validate_mdb(mdb, CountingWriter(writer))
+                    if result:
+                        results.append(result)
 
                 except Exception as e:
                     error_message = "[duplicate_segments_and_const] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
+                    log.error(error_message)
                     continue
 
+        self.finish_validation(mdb_files, results)
+
         if self.status_var:
             self.status_var.set("Duplicate segments_and_const validation completed")
 
-        print("[duplicate_segments_and_const] Duplicate segments_and_const validation completed")
+        log.info("[duplicate_segments_and_const] Duplicate segments_and_const validation completed")
@@ -1,86 +1,92 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-import uuid
-from utils import find_mdb_files, get_feature_classes
+from utils import find_mdb_files
+from engine import scan_mdb
+from columnar import duplicate_keys
+from progress import mdb_progress, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("duplicate_parcels")
 
 
 class DuplicateParcelsValidator:
+    report_name = "04_duplicate_parcels_report.csv"
+    report_header = ["Source File", "WARDNO", "GRIDS1", "PARCELNO", "Frequency"]
+    row_feature_classes = ["Parcel"]
+
     def __init__(self):
-        print("[__init__] Initializing DuplicateParcelsValidator")
+        log.debug("[__init__] Initializing DuplicateParcelsValidator")
         self.folder_path = ""
         self.status_var = None
+        self.failures = []
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
-    def run_validation(self):
-        print("[duplicate_parcels] Starting duplicate parcel validation")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[duplicate_parcels] Folder path not set")
 
-        output_csv = os.path.join(self.folder_path, "04_duplicate_parcels_report.csv")
+    def begin_feature_class(self, mdb, fc_name, full_path, shape_type, field_names, writer):
+        if shape_type != "Polygon":
+            log.debug("[duplicate_parcels] Skipping non-polygon feature class: %s", fc_name)
+            return None
+        self._current_fc = full_path
+        return ["WARDNO", "GRIDS1", "PARCELNO"]
+
+    def check_columns(self, columns, writer):
+        # Same filter and key order as the Frequency_analysis table it replaces
+        for key, frequency in duplicate_keys(columns):
+            if str(key[2]) != "0":
+                writer.writerow([self._current_fc, key[0], key[1], key[2], frequency])
+
+    def validate_mdb(self, mdb, writer):
+        scan_mdb(mdb, [self], {self: writer})
+
+    def run_validation(self):
+        log.info("[duplicate_parcels] Starting duplicate parcel validation")
+
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
 
         if not mdb_files:
             raise ValueError("[duplicate_parcels] No MDB files found in the specified folder")
 
-        print("[duplicate_parcels] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Source File", "WARDNO", "GRIDS1", "PARCELNO", "Frequency"])
+        log.info("[duplicate_parcels] Found %s MDB files", len(mdb_files))
 
+        with open_report(output_csv, self.report_header) as writer:
             total_mdb = len(mdb_files)
 
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, total_mdb, base_name))
 
-                    print("[duplicate_parcels] Processing ({}/{}) {}...".format(index, total_mdb, base_name))
-
-                    parcels = get_feature_classes(mdb, ["Parcel"])
-                    print("[duplicate_parcels] Found {} Parcel feature classes in {}".format(len(parcels), base_name))
-
-                    for fc_name, full_path in parcels:
-                        print("[duplicate_parcels] Checking feature class: {}".format(fc_name))
-
-                        if arcpy.Describe(full_path).shapeType != "Polygon":
-                            print("[duplicate_parcels] Skipping non-polygon feature class: {}".format(fc_name))
-                            continue
-
-                        frequency_table = "in_memory/freq_" + uuid.uuid4().hex
-                        print("[duplicate_parcels] Running Frequency_analysis on: {}".format(fc_name))
-
-                        arcpy.Frequency_analysis(full_path, frequency_table, ["WARDNO", "GRIDS1", "PARCELNO"])
-
-                        with arcpy.da.SearchCursor(frequency_table,
-                                                   ["WARDNO", "GRIDS1", "PARCELNO", "FREQUENCY"]) as cursor:
-                            for row in cursor:
-                                if str(row[2]) != "0" and row[3] > 1:
-                                    writer.writerow([full_path, row[0], row[1], row[2], row[3]])
+                    log.debug("[duplicate_parcels] Processing (%s/%s) %s...", index, total_mdb, base_name)
 
-                        if arcpy.Exists(frequency_table):
-                            arcpy.Delete_management(frequency_table)
-                            print("[duplicate_parcels] Deleted in-memory frequency table")
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_message = "[duplicate_parcels] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
+                    log.error(error_message)
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
                     continue
 
         if self.status_var:
             self.status_var.set("Duplicate parcels validation completed")
 
-        print("[duplicate_parcels] Duplicate parcels validation completed")
+        log.info("[duplicate_parcels] Duplicate parcels validation completed")
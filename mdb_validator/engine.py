@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import os
+from utils import find_mdb_files, get_feature_classes, describe_feature_class, read_columns
+from columnar import iter_rows
+from progress import mdb_progress, rows_scanned, check_cancelled, stage, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("engine")
+
+
+def _merge_fields(field_lists):
+    """Ordered union of the cursor fields requested by several checks"""
+    merged = []
+    for fields in field_lists:
+        for field in fields:
+            if field not in merged:
+                merged.append(field)
+    return merged
+
+
+def scan_mdb(mdb, validators, writers):
+    """Stream every row of each feature class in an MDB through the row checks of all validators.
+
+    Each feature class is described once and its columns read in bulk, once, for the
+    union of the fields the active validators ask for. Validators with check_columns get
+    the whole columns; the others still get check_row calls.
+    """
+    fc_names = _merge_fields(v.row_feature_classes for v in validators)
+    features = get_feature_classes(mdb, fc_names)
+
+    for fc_name, full_path in features:
+        checks = [v for v in validators if fc_name in v.row_feature_classes]
+        if not checks:
+            continue
+
+        shape_type, field_names = describe_feature_class(full_path)
+
+        active = []
+        for validator in checks:
+            fields = validator.begin_feature_class(mdb, fc_name, full_path, shape_type, field_names,
+                                                   writers[validator])
+            if fields:
+                active.append((validator, fields))
+
+        if not active:
+            continue
+
+        cursor_fields = _merge_fields(fields for _, fields in active)
+        projections = [(validator, writers[validator], [cursor_fields.index(f) for f in fields])
+                       for validator, fields in active]
+
+        check_cancelled()
+        columns = read_columns(full_path, cursor_fields)
+        rows_scanned(len(columns[0]) if columns else 0)
+        for validator, writer, indexes in projections:
+            selected = [columns[i] for i in indexes]
+            with stage("check:" + validator.__class__.__name__):
+                if hasattr(validator, 'check_columns'):
+                    validator.check_columns(selected, writer)
+                else:
+                    for row in iter_rows(selected):
+                        validator.check_row(row, writer)
+
+        for validator, writer, _ in projections:
+            if hasattr(validator, 'end_feature_class'):
+                validator.end_feature_class(writer)
+
+
+class SinglePassEngine(object):
+    """Run several row-level validators with one walk of the folder and one cursor pass per feature class"""
+
+    def __init__(self, validators):
+        log.debug("[__init__] Initializing SinglePassEngine with %s validators", len(validators))
+        self.validators = list(validators)
+        self.folder_path = ""
+        self.status_var = None
+        self.failures = []
+
+    def set_status_var(self, status_var):
+        log.debug("[set_status_var] Setting status_var")
+        self.status_var = status_var
+
+    def set_folder_path(self, folder_path):
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
+        self.folder_path = folder_path
+
+    def run_validation(self):
+        log.info("[single_pass] Starting single-pass validation")
+
+        if not self.folder_path:
+            raise ValueError("[single_pass] Folder path not set")
+        if not self.validators:
+            raise ValueError("[single_pass] No row-level validators selected")
+
+        for validator in self.validators:
+            validator.prepare_validation()
+        self.failures = []
+
+        mdb_files = find_mdb_files(self.folder_path)
+        if not mdb_files:
+            raise ValueError("[single_pass] No MDB files found in the specified folder")
+
+        log.info("[single_pass] Found %s MDB files", len(mdb_files))
+
+        writers = {}
+        try:
+            for validator in self.validators:
+                output_csv = os.path.join(self.folder_path, validator.report_name)
+                writers[validator] = open_report(output_csv, validator.report_header)
+            counting_writers = dict((validator, CountingWriter(writer)) for validator, writer in writers.items())
+
+            for index, mdb in enumerate(mdb_files, start=1):
+                try:
+                    mdb_progress(index, len(mdb_files), mdb)
+                    base_name = os.path.basename(mdb)
+                    if self.status_var:
+                        self.status_var.set("Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
+
+                    log.debug("[single_pass] Processing (%s/%s) %s", index, len(mdb_files), base_name)
+                    scan_mdb(mdb, self.validators, counting_writers)
+
+                except Exception as e:
+                    error_message = "[single_pass] Error processing {}: {}".format(mdb, str(e))
+                    if self.status_var:
+                        self.status_var.set(error_message)
+                    log.error(error_message)
+                    # One bad MDB must not stop the other checks; let each validator record it
+                    for validator in self.validators:
+                        self.failures.append((mdb, validator.__class__.__name__, str(e)))
+                        if hasattr(validator, 'record_error'):
+                            validator.record_error(mdb, e, writers[validator])
+                    continue
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        if self.status_var:
+            self.status_var.set("Single-pass validation completed")
+
+        log.info("[single_pass] Single-pass validation completed")
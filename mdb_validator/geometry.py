@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+import struct
+import hashlib
+import numpy as np
+
+# WKB geometry type codes (ISO and EWKB Z/M variants are reduced to these)
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_MULTIPOINT = 4
+WKB_MULTILINESTRING = 5
+WKB_MULTIPOLYGON = 6
+
+SHAPE_TYPES = {
+    WKB_POINT: "Point",
+    WKB_LINESTRING: "Polyline",
+    WKB_POLYGON: "Polygon",
+    WKB_MULTIPOINT: "Multipoint",
+    WKB_MULTILINESTRING: "Polyline",
+    WKB_MULTIPOLYGON: "Polygon",
+}
+
+
+def ring_signed_area(ring):
+    """Shoelace area of a closed or open ring given as an (n, 2) array"""
+    x = ring[:, 0]
+    y = ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def path_length(path):
+    if len(path) < 2:
+        return 0.0
+    return float(np.sqrt((np.diff(path, axis=0) ** 2).sum(axis=1)).sum())
+
+
+def close_ring(ring):
+    if len(ring) and not np.array_equal(ring[0], ring[-1]):
+        return np.vstack([ring, ring[:1]])
+    return ring
+
+
+class Geometry(object):
+    """Geometry held as NumPy coordinate arrays.
+
+    parts is a list of polygons (each a list of rings, outer ring first) for Polygon,
+    a list of paths for Polyline and a list of single-point arrays for Point/Multipoint.
+    Every ring, path and point is an (n, 2) float64 array of x, y.
+    """
+
+    def __init__(self, shape_type, parts):
+        self.shape_type = shape_type
+        self.parts = parts
+
+    def rings(self):
+        if self.shape_type != "Polygon":
+            return []
+        return [ring for polygon in self.parts for ring in polygon]
+
+    def arrays(self):
+        """Every coordinate array of the geometry"""
+        if self.shape_type == "Polygon":
+            return self.rings()
+        return list(self.parts)
+
+    @property
+    def point_count(self):
+        return sum(len(array) for array in self.arrays())
+
+    @property
+    def is_empty(self):
+        return self.point_count == 0
+
+    @property
+    def area(self):
+        if self.shape_type != "Polygon":
+            return 0.0
+        total = 0.0
+        for polygon in self.parts:
+            if not polygon:
+                continue
+            total += abs(ring_signed_area(polygon[0]))
+            total -= sum(abs(ring_signed_area(hole)) for hole in polygon[1:])
+        return total
+
+    @property
+    def length(self):
+        if self.shape_type == "Polygon":
+            return sum(path_length(close_ring(ring)) for ring in self.rings())
+        if self.shape_type == "Polyline":
+            return sum(path_length(path) for path in self.parts)
+        return 0.0
+
+    @property
+    def extent(self):
+        """(xmin, ymin, xmax, ymax), or None for an empty geometry"""
+        arrays = [array for array in self.arrays() if len(array)]
+        if not arrays:
+            return None
+        coords = np.vstack(arrays)
+        return (float(coords[:, 0].min()), float(coords[:, 1].min()),
+                float(coords[:, 0].max()), float(coords[:, 1].max()))
+
+    @property
+    def centroid(self):
+        """Area-weighted centroid for polygons, vertex mean otherwise"""
+        if self.shape_type == "Polygon":
+            weighted_x = weighted_y = total = 0.0
+            for ring in self.rings():
+                x = ring[:, 0]
+                y = ring[:, 1]
+                x1 = np.roll(x, -1)
+                y1 = np.roll(y, -1)
+                cross = x * y1 - x1 * y
+                # Holes run the other way round, so their cross sums subtract themselves
+                weighted_x += float(((x + x1) * cross).sum())
+                weighted_y += float(((y + y1) * cross).sum())
+                total += float(cross.sum())
+            if total:
+                return weighted_x / (3.0 * total), weighted_y / (3.0 * total)
+        arrays = [array for array in self.arrays() if len(array)]
+        if not arrays:
+            return None
+        coords = np.vstack(arrays)
+        return float(coords[:, 0].mean()), float(coords[:, 1].mean())
+
+
+class _WKBReader(object):
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def _unpack(self, byte_order, fmt, size):
+        value = struct.unpack_from(byte_order + fmt, self.data, self.offset)
+        self.offset += size
+        return value
+
+    def _coords(self, byte_order, count, dims):
+        dtype = np.dtype(np.float64).newbyteorder(byte_order)
+        array = np.frombuffer(self.data, dtype=dtype, count=count * dims, offset=self.offset)
+        self.offset += 8 * count * dims
+        return array.reshape(count, dims)[:, :2].astype(np.float64)
+
+    def read(self):
+        """Return (base type code, parts) of the next WKB geometry"""
+        byte_order = '<' if struct.unpack_from('B', self.data, self.offset)[0] == 1 else '>'
+        self.offset += 1
+        type_code = self._unpack(byte_order, 'I', 4)[0]
+
+        dims = 2
+        if type_code & 0x80000000 or type_code & 0x40000000:  # EWKB Z / M flags
+            dims += bool(type_code & 0x80000000) + bool(type_code & 0x40000000)
+            if type_code & 0x20000000:  # EWKB SRID
+                self.offset += 4
+            type_code &= 0x0FFFFFFF
+        elif type_code > 1000:  # ISO Z (1000), M (2000), ZM (3000)
+            dims += {1: 1, 2: 1, 3: 2}[type_code // 1000]
+            type_code %= 1000
+
+        if type_code == WKB_POINT:
+            return type_code, [self._coords(byte_order, 1, dims)]
+        if type_code == WKB_LINESTRING:
+            count = self._unpack(byte_order, 'I', 4)[0]
+            return type_code, [self._coords(byte_order, count, dims)]
+        if type_code == WKB_POLYGON:
+            rings = []
+            for _ in range(self._unpack(byte_order, 'I', 4)[0]):
+                count = self._unpack(byte_order, 'I', 4)[0]
+                rings.append(self._coords(byte_order, count, dims))
+            return type_code, [rings]
+        if type_code in (WKB_MULTIPOINT, WKB_MULTILINESTRING, WKB_MULTIPOLYGON):
+            parts = []
+            for _ in range(self._unpack(byte_order, 'I', 4)[0]):
+                parts.extend(self.read()[1])
+            return type_code, parts
+        raise ValueError("[geometry] Unsupported WKB geometry type: {}".format(type_code))
+
+
+def from_wkb(data):
+    """Build a Geometry from a WKB (or EWKB / ISO Z) blob"""
+    if data is None:
+        return None
+    type_code, parts = _WKBReader(bytes(data)).read()
+    return Geometry(SHAPE_TYPES[type_code], parts)
+
+
+def from_gpkg_blob(data):
+    """Build a Geometry from a GeoPackage geometry blob (GP header + WKB)"""
+    if data is None:
+        return None
+    data = bytes(data)
+    if data[:2] != b"GP":
+        return from_wkb(data)
+    flags = struct.unpack_from('B', data, 3)[0]
+    envelope_size = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}[(flags >> 1) & 0x07]
+    type_code, parts = _WKBReader(data, 8 + envelope_size).read()
+    return Geometry(SHAPE_TYPES[type_code], parts)
+
+
+def snap(array, tolerance):
+    """Vertices as integer multiples of tolerance"""
+    return np.round(array / tolerance).astype('<i8')
+
+
+def _drop_repeats(vertices):
+    if len(vertices) < 2:
+        return vertices
+    keep = np.ones(len(vertices), dtype=bool)
+    keep[1:] = (vertices[1:] != vertices[:-1]).any(axis=1)
+    return vertices[keep]
+
+
+def _canonical_ring(ring):
+    """Byte string of a snapped ring independent of its start vertex and direction"""
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+    ring = _drop_repeats(ring)
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+    if not len(ring):
+        return b""
+    lowest = ring[np.lexsort((ring[:, 1], ring[:, 0]))[0]]
+    starts = np.flatnonzero((ring == lowest).all(axis=1))
+    candidates = []
+    for start in starts:
+        forward = np.roll(ring, -start, axis=0)
+        candidates.append(forward.tobytes())
+        candidates.append(np.vstack([forward[:1], forward[:0:-1]]).tobytes())
+    return min(candidates)
+
+
+def fingerprint(geometry, tolerance):
+    """SHA-1 hex digest that is equal for geometries whose vertices snap to the same tolerance grid.
+
+    Rings are compared regardless of start vertex and direction, paths regardless of
+    direction, and parts regardless of order. Vertices within tolerance of each other
+    match unless they fall on different sides of a grid line.
+
+    All the rings of a polygon are sorted together, so whether a ring is an outer ring
+    or a hole is not part of the fingerprint: a square with a square hole matches the
+    two squares as separate parts.
+    """
+    parts = []
+    for array in geometry.arrays():
+        vertices = snap(array, tolerance)
+        if geometry.shape_type == "Polygon":
+            parts.append(_canonical_ring(vertices))
+        elif geometry.shape_type == "Polyline":
+            vertices = _drop_repeats(vertices)
+            parts.append(min(vertices.tobytes(), vertices[::-1].tobytes()))
+        else:
+            parts.append(vertices.tobytes())
+
+    digest = hashlib.sha1(geometry.shape_type.encode('ascii'))
+    for part in sorted(parts):
+        digest.update(struct.pack('<I', len(part)))
+        digest.update(part)
+    return digest.hexdigest()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+import math
+from backends import arcpy
+from spatial_index import GridIndex
+from topology_engine import extent_box
+from progress import stage
+from logs import get_logger
+
+log = get_logger("gridsheet")
+
+# Loaded gridsheets of this process, by path: (modification time, GridSheetIndex)
+_gridsheets = {}
+
+# Relative slack when deciding whether the sheets form a regular grid
+GRID_TOLERANCE = 1e-6
+
+
+class GridSheetIndex(object):
+    """The sheet polygons of a gridsheet template with a bounding-box index over them.
+
+    Replaces intersecting the whole template with every Parcel class: a parcel is only
+    tested against the few sheets whose extents meet its own. When the sheets are equal
+    rectangles on a regular grid (the usual case), the sheet of a point or of a parcel
+    inside one sheet is found by arithmetic from the grid origin and cell size.
+    """
+
+    def __init__(self, sheets):
+        # {oid: (PageNumber, polygon)}
+        self.sheets = sheets
+        self.index = GridIndex.for_boxes((oid, extent_box(shape)) for oid, (page, shape) in sheets.items())
+        # (x origin, y origin, cell width, cell height, {(col, row): oid}), or None for irregular sheets
+        self.layout = self._grid_layout()
+
+    @classmethod
+    def load(cls, gridsheet_path):
+        sheets = {}
+        with arcpy.da.SearchCursor(gridsheet_path, ["OID@", "PageNumber", "SHAPE@"]) as cursor:
+            for oid, page, shape in cursor:
+                if shape is not None:
+                    sheets[oid] = (page, shape)
+        return cls(sheets)
+
+    def pages_of(self, shape):
+        """PageNumbers of the sheets sharing area with a polygon, in sheet OID order"""
+        pages = []
+        for oid in sorted(self.index.query(extent_box(shape))):
+            page, sheet = self.sheets[oid]
+            if not (sheet.disjoint(shape) or sheet.touches(shape)):
+                pages.append(page)
+        return pages
+
+    def _grid_layout(self):
+        boxes = [(oid, extent_box(shape), shape) for oid, (page, shape) in self.sheets.items()]
+        if not boxes:
+            return None
+        width = boxes[0][1][2] - boxes[0][1][0]
+        height = boxes[0][1][3] - boxes[0][1][1]
+        if width <= 0 or height <= 0:
+            return None
+        x0 = min(box[0] for oid, box, shape in boxes)
+        y0 = min(box[1] for oid, box, shape in boxes)
+
+        cells = {}
+        for oid, box, shape in boxes:
+            if abs(box[2] - box[0] - width) > width * GRID_TOLERANCE or \
+                    abs(box[3] - box[1] - height) > height * GRID_TOLERANCE:
+                return None
+            # A rectangle fills its extent; anything else is not a grid cell
+            if abs(shape.area - width * height) > width * height * GRID_TOLERANCE:
+                return None
+            col = (box[0] - x0) / width
+            row = (box[1] - y0) / height
+            if abs(col - round(col)) > GRID_TOLERANCE or abs(row - round(row)) > GRID_TOLERANCE:
+                return None
+            cell = (int(round(col)), int(round(row)))
+            if cell in cells:
+                return None
+            cells[cell] = oid
+        return x0, y0, width, height, cells
+
+    def _page_at(self, x, y):
+        """PageNumber of the sheet containing a point on a regular grid, None outside the gridsheet"""
+        x0, y0, width, height, cells = self.layout
+        oid = cells.get((int(math.floor((x - x0) / width)), int(math.floor((y - y0) / height))))
+        return self.sheets[oid][0] if oid is not None else None
+
+    def _single_cell_page(self, box):
+        """PageNumber of the one grid cell a box lies in, None if it crosses a sheet line"""
+        x0, y0, width, height, cells = self.layout
+        col = int(math.floor((box[0] - x0) / width))
+        row = int(math.floor((box[1] - y0) / height))
+        # Edges lying on a sheet line still belong to the sheet on their inner side
+        if max(col, int(math.ceil((box[2] - x0) / width)) - 1) != col or \
+                max(row, int(math.ceil((box[3] - y0) / height)) - 1) != row:
+            return None
+        oid = cells.get((col, row))
+        return self.sheets[oid][0] if oid is not None else None
+
+    def _page_containing(self, point, spatial_reference):
+        point_geometry = arcpy.PointGeometry(point, spatial_reference)
+        for oid in sorted(self.index.query((point.X, point.Y, point.X, point.Y))):
+            page, sheet = self.sheets[oid]
+            if sheet.contains(point_geometry):
+                return page
+        return None
+
+    def locate(self, shape):
+        """(PageNumber at the label point, PageNumbers of every sheet sharing area) of a parcel.
+
+        Only parcels crossing a sheet line (or any parcel on an irregular gridsheet) are
+        intersected with the sheets; the rest are placed from their extent alone.
+        """
+        if self.layout:
+            page = self._single_cell_page(extent_box(shape))
+            if page is not None:
+                return page, [page]
+            point = shape.labelPoint
+            return self._page_at(point.X, point.Y), self.pages_of(shape)
+
+        pages = self.pages_of(shape)
+        if len(pages) == 1:
+            return pages[0], pages
+        return self._page_containing(shape.labelPoint, shape.spatialReference), pages
+
+
+def load_gridsheet(gridsheet_path):
+    """GridSheetIndex of a gridsheet template, read once per process and reused until the file changes"""
+    mtime = os.path.getmtime(gridsheet_path) if os.path.exists(gridsheet_path) else None
+    cached = _gridsheets.get(gridsheet_path)
+    if cached is None or cached[0] != mtime:
+        log.info("[gridsheet] Loading gridsheet: %s", gridsheet_path)
+        with stage("load_gridsheet"):
+            cached = (mtime, GridSheetIndex.load(gridsheet_path))
+        _gridsheets[gridsheet_path] = cached
+    return cached[1]
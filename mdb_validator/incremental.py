@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from utils import find_mdb_files
+from parallel import validate_files, merge_fragments, fragment_path, _validator_state
+from reports import report_format
+from logs import get_logger
+
+log = get_logger("incremental")
+
+RESULTS_DIR_NAME = ".mdb_validator_results"
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha1(path, block_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            digest.update(block)
+            block = f.read(block_size)
+    return digest.hexdigest()
+
+
+def mdb_key(mdb):
+    """Stable manifest key of an MDB path (paths themselves may not survive a JSON round trip)"""
+    path = os.path.normcase(os.path.abspath(mdb))
+    if not isinstance(path, bytes):
+        path = path.encode('utf-8')
+    return hashlib.sha1(path).hexdigest()
+
+
+def validator_key(validator):
+    """Name a validator's result set by its class and settings, so changing e.g. the scale re-runs it"""
+    settings = sorted((key, value) for key, value in _validator_state(validator).items()
+                      if not key.startswith('_') and isinstance(value, (basestring, int, float, bool, dict)))
+    if not validator.report_name:
+        # Validators writing their own per-MDB reports write them in the report format
+        settings.append(("report_format", report_format()))
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return "{}_{}".format(validator.__class__.__name__, digest)
+
+
+class IncrementalValidationRunner(object):
+    """Re-validate only the MDBs that are new or changed since the previous run.
+
+    Report rows are kept per (validator, MDB) as fragments in .mdb_validator_results,
+    together with the SHA-1 of the MDB they were produced from. Unchanged MDBs reuse
+    their fragments, deleted MDBs are dropped, and the numbered reports are reassembled
+    from the fragments in find_mdb_files order.
+    """
+
+    def __init__(self, validators, workers=1):
+        self.validators = list(validators)
+        self.workers = workers
+        self.folder_path = ""
+        self.status_var = None
+        self.failures = []
+        log.debug("[__init__] Initialized IncrementalValidationRunner")
+
+    def set_status_var(self, status_var):
+        log.debug("[set_status_var] Setting status_var")
+        self.status_var = status_var
+
+    def set_folder_path(self, folder_path):
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
+        self.folder_path = folder_path
+
+    def _update_status(self, message):
+        if self.status_var:
+            self.status_var.set(message)
+        log.info(message)
+
+    def _load_manifest(self, manifest_path):
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                log.warning("[incremental] Manifest unreadable, starting over: %s", manifest_path)
+        return {"files": {}, "validators": {}}
+
+    def _save_manifest(self, manifest_path, manifest):
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        os.rename(temp_path, manifest_path)
+
+    def _fingerprint(self, mdb, known):
+        """SHA-1 of an MDB, only re-hashed when its mtime or size moved"""
+        stat = os.stat(mdb)
+        if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+            return known
+        return {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": file_sha1(mdb)}
+
+    def _fragment_path(self, results_dir, key, mdb):
+        return os.path.join(results_dir, key, mdb_key(mdb) + ".csv")
+
+    def run_validation(self):
+        log.info("[incremental] Starting incremental validation")
+
+        if not self.folder_path:
+            raise ValueError("[incremental] Folder path not set")
+        if not self.validators:
+            raise ValueError("[incremental] No validators selected")
+
+        for validator in self.validators:
+            validator.prepare_validation()
+
+        mdb_files = find_mdb_files(self.folder_path)
+        if not mdb_files:
+            raise ValueError("[incremental] No MDB files found in the specified folder")
+
+        results_dir = os.path.join(self.folder_path, RESULTS_DIR_NAME)
+        if not os.path.exists(results_dir):
+            os.makedirs(results_dir)
+        manifest_path = os.path.join(results_dir, MANIFEST_NAME)
+        manifest = self._load_manifest(manifest_path)
+
+        keys = [validator_key(validator) for validator in self.validators]
+        for key in keys:
+            manifest["validators"].setdefault(key, {})
+            if not os.path.exists(os.path.join(results_dir, key)):
+                os.makedirs(os.path.join(results_dir, key))
+
+        # Drop fingerprints and fragments of MDBs that are gone
+        present = set(mdb_key(mdb) for mdb in mdb_files)
+        for path_key in list(manifest["files"]):
+            if path_key not in present:
+                del manifest["files"][path_key]
+        for key, entries in manifest["validators"].items():
+            for path_key in list(entries):
+                if path_key not in present:
+                    fragment = os.path.join(results_dir, key, path_key + ".csv")
+                    if os.path.exists(fragment):
+                        os.remove(fragment)
+                    del entries[path_key]
+
+        fingerprints = {}
+        tasks = []
+        for mdb_index, mdb in enumerate(mdb_files):
+            path_key = mdb_key(mdb)
+            fingerprints[path_key] = self._fingerprint(mdb, manifest["files"].get(path_key))
+            stale = [validator_index for validator_index, key in enumerate(keys)
+                     if manifest["validators"][key].get(path_key, {}).get("sha1") != fingerprints[path_key]["sha1"]]
+            if stale:
+                tasks.append((mdb_index, mdb, stale))
+
+        self._update_status("[incremental] {} of {} MDB files are new or changed".format(len(tasks), len(mdb_files)))
+
+        partial_dir = tempfile.mkdtemp(prefix="mdb_validator_")
+        self.failures = []
+
+        def progress(done, total, mdb_index, mdb_results, mdb_errors):
+            mdb = mdb_files[mdb_index]
+            for validator_index, error in mdb_errors.items():
+                self.failures.append((mdb, self.validators[validator_index].__class__.__name__, error))
+                log.error("[incremental] Error in %s for %s: %s",
+                          self.validators[validator_index].__class__.__name__, mdb, error)
+            self._update_status("[incremental] Re-validated ({}/{}) {}".format(done, total, os.path.basename(mdb)))
+
+        try:
+            results, errors = validate_files(self.validators, tasks, partial_dir, self.workers, progress)
+
+            for mdb_index, mdb, stale in tasks:
+                path_key = mdb_key(mdb)
+                # Fingerprint again after validating: the topology check itself rewrites the MDB
+                fingerprint = self._fingerprint(mdb, fingerprints[path_key])
+                fingerprints[path_key] = fingerprint
+                for validator_index in stale:
+                    key = keys[validator_index]
+                    if (validator_index, mdb_index) in errors:
+                        # Leave it stale so the next run retries it
+                        manifest["validators"][key].pop(path_key, None)
+                        continue
+                    fragment = fragment_path(partial_dir, validator_index, mdb_index)
+                    if os.path.exists(fragment):
+                        target = self._fragment_path(results_dir, key, mdb)
+                        if os.path.exists(target):
+                            os.remove(target)
+                        shutil.move(fragment, target)
+                    manifest["validators"][key][path_key] = {
+                        "sha1": fingerprint["sha1"],
+                        "result": results.get((validator_index, mdb_index)),
+                    }
+            manifest["files"].update(fingerprints)
+            self._save_manifest(manifest_path, manifest)
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+
+        for validator_index, validator in enumerate(self.validators):
+            key = keys[validator_index]
+            entries = manifest["validators"][key]
+            if validator.report_name:
+                parts = []
+                for mdb_index, mdb in enumerate(mdb_files):
+                    fragment = self._fragment_path(results_dir, key, mdb)
+                    parts.append((mdb, fragment if mdb_key(mdb) in entries else None,
+                                  errors.get((validator_index, mdb_index))))
+                merge_fragments(validator, os.path.join(self.folder_path, validator.report_name), parts)
+
+            if hasattr(validator, 'finish_validation'):
+                # JSON turns result tuples into lists
+                stored = [entries[mdb_key(mdb)]["result"] for mdb in mdb_files if mdb_key(mdb) in entries]
+                validator.finish_validation(
+                    mdb_files, [tuple(result) if isinstance(result, list) else result for result in stored
+                                if result is not None])
+
+        if self.failures:
+            self._update_status("[incremental] Completed with {} failed MDB checks".format(len(self.failures)))
+        else:
+            self._update_status("[incremental] Incremental validation completed")
@@ -1,70 +1,89 @@
 # invalid_parcelnum.py
-import csv
 import os
 
-import arcpy
+from utils import find_mdb_files
+from engine import scan_mdb
+from columnar import flag_values, flagged_rows
+from progress import mdb_progress, CountingWriter
+from reports import open_report
+from logs import get_logger
 
-from utils import find_mdb_files, get_feature_classes
+log = get_logger("invalid_parcelnum")
 
 
 class InvalidParcelNumValidator(object):
+    report_name = "07_invalid_parcel_no_report.csv"
+    report_header = ["Source File", "Parcel Number"]
+    row_feature_classes = ["Parcel"]
+    valid_parcelno = set(str(i) for i in range(0, 9999))
+
     def __init__(self):
-        print("[__init__] Initializing InvalidParcelNumberValidator")
+        log.debug("[__init__] Initializing InvalidParcelNumberValidator")
         self.folder_path = ""
         self.status_var = None
+        self.failures = []
 
     def set_folder_path(self, path):
-        print("[set_folder_path] Setting folder path to: {}".format(path))
+        log.debug("[set_folder_path] Setting folder path to: %s", path)
         self.folder_path = path
 
     def set_status_var(self, var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = var
 
-    def run_validation(self):
-        print("[invalid_parcel_no] Starting Invalid Parcel Number validation")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[invalid_parcel_no] Folder path not set")
 
-        output_csv = os.path.join(self.folder_path, "07_invalid_parcel_no_report.csv")
+    def begin_feature_class(self, mdb, fc_name, full_path, shape_type, field_names, writer):
+        self._current_mdb = mdb
+        return ["PARCELNO"]
+
+    def is_invalid(self, parcel_no):
+        return (str(parcel_no) if parcel_no is not None else "") not in self.valid_parcelno
+
+    def check_columns(self, columns, writer):
+        invalid = flag_values(columns[0], self.is_invalid)
+        for (parcel_no,) in flagged_rows(columns, invalid):
+            writer.writerow([self._current_mdb, parcel_no])
+
+    def validate_mdb(self, mdb, writer):
+        scan_mdb(mdb, [self], {self: writer})
+
+    def run_validation(self):
+        log.info("[invalid_parcel_no] Starting Invalid Parcel Number validation")
+
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
-        valid_parcelno = set(str(i) for i in range(0, 9999))
         if not mdb_files:
             raise ValueError("[invalid_parcel_no] No MDB files found in the specified folder")
 
-        print("[invalid_parcel_no] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Source File", "Parcel Number"])
+        log.info("[invalid_parcel_no] Found %s MDB files", len(mdb_files))
 
+        with open_report(output_csv, self.report_header) as writer:
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
 
-                    print("[invalid_parcel_no] Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
-
-                    parcels = get_feature_classes(mdb, ["Parcel"])
-                    print("[invalid_parcel_no] Found {} Parcel feature classes in {}".format(len(parcels), base_name))
+                    log.debug("[invalid_parcel_no] Processing (%s/%s) %s", index, len(mdb_files), base_name)
 
-                    for fc_name, full_path in parcels:
-                        with arcpy.da.SearchCursor(full_path, ["PARCELNO"]) as cursor:
-                            for row in cursor:
-                                parcel_no = str(row[0]) if row[0] is not None else ""
-                                if parcel_no not in valid_parcelno:
-                                    writer.writerow([mdb, row[0]])
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_message = "[invalid_parcel_no] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
-                    raise
+                    log.error(error_message)
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
 
         if self.status_var:
             self.status_var.set("Invalid parcel no validation completed")
 
-        print("[invalid_ward] Invalid parcel no validation completed")
+        log.info("[invalid_ward] Invalid parcel no validation completed")
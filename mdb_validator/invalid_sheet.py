@@ -1,36 +1,44 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-from utils import find_mdb_files, get_feature_classes
+from utils import find_mdb_files
+from engine import scan_mdb
+from columnar import flag_values, flagged_rows
+from progress import mdb_progress, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("invalid_sheet")
 
 
 class InvalidSheetValidator:
+    report_name = "01_invalid_sheet_numbers_report.csv"
+    report_header = ["MDB File Path", "PARCELNO", "GRIDS1", "Status"]
+    row_feature_classes = ["Parcel"]
+
     def __init__(self):
-        print("[__init__] Initializing InvalidSheetValidator")
+        log.debug("[__init__] Initializing InvalidSheetValidator")
         self.folder_path = ""
         self.scale = ""
         self.status_var = None
+        self.failures = []
         self.scale_values = {
             "500": "5554", "600": "5553", "1200": "5555", "1250": "5556",
             "2400": "5557", "2500": "5558", "4800": "5559"
         }
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
     def set_scale(self, scale):
-        print("[set_scale] Setting scale to: {}".format(scale))
+        log.debug("[set_scale] Setting scale to: %s", scale)
         self.scale = scale
 
-    def run_validation(self):
-        print("[invalid_sheet] Starting validation process")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[invalid_sheet] Folder path not set")
         if not self.scale:
@@ -39,46 +47,59 @@ class InvalidSheetValidator:
         scale_value = self.scale_values.get(self.scale)
         if not scale_value:
             raise ValueError("[invalid_sheet] Invalid scale value: {}".format(self.scale))
+        self._scale_value = scale_value
+
+    def begin_feature_class(self, mdb, fc_name, full_path, shape_type, field_names, writer):
+        self._current_mdb = mdb
+        return ["PARCELNO", "GRIDS1"]
+
+    def is_invalid(self, grids1):
+        return not (str(grids1) if grids1 is not None else "").startswith(self._scale_value)
+
+    def check_columns(self, columns, writer):
+        invalid = flag_values(columns[1], self.is_invalid)
+        for parcel_no, grids1 in flagged_rows(columns, invalid):
+            writer.writerow([self._current_mdb, parcel_no, str(grids1) if grids1 is not None else "",
+                             "Invalid GRIDS1 (does not match selected scale)"])
 
-        output_csv = os.path.join(self.folder_path, "01_invalid_sheet_numbers_report.csv")
+    def validate_mdb(self, mdb, writer):
+        scan_mdb(mdb, [self], {self: writer})
+
+    def run_validation(self):
+        log.info("[invalid_sheet] Starting validation process")
+
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
 
         if not mdb_files:
             raise ValueError("[invalid_sheet] No MDB files found in the specified folder")
 
-        print("[invalid_sheet] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["MDB File Path", "PARCELNO", "GRIDS1", "Status"])
+        log.info("[invalid_sheet] Found %s MDB files", len(mdb_files))
 
+        with open_report(output_csv, self.report_header) as writer:
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
 
-                    print("[invalid_sheet] Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
-
-                    parcels = get_feature_classes(mdb, ["Parcel"])
-                    print("[invalid_sheet] Found {} Parcel feature classes in {}".format(len(parcels), base_name))
+                    log.debug("[invalid_sheet] Processing (%s/%s) %s", index, len(mdb_files), base_name)
 
-                    for fc_name, full_path in parcels:
-                        with arcpy.da.SearchCursor(full_path, ["PARCELNO", "GRIDS1"]) as cursor:
-                            for row in cursor:
-                                grids1 = str(row[1]) if row[1] is not None else ""
-                                if not grids1.startswith(scale_value):
-                                    writer.writerow([mdb, row[0], grids1,
-                                                     "Invalid GRIDS1 (does not match selected scale)"])
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_message = "[invalid_sheet] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
-                    raise
+                    log.error(error_message)
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
 
         if self.status_var:
             self.status_var.set("Invalid sheet numbers validation completed")
 
-        print("[invalid_sheet] Invalid sheet numbers validation completed")
+        log.info("[invalid_sheet] Invalid sheet numbers validation completed")
@@ -1,69 +1,89 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-from utils import find_mdb_files, get_feature_classes
+from utils import find_mdb_files
+from engine import scan_mdb
+from columnar import flag_values, flagged_rows
+from progress import mdb_progress, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("invalid_ward")
 
 
 class InvalidWardValidator:
+    report_name = "02_invalid_ward_numbers_report.csv"
+    report_header = ["Source File", "Parcel Number", "WARDNO"]
+    row_feature_classes = ["Parcel"]
+    valid_wards = set(str(i) for i in range(1, 10)) | set("{:02}".format(i) for i in range(1, 10))
+
     def __init__(self):
-        print("[__init__] Initializing InvalidWardValidator")
+        log.debug("[__init__] Initializing InvalidWardValidator")
         self.folder_path = ""
         self.status_var = None
+        self.failures = []
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
-    def run_validation(self):
-        print("[invalid_ward] Starting validation process")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[invalid_ward] Folder path not set")
 
-        output_csv = os.path.join(self.folder_path, "02_invalid_ward_numbers_report.csv")
+    def begin_feature_class(self, mdb, fc_name, full_path, shape_type, field_names, writer):
+        self._current_mdb = mdb
+        return ["PARCELNO", "WARDNO"]
+
+    def is_invalid(self, ward_no):
+        return (str(ward_no) if ward_no is not None else "") not in self.valid_wards
+
+    def check_columns(self, columns, writer):
+        invalid = flag_values(columns[1], self.is_invalid)
+        for parcel_no, ward_no in flagged_rows(columns, invalid):
+            writer.writerow([self._current_mdb, parcel_no, ward_no])
+
+    def validate_mdb(self, mdb, writer):
+        scan_mdb(mdb, [self], {self: writer})
+
+    def run_validation(self):
+        log.info("[invalid_ward] Starting validation process")
+
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
-        valid_wards = set(str(i) for i in range(1, 10)) | set("{:02}".format(i) for i in range(1, 10))
 
         if not mdb_files:
             raise ValueError("[invalid_ward] No MDB files found in the specified folder")
 
-        print("[invalid_ward] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Source File", "Parcel Number", "WARDNO"])
+        log.info("[invalid_ward] Found %s MDB files", len(mdb_files))
 
+        with open_report(output_csv, self.report_header) as writer:
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
 
-                    print("[invalid_ward] Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
-
-                    parcels = get_feature_classes(mdb, ["Parcel"])
-                    print("[invalid_ward] Found {} Parcel feature classes in {}".format(len(parcels), base_name))
+                    log.debug("[invalid_ward] Processing (%s/%s) %s", index, len(mdb_files), base_name)
 
-                    for fc_name, full_path in parcels:
-                        with arcpy.da.SearchCursor(full_path, ["PARCELNO", "WARDNO"]) as cursor:
-                            for row in cursor:
-                                ward_no = str(row[1]) if row[1] is not None else ""
-                                if ward_no not in valid_wards:
-                                    writer.writerow([mdb, row[0], row[1]])
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_message = "[invalid_ward] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
-                    raise
+                    log.error(error_message)
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
 
         if self.status_var:
             self.status_var.set("Invalid ward numbers validation completed")
 
-        print("[invalid_ward] Invalid ward numbers validation completed")
+        log.info("[invalid_ward] Invalid ward numbers validation completed")
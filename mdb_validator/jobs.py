@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from duplicate_parcels import DuplicateParcelsValidator
+from small_areas import SmallAreasValidator
+from invalid_sheet import InvalidSheetValidator
+from invalid_ward import InvalidWardValidator
+from duplicate_const_and_segments import DuplicateConstAndSegmentsValidator
+from segment_counts import SegmentCountsValidator
+from sheet_number import SheetNumberValidator
+from topology_check import ParcelOverlapValidator
+from suspicious_column import SuspiciousColumnValidator
+from invalid_parcelnum import InvalidParcelNumValidator
+from cross_mdb_duplicates import CrossMDBDuplicatesValidator
+from engine import SinglePassEngine
+from parallel import ParallelValidationRunner
+from incremental import IncrementalValidationRunner
+from checkpoint import ResumableValidationRunner
+
+# (key, display name, class) of every validator, in the order the GUI lists and runs them
+VALIDATORS = [
+    ("invalid_sheet", "Invalid Sheet Numbers", InvalidSheetValidator),
+    ("invalid_ward", "Invalid Ward Numbers", InvalidWardValidator),
+    ("sheet_number", "Sheet Number Check", SheetNumberValidator),
+    ("duplicate_parcels", "Duplicate Parcels", DuplicateParcelsValidator),
+    ("cross_mdb_duplicates", "Cross-MDB Duplicate Parcels", CrossMDBDuplicatesValidator),
+    ("duplicate_const_and_segments", "Duplicate Segment & Const", DuplicateConstAndSegmentsValidator),
+    ("small_areas", "Small Areas", SmallAreasValidator),
+    ("segment_counts", "Segment Counts", SegmentCountsValidator),
+    ("invalid_parcel_no", "Invalid Parcel Number", InvalidParcelNumValidator),
+    ("parcel_overlaps", "Parcel Overlaps (Topology)", ParcelOverlapValidator),
+    ("suspicious_column", "Suspicious Column", SuspiciousColumnValidator),
+]
+
+SCALES = ["500", "600", "1200", "1250", "2400", "2500", "4800"]
+GRIDSHEETS = ["Gridsheet_81.shp", "Gridsheet_84.shp", "Gridsheet_87.shp"]
+TOLERANCES = ["0.001 Meters", "0.01 Meters", "0.1 Meters", "1 Meter"]
+
+
+def create_validators(keys):
+    """Instantiate the validators named by keys, as (name, validator) pairs in VALIDATORS order"""
+    known = [key for key, name, validator_class in VALIDATORS]
+    unknown = [key for key in keys if key not in known]
+    if unknown:
+        raise ValueError("[jobs] Unknown validators: {} (choose from {})".format(
+            ", ".join(unknown), ", ".join(known)))
+    return [(name, validator_class()) for key, name, validator_class in VALIDATORS if key in keys]
+
+
+def configure_validator(validator, folder_path, scale=None, gridsheet=None, tolerance=None,
+                        keep_topology=False, in_memory=True, geometry_duplicates=False, point_in_sheet=False,
+                        snapshot=True, sliver_thresholds=None, min_gap_area=None):
+    """Apply the run options to one validator"""
+    validator.set_folder_path(folder_path)
+
+    # Set scale if validator needs it
+    if hasattr(validator, 'set_scale'):
+        validator.set_scale(scale)
+
+    # Set gridsheet if validator needs it
+    if hasattr(validator, 'set_gridsheet'):
+        validator.set_gridsheet(gridsheet)
+        validator.point_in_sheet = point_in_sheet
+
+    # Cluster tolerance for the topology and duplicate geometry checks
+    if tolerance and hasattr(validator, 'cluster_tolerance'):
+        validator.cluster_tolerance = tolerance
+
+    # Small area and sliver thresholds per feature class
+    if sliver_thresholds and hasattr(validator, 'set_thresholds'):
+        validator.set_thresholds(sliver_thresholds)
+
+    if isinstance(validator, DuplicateConstAndSegmentsValidator):
+        validator.match_geometry = geometry_duplicates
+
+    # Set topology options for ParcelOverlapValidator
+    if isinstance(validator, ParcelOverlapValidator):
+        validator.keep_topology = keep_topology
+        validator.in_memory = in_memory
+        validator.snapshot = snapshot
+        if min_gap_area is not None:
+            if float(min_gap_area) < 0:
+                raise ValueError("[jobs] Invalid minimum gap area: {}".format(min_gap_area))
+            validator.min_gap_area = float(min_gap_area)
+
+
+def build_jobs(selected, folder_path, status_var=None, workers=1, incremental=False, resume=False):
+    """Group the selected (name, validator) pairs into (name, job, validator_count) jobs.
+
+    Incremental, resumable or parallel runs take every per-MDB validator; otherwise the
+    row-level checks on Parcel share one folder walk and one columnar read per feature class.
+    """
+    if incremental and resume:
+        raise ValueError("[jobs] Incremental and resumable runs cannot be combined")
+    row_validators = [validator for name, validator in selected if hasattr(validator, 'begin_feature_class')]
+    per_mdb_validators = [validator for name, validator in selected if hasattr(validator, 'validate_mdb')]
+
+    if incremental and per_mdb_validators:
+        grouped, runner = per_mdb_validators, IncrementalValidationRunner(per_mdb_validators, workers)
+        label = "Incremental validation"
+    elif resume and per_mdb_validators:
+        grouped, runner = per_mdb_validators, ResumableValidationRunner(per_mdb_validators, workers)
+        label = "Resumable validation"
+    elif workers > 1 and per_mdb_validators:
+        grouped, runner = per_mdb_validators, ParallelValidationRunner(per_mdb_validators, workers)
+        label = "Parallel validation"
+    elif len(row_validators) > 1:
+        grouped, runner = row_validators, SinglePassEngine(row_validators)
+        label = "Single-pass row checks"
+    else:
+        return [(name, validator, 1) for name, validator in selected]
+
+    runner.set_folder_path(folder_path)
+    runner.set_status_var(status_var)
+    jobs = [(label, runner, len(grouped))]
+    jobs += [(name, validator, 1) for name, validator in selected if validator not in grouped]
+    return jobs
+
+
+def job_failures(job):
+    """Per-MDB failures a runner recorded without raising, as (mdb, validator name, error)"""
+    return list(getattr(job, 'failures', []))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Logging for the validators.
+
+Every module logs through get_logger(tag), a child of the "mdb_validator" logger.
+Messages keep their "[tag] ..." form on the console; per-MDB and per-feature-class
+lines are DEBUG, so a normal run shows setup, summaries, errors and a rate-limited
+progress line instead. Log with %-style arguments (log.debug("... %s", value)) so that
+nothing is formatted when the level is disabled.
+"""
+import sys
+import json
+import time
+import logging
+
+LOGGER_NAME = "mdb_validator"
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+# Seconds between two progress lines of a ProgressLogger
+PROGRESS_INTERVAL = 5.0
+
+_root = logging.getLogger(LOGGER_NAME)
+_json_handler = None
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Writes to sys.stdout as it is at the time, so redirecting stdout (benchmark, tests) still applies"""
+
+    def __init__(self):
+        logging.StreamHandler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the extra "mdb" field when given"""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "mdb", None) is not None:
+            entry["mdb"] = record.mdb
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, sort_keys=True)
+
+
+_console = _ConsoleHandler()
+_console.setFormatter(logging.Formatter("%(message)s"))
+_root.addHandler(_console)
+_root.setLevel(logging.INFO)
+_root.propagate = False
+
+
+def get_logger(tag):
+    return logging.getLogger("{}.{}".format(LOGGER_NAME, tag))
+
+
+def configure_logging(level=None, json_path=None):
+    """Set the console level (a name of LEVELS) and the JSON-lines log file (None for none)"""
+    global _json_handler
+    if level:
+        if str(level).upper() not in LEVELS:
+            raise ValueError("[logs] Invalid log level: {}".format(level))
+        _root.setLevel(getattr(logging, str(level).upper()))
+
+    if _json_handler is not None and (json_path is None or _json_handler.baseFilename != json_path):
+        _root.removeHandler(_json_handler)
+        _json_handler.close()
+        _json_handler = None
+    if json_path and _json_handler is None:
+        _json_handler = logging.FileHandler(json_path, mode='a')
+        _json_handler.setFormatter(JSONLinesFormatter())
+        _root.addHandler(_json_handler)
+
+
+def logging_level():
+    return logging.getLevelName(_root.getEffectiveLevel())
+
+
+class ProgressLogger(object):
+    """Reporter logging the progress of a run at INFO, at most once every interval seconds.
+
+    The first and last MDB of every pass are always logged. Everything is passed on to
+    inner (may be None), like the other reporters that wrap one.
+    """
+
+    def __init__(self, inner=None, interval=PROGRESS_INTERVAL):
+        self.inner = inner
+        self.interval = interval
+        self.rows = 0
+        self.findings = 0
+        self._last_logged = 0.0
+        self._pass = None
+        self._log = get_logger("progress")
+
+    def set(self, message):
+        if self.inner is not None and hasattr(self.inner, 'set'):
+            self.inner.set(message)
+
+    def mdb_progress(self, index, total, mdb):
+        if self.inner is not None:
+            self.inner.mdb_progress(index, total, mdb)
+        now = time.time()
+        if index == 1 or self._pass is None:
+            # (start time, rows, findings) when this pass over the MDBs began
+            self._pass = (now, self.rows, self.findings)
+        if index in (1, total) or now - self._last_logged >= self.interval:
+            self._last_logged = now
+            started, rows, findings = self._pass
+            self._log.info("[progress] MDB %d/%d %s - %d rows (%.0f/s), %d findings so far",
+                           index, total, mdb, self.rows - rows, (self.rows - rows) / max(now - started, 0.001),
+                           self.findings - findings, extra={"mdb": mdb})
+
+    def rows_scanned(self, count):
+        self.rows += count
+        if self.inner is not None:
+            self.inner.rows_scanned(count)
+
+    def findings_written(self, count):
+        self.findings += count
+        if self.inner is not None:
+            self.inner.findings_written(count)
+
+    def check_cancelled(self):
+        if self.inner is not None:
+            self.inner.check_cancelled()
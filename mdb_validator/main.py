@@ -17,13 +17,30 @@ from suspicious_column import SuspiciousColumnValidator
 # Add this to your imports
 from ttk import Progressbar
 from invalid_parcelnum import InvalidParcelNumValidator
+from cross_mdb_duplicates import CrossMDBDuplicatesValidator
+from catalog import open_catalog, close_catalog
+from column_cache import open_column_cache, close_column_cache
+from scanner import open_manifest, close_manifest
+from jobs import configure_validator, build_jobs, SCALES, GRIDSHEETS, TOLERANCES
+from backends import set_backend, arcpy_available
+from reports import available_formats, set_report_format
+from slivers import format_thresholds, DEFAULT_THRESHOLDS
+from progress import QueueReporter, ValidationCancelled, set_reporter, validator_scope
+from profiling import RunProfile
+import multiprocessing
+import threading
+import Queue
+import time
+
+# How often the GUI drains the worker's progress queue
+POLL_INTERVAL_MS = 200
 
 
 class MDBValidatorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("MDB Validation Tool Suite - Python 2.7")
-        self.root.geometry("850x650")
+        self.root.geometry("850x1020")
         self.root.configure(bg='#2c3e50')  # Dark blue background
 
         # Enhanced color scheme with high contrast for buttons
@@ -52,6 +69,7 @@ class MDBValidatorApp:
 
         self.common_validators = [
             ("Duplicate Parcels", DuplicateParcelsValidator()),
+            ("Cross-MDB Duplicate Parcels", CrossMDBDuplicatesValidator()),
             ("Duplicate Segment & Const", DuplicateConstAndSegmentsValidator()),
             ("Small Areas", SmallAreasValidator()),
             ("Segment Counts", SegmentCountsValidator()),
@@ -83,6 +101,9 @@ class MDBValidatorApp:
         # Topology Options Section
         self.create_topology_options_section()
 
+        # Performance Options Section
+        self.create_performance_options_section()
+
         # Status bar
         self.status_var = tk.StringVar()
         self.status_bar = tk.Label(root, textvariable=self.status_var,
@@ -97,6 +118,25 @@ class MDBValidatorApp:
                                   length=300, mode='determinate')
         self.progress.pack(side='bottom', fill='x', pady=(0,5))
 
+        # Per-MDB progress of the running validator and live throughput
+        self.mdb_progress = Progressbar(root, orient='horizontal',
+                                        length=300, mode='determinate')
+        self.mdb_progress.pack(side='bottom', fill='x', pady=(0,2))
+
+        self.mdb_label_var = tk.StringVar()
+        self.throughput_var = tk.StringVar()
+        progress_info = tk.Frame(root, bg=self.colors['background'])
+        progress_info.pack(side='bottom', fill='x')
+        tk.Label(progress_info, textvariable=self.mdb_label_var, anchor='w',
+                 bg=self.colors['background'], font=('Helvetica', 9)).pack(side='left', padx=5)
+        tk.Label(progress_info, textvariable=self.throughput_var, anchor='e',
+                 bg=self.colors['background'], font=('Helvetica', 9)).pack(side='right', padx=5)
+
+        # Background run state
+        self.events = Queue.Queue()
+        self.reporter = None
+        self.worker = None
+
         # Set status var for all validators
         for _, validator in self.all_validators:
             validator.set_status_var(self.status_var)
@@ -176,7 +216,7 @@ class MDBValidatorApp:
         scale_label.pack(side='left')
 
         self.scale_combo = ttk.Combobox(self.scale_frame,
-                                        values=["500", "600", "1200", "1250", "2400", "2500", "4800"],
+                                        values=SCALES,
                                         width=10, state='readonly', font=('Helvetica', 9))
         self.scale_combo.current(0)
         self.scale_combo.pack(side='left', padx=5)
@@ -189,11 +229,18 @@ class MDBValidatorApp:
         gridsheet_label.pack(side='left')
 
         self.gridsheet_combo = ttk.Combobox(self.gridsheet_frame,
-                                            values=["Gridsheet_81.shp", "Gridsheet_84.shp", "Gridsheet_87.shp"],
+                                            values=GRIDSHEETS,
                                             width=20, state='readonly', font=('Helvetica', 9))
         self.gridsheet_combo.current(1)  # Default to Gridsheet_84.shp
         self.gridsheet_combo.pack(side='left', padx=5)
 
+        self.point_in_sheet_var = tk.IntVar(value=0)  # Default to the per-fragment mismatch report
+        point_in_sheet_cb = ttk.Checkbutton(self.gridsheet_frame,
+                                            text="Fast check by label point (wrong / multiple sheets)",
+                                            variable=self.point_in_sheet_var,
+                                            style='TCheckbutton')
+        point_in_sheet_cb.pack(side='left', padx=10)
+
         # Default template path
         note_label = ttk.Label(input_frame,
                                text="Note: Gridsheets should be inside 'templates' folder where the scripts is located",
@@ -214,6 +261,34 @@ class MDBValidatorApp:
                                            style='TCheckbutton')
         keep_topology_cb.pack(anchor='w', pady=2)
 
+        # In-memory topology option
+        self.in_memory_topology_var = tk.IntVar(value=1)  # Default to leaving the MDBs untouched
+
+        in_memory_cb = ttk.Checkbutton(options_frame,
+                                       text="Check overlaps and gaps in memory (does not modify the MDB files)",
+                                       variable=self.in_memory_topology_var,
+                                       style='TCheckbutton')
+        in_memory_cb.pack(anchor='w', pady=2)
+
+        # Snapshot topology option
+        self.snapshot_topology_var = tk.IntVar(value=1)  # Default to leaving the MDBs untouched
+
+        snapshot_cb = ttk.Checkbutton(options_frame,
+                                      text="Build geodatabase topologies in a scratch copy (never in the MDB)",
+                                      variable=self.snapshot_topology_var,
+                                      style='TCheckbutton')
+        snapshot_cb.pack(anchor='w', pady=2)
+
+        # Duplicate geometry option
+        self.geometry_duplicates_var = tk.IntVar(value=0)  # Default to matching on attributes
+
+        geometry_duplicates_cb = ttk.Checkbutton(options_frame,
+                                                 text="Match duplicate segments & constructions by geometry "
+                                                      "(within the cluster tolerance)",
+                                                 variable=self.geometry_duplicates_var,
+                                                 style='TCheckbutton')
+        geometry_duplicates_cb.pack(anchor='w', pady=2)
+
         # Cluster tolerance option
         tol_frame = ttk.Frame(options_frame)
         tol_frame.pack(fill='x', pady=5)
@@ -222,11 +297,131 @@ class MDBValidatorApp:
         tol_label.pack(side='left')
 
         self.tolerance_combo = ttk.Combobox(tol_frame,
-                                            values=["0.001 Meters", "0.01 Meters", "0.1 Meters", "1 Meter"],
+                                            values=TOLERANCES,
                                             width=15, state='readonly', font=('Helvetica', 9))
         self.tolerance_combo.current(0)  # Default to 0.001 Meters
         self.tolerance_combo.pack(side='left', padx=5)
 
+        gap_label = ttk.Label(tol_frame, text="Min Gap Area (sq.m):")
+        gap_label.pack(side='left', padx=(15, 0))
+
+        self.min_gap_area_entry = ttk.Entry(tol_frame, width=10, font=('Helvetica', 9))
+        self.min_gap_area_entry.insert(0, "0")
+        self.min_gap_area_entry.pack(side='left', padx=5)
+
+        # Small area and sliver thresholds per feature class
+        sliver_frame = ttk.Frame(options_frame)
+        sliver_frame.pack(fill='x', pady=5)
+
+        sliver_label = ttk.Label(sliver_frame, text="Sliver Thresholds:")
+        sliver_label.pack(side='left')
+
+        self.sliver_thresholds_entry = ttk.Entry(sliver_frame, width=70, font=('Helvetica', 9))
+        self.sliver_thresholds_entry.insert(0, format_thresholds(DEFAULT_THRESHOLDS))
+        self.sliver_thresholds_entry.pack(side='left', padx=5)
+
+    def create_performance_options_section(self):
+        """Create section for parallel execution options"""
+        options_frame = ttk.LabelFrame(self.main_frame, text="Performance Options", padding=10)
+        options_frame.pack(fill='x', pady=5)
+
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.pack(fill='x', pady=5)
+
+        workers_label = ttk.Label(workers_frame, text="Parallel Workers:")
+        workers_label.pack(side='left')
+
+        worker_choices = sorted(set([1, 2, 4, 8, 16, multiprocessing.cpu_count()]))
+        self.workers_combo = ttk.Combobox(workers_frame,
+                                          values=[str(n) for n in worker_choices],
+                                          width=5, state='readonly', font=('Helvetica', 9))
+        self.workers_combo.current(0)  # Default to a single process
+        self.workers_combo.pack(side='left', padx=5)
+
+        workers_note = ttk.Label(workers_frame, text="(more than 1 validates MDB files in separate processes)",
+                                 font=('Helvetica', 8, 'italic'))
+        workers_note.pack(side='left', padx=5)
+
+        # Data source
+        source_frame = ttk.Frame(options_frame)
+        source_frame.pack(fill='x', pady=5)
+
+        source_label = ttk.Label(source_frame, text="Data Source:")
+        source_label.pack(side='left')
+
+        self.data_sources = [("MDB files (arcpy)", "arcpy"), ("GeoPackage exports (no arcpy)", "geopackage")]
+        self.source_combo = ttk.Combobox(source_frame,
+                                         values=[label for label, backend in self.data_sources],
+                                         width=30, state='readonly', font=('Helvetica', 9))
+        self.source_combo.current(0 if arcpy_available else 1)
+        self.source_combo.pack(side='left', padx=5)
+
+        source_note = ttk.Label(source_frame, text="(overlap, sheet and topology checks need arcpy)",
+                                font=('Helvetica', 8, 'italic'))
+        source_note.pack(side='left', padx=5)
+
+        # Report format
+        format_frame = ttk.Frame(options_frame)
+        format_frame.pack(fill='x', pady=5)
+
+        format_label = ttk.Label(format_frame, text="Report Format:")
+        format_label.pack(side='left')
+
+        self.format_combo = ttk.Combobox(format_frame, values=available_formats(),
+                                         width=10, state='readonly', font=('Helvetica', 9))
+        self.format_combo.current(0)  # Default to CSV
+        self.format_combo.pack(side='left', padx=5)
+
+        format_note = ttk.Label(format_frame, text="(gzip, JSON lines or SQLite for large report sets)",
+                                font=('Helvetica', 8, 'italic'))
+        format_note.pack(side='left', padx=5)
+
+        # Schema cache option
+        self.use_catalog_var = tk.IntVar(value=1)  # Default to caching
+
+        use_catalog_cb = ttk.Checkbutton(options_frame,
+                                         text="Cache MDB schemas between runs (skips re-reading unchanged files)",
+                                         variable=self.use_catalog_var,
+                                         style='TCheckbutton')
+        use_catalog_cb.pack(anchor='w', pady=2)
+
+        # Column cache option
+        self.use_column_cache_var = tk.IntVar(value=1)  # Default to caching
+
+        use_column_cache_cb = ttk.Checkbutton(options_frame,
+                                              text="Cache parcel columns between validators and runs "
+                                                   "(memory-mapped files)",
+                                              variable=self.use_column_cache_var,
+                                              style='TCheckbutton')
+        use_column_cache_cb.pack(anchor='w', pady=2)
+
+        # Incremental option
+        self.incremental_var = tk.IntVar(value=0)  # Default to full runs
+
+        incremental_cb = ttk.Checkbutton(options_frame,
+                                         text="Incremental: only re-check new or changed MDB files",
+                                         variable=self.incremental_var,
+                                         style='TCheckbutton')
+        incremental_cb.pack(anchor='w', pady=2)
+
+        # Resumable option
+        self.resume_var = tk.IntVar(value=0)  # Default to runs that start over
+
+        resume_cb = ttk.Checkbutton(options_frame,
+                                    text="Resumable: journal finished MDB files and continue an interrupted run",
+                                    variable=self.resume_var,
+                                    style='TCheckbutton')
+        resume_cb.pack(anchor='w', pady=2)
+
+        # Run profile option
+        self.run_profile_var = tk.IntVar(value=0)  # Default to no profile
+
+        run_profile_cb = ttk.Checkbutton(options_frame,
+                                         text="Write run_profile.json (time per validator, MDB and stage)",
+                                         variable=self.run_profile_var,
+                                         style='TCheckbutton')
+        run_profile_cb.pack(anchor='w', pady=2)
+
     def create_validators_section(self):
         """Create the validators selection section"""
         validators_frame = ttk.LabelFrame(self.main_frame, text="Select Validations to Run", padding=10)
@@ -298,16 +493,27 @@ class MDBValidatorApp:
                                     relief='raised', bd=2)
         select_none_btn.pack(side='left', padx=5)
 
+        # Cancel button - enabled while a run is in progress
+        self.cancel_btn = tk.Button(btn_frame, text="CANCEL",
+                                    command=self.cancel_validations,
+                                    bg=self.colors['accent'],
+                                    fg=self.colors['button_text'],
+                                    activebackground='#c0392b',
+                                    activeforeground=self.colors['button_text'],
+                                    font=('Helvetica', 10, 'bold'),
+                                    relief='raised', bd=3, state='disabled')
+        self.cancel_btn.pack(side='right', padx=5)
+
         # Run button - using standard tk.Button with accent color
-        run_btn = tk.Button(btn_frame, text="RUN VALIDATIONS",
-                            command=self.run_validations,
-                            bg=self.colors['secondary'],
-                            fg=self.colors['button_text'],
-                            activebackground='#27ae60',
-                            activeforeground=self.colors['button_text'],
-                            font=('Helvetica', 10, 'bold'),
-                            relief='raised', bd=3)
-        run_btn.pack(side='right', padx=5)
+        self.run_btn = tk.Button(btn_frame, text="RUN VALIDATIONS",
+                                 command=self.run_validations,
+                                 bg=self.colors['secondary'],
+                                 fg=self.colors['button_text'],
+                                 activebackground='#27ae60',
+                                 activeforeground=self.colors['button_text'],
+                                 font=('Helvetica', 10, 'bold'),
+                                 relief='raised', bd=3)
+        self.run_btn.pack(side='right', padx=5)
 
     def browse_folder(self):
         """Open folder dialog and update entry widget"""
@@ -330,7 +536,10 @@ class MDBValidatorApp:
         self.status_var.set("Deselected all validations")
 
     def run_validations(self):
-        """Run the selected validations"""
+        """Start the selected validations on a background thread"""
+        if self.worker and self.worker.is_alive():
+            return
+
         folder_path = self.folder_entry.get().strip()
         if not folder_path:
             tkMessageBox.showerror("Error", "Please select a folder containing MDB files!")
@@ -340,9 +549,12 @@ class MDBValidatorApp:
             tkMessageBox.showerror("Error", "Invalid folder path!")
             return
 
-        # Reset progress bar
-        self.progress['value'] = 0
-        self.root.update_idletasks()
+        try:
+            set_backend(self.data_sources[self.source_combo.current()][1])
+            set_report_format(self.format_combo.get())
+        except ValueError as e:
+            tkMessageBox.showerror("Error", str(e))
+            return
 
         # Count how many validations we'll run
         total_validations = sum(var.get() for var in self.validator_vars)
@@ -350,54 +562,157 @@ class MDBValidatorApp:
             tkMessageBox.showerror("Error", "No validations selected!")
             return
 
-        progress_increment = 100.0 / total_validations
-
-        # Update validator parameters
-        for i, (name, validator) in enumerate(self.all_validators):
-            if self.validator_vars[i].get() == 1:
-                validator.set_folder_path(folder_path)
+        # Reset progress bars
+        self.progress['value'] = 0
+        self.mdb_progress['value'] = 0
+        self.progress_increment = 100.0 / total_validations
+        self.total_validations = total_validations
 
-                # Set scale if validator needs it
-                if hasattr(validator, 'set_scale'):
-                    validator.set_scale(self.scale_combo.get())
+        # Validators report through the queue while they run on the worker thread
+        self.reporter = QueueReporter(self.events)
 
-                # Set gridsheet if validator needs it
-                if hasattr(validator, 'set_gridsheet'):
-                    validator.set_gridsheet(self.gridsheet_combo.get())
+        # Update validator parameters
+        selected = [(name, validator) for i, (name, validator) in enumerate(self.all_validators)
+                    if self.validator_vars[i].get() == 1]
+        try:
+            for name, validator in selected:
+                validator.set_status_var(self.reporter)
+                configure_validator(validator, folder_path,
+                                    scale=self.scale_combo.get(),
+                                    gridsheet=self.gridsheet_combo.get(),
+                                    point_in_sheet=bool(self.point_in_sheet_var.get()),
+                                    tolerance=self.tolerance_combo.get(),
+                                    keep_topology=bool(self.keep_topology_var.get()),
+                                    in_memory=bool(self.in_memory_topology_var.get()),
+                                    snapshot=bool(self.snapshot_topology_var.get()),
+                                    min_gap_area=self.min_gap_area_entry.get().strip() or None,
+                                    geometry_duplicates=bool(self.geometry_duplicates_var.get()),
+                                    sliver_thresholds=self.sliver_thresholds_entry.get().strip())
+
+            jobs = build_jobs(selected, folder_path, self.reporter,
+                              workers=int(self.workers_combo.get()),
+                              incremental=bool(self.incremental_var.get()),
+                              resume=bool(self.resume_var.get()))
+        except ValueError as e:
+            tkMessageBox.showerror("Error", str(e))
+            return
 
-                # Set topology options for ParcelOverlapValidator
-                if isinstance(validator, ParcelOverlapValidator):
-                    validator.cluster_tolerance = self.tolerance_combo.get()
-                    validator.keep_topology = bool(self.keep_topology_var.get())
+        self.run_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.run_started = time.time()
+
+        run_profile = RunProfile(self.reporter) if self.run_profile_var.get() else None
+
+        self.worker = threading.Thread(target=self._run_jobs,
+                                       args=(jobs, folder_path, bool(self.use_catalog_var.get()), run_profile,
+                                             bool(self.use_column_cache_var.get())))
+        self.worker.daemon = True
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _run_jobs(self, jobs, folder_path, use_catalog, run_profile=None, use_column_cache=True):
+        """Worker thread: run the jobs, talking to the GUI only through the event queue"""
+        set_reporter(run_profile or self.reporter)
+        # The catalog's sqlite connection belongs to the thread that opens it
+        if use_catalog:
+            open_catalog(folder_path)
+        else:
+            close_catalog()
+        if use_column_cache:
+            open_column_cache(folder_path)
+        else:
+            close_column_cache()
+        # Every validator of the run shares one scan of the folder
+        open_manifest(folder_path)
 
-        # Run selected validations
         success_count = 0
-        for i, (name, validator) in enumerate(self.all_validators):
-            if self.validator_vars[i].get() == 1:
+        cancelled = False
+        try:
+            for name, validator, validator_count in jobs:
+                self.events.put(("job", name))
                 try:
-                    self.status_var.set("Running {}...".format(name))
-                    self.root.update()  # Update UI
-
-                    validator.run_validation()
-                    success_count += 1
-
-                    self.status_var.set("Completed {}".format(name))
-                    self.root.update()  # Update UI
-
+                    with validator_scope(name):
+                        validator.run_validation()
+                    success_count += validator_count
+                    self.events.put(("job_done", name, validator_count, None))
                 except Exception as e:
-                    self.status_var.set("Error in {}: {}".format(name, str(e)))
-                    tkMessageBox.showerror("Error", "Failed to run {}:\n{}".format(name, str(e)))
+                    self.events.put(("job_done", name, validator_count, str(e)))
+        except ValidationCancelled:
+            cancelled = True
+        finally:
+            close_catalog()
+            close_column_cache()
+            close_manifest()
+            set_reporter(None)
+            if run_profile:
+                self.events.put(("status", "Run profile written to {}".format(run_profile.write(folder_path))))
+            self.events.put(("finished", success_count, cancelled))
+
+    def _poll_events(self):
+        """Apply the queued progress events to the widgets; reschedules itself until the run ends"""
+        finished = None
+        try:
+            while True:
+                event = self.events.get_nowait()
+                kind = event[0]
+                if kind == "status":
+                    self.status_var.set(event[1])
+                elif kind == "job":
+                    self.status_var.set("Running {}...".format(event[1]))
+                    self.mdb_progress['value'] = 0
+                elif kind == "mdb":
+                    index, total, mdb = event[1:]
+                    self.mdb_progress['maximum'] = max(total, 1)
+                    self.mdb_progress['value'] = index
+                    self.mdb_label_var.set("MDB {}/{}: {}".format(index, total, os.path.basename(mdb or "")))
+                elif kind == "job_done":
+                    name, validator_count, error = event[1:]
+                    self.progress['value'] += validator_count * self.progress_increment
+                    if error:
+                        self.status_var.set("Error in {}: {}".format(name, error))
+                        tkMessageBox.showerror("Error", "Failed to run {}:\n{}".format(name, error))
+                    else:
+                        self.status_var.set("Completed {}".format(name))
+                elif kind == "finished":
+                    finished = event
+        except Queue.Empty:
+            pass
+
+        elapsed = max(time.time() - self.run_started, 0.001)
+        self.throughput_var.set("Rows scanned: {:,} ({:,.0f}/s)   Findings: {:,}   Elapsed: {:.0f}s".format(
+            self.reporter.rows, self.reporter.rows / elapsed, self.reporter.findings, elapsed))
+
+        if finished:
+            self._finish_run(finished[1], finished[2])
+        else:
+            self.root.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _finish_run(self, success_count, cancelled):
+        self.run_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+
+        if cancelled:
+            self.status_var.set("Cancelled after {} of {} selected validations".format(
+                success_count, self.total_validations))
+            tkMessageBox.showinfo("Cancelled", "Validation was cancelled.")
+            return
 
         # Complete progress bar
         self.progress['value'] = 100
-        self.root.update_idletasks()
-
         self.status_var.set("Completed {} of {} selected validations".format(
-            success_count, sum(var.get() for var in self.validator_vars)))
+            success_count, self.total_validations))
         tkMessageBox.showinfo("Complete", "Validation process finished!")
 
+    def cancel_validations(self):
+        """Ask the worker to stop at the next MDB"""
+        if self.worker and self.worker.is_alive():
+            self.reporter.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.status_var.set("Cancelling after the current MDB...")
+
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     try:
         app = MDBValidatorApp(root)
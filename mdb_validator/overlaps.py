@@ -1,32 +1,39 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-from utils import find_mdb_files, get_feature_classes
+import math
+from backends import arcpy, require_geoprocessing
+from utils import find_mdb_files, get_feature_classes, get_extent, get_row_count
+from spatial_index import GridIndex
+from progress import check_cancelled, rows_scanned
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("overlaps")
 
 
 class OverlapsValidator:
     def __init__(self):
-        print("[__init__] Initializing OverlapsValidator")
+        log.debug("[__init__] Initializing OverlapsValidator")
         self.folder_path = ""
         self.status_var = None
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
     def run_validation(self):
-        print("[overlaps] Starting overlap validation")
+        log.info("[overlaps] Starting overlap validation")
 
         if not self.folder_path:
             raise ValueError("[overlaps] Folder path not set")
+        require_geoprocessing("[overlaps]")
 
         mdb_files = find_mdb_files(self.folder_path)
-        print("[overlaps] Found {} MDB files".format(len(mdb_files)))
+        log.info("[overlaps] Found %s MDB files", len(mdb_files))
 
         if len(mdb_files) < 2:
             raise ValueError("[overlaps] Need at least 2 MDB files for overlap checking")
@@ -34,17 +41,27 @@ class OverlapsValidator:
         output_csv = os.path.join(self.folder_path, "08_overlap_report.csv")
         valid_fcs = ["Parcel", "Construction", "Segments"]
         feature_files = []
+        extents = []
 
         for mdb in mdb_files:
             try:
-                print("[overlaps] Getting feature classes from {}".format(mdb))
+                log.debug("[overlaps] Getting feature classes from %s", mdb)
                 features = get_feature_classes(mdb, valid_fcs)
                 count = len(features)
-                print("[overlaps] Found {} valid feature classes".format(count))
-                feature_files.extend([full_path for fc_name, full_path in features])
+                log.debug("[overlaps] Found %s valid feature classes", count)
+                for fc_name, full_path in features:
+                    extent = get_extent(full_path)
+                    if any(v is None or math.isnan(v) for v in extent):
+                        # Empty feature classes have no extent and cannot overlap anything
+                        log.debug("[overlaps] Skipping empty feature class: %s", full_path)
+                        continue
+                    feature_files.append(full_path)
+                    extents.append(extent)
+                    # Every feature of the class goes into its Intersect runs
+                    rows_scanned(get_row_count(full_path))
             except Exception as e:
                 error_msg = "[overlaps] Error processing {}: {}".format(mdb, str(e))
-                print(error_msg)
+                log.error(error_msg)
                 if self.status_var:
                     self.status_var.set(error_msg)
                 raise
@@ -52,46 +69,50 @@ class OverlapsValidator:
         if len(feature_files) < 2:
             raise ValueError("[overlaps] Not enough feature classes found for overlap checking")
 
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["File1", "File2", "Overlap Count"])
-
-            for i in range(len(feature_files)):
-                for j in range(i + 1, len(feature_files)):
-                    fc1 = feature_files[i]
-                    fc2 = feature_files[j]
-
-                    if os.path.dirname(fc1) == os.path.dirname(fc2):
-                        print("[overlaps] Skipping comparison within same MDB")
-                        continue
-
-                    intersect_output = "in_memory/intersect_output"
-
-                    try:
-                        print("[overlaps] Checking overlap: {} vs {}".format(fc1, fc2))
-                        if self.status_var:
-                            self.status_var.set("Checking {} vs {}".format(
-                                os.path.basename(fc1), os.path.basename(fc2)))
-
-                        arcpy.Intersect_analysis([fc1, fc2], intersect_output)
-                        count = int(arcpy.GetCount_management(intersect_output)[0])
-                        print("[overlaps] Overlap count: {}".format(count))
-
-                        if count > 0:
-                            writer.writerow([fc1, fc2, count])
-
-                    except Exception as e:
-                        error_msg = "[overlaps] Error checking {} vs {}: {}".format(fc1, fc2, str(e))
-                        print(error_msg)
-                        if self.status_var:
-                            self.status_var.set(error_msg)
-                        raise
-
-                    finally:
-                        if arcpy.Exists(intersect_output):
-                            arcpy.Delete_management(intersect_output)
-                            print("[overlaps] Deleted in-memory intersect output")
+        # Only pairs whose extents touch can overlap, so the exact Intersect runs on those alone
+        index = GridIndex.for_boxes(enumerate(extents))
+        candidate_pairs = index.candidate_pairs()
+        total_pairs = len(feature_files) * (len(feature_files) - 1) // 2
+        log.info("[overlaps] %s of %s feature class pairs have overlapping extents",
+                 len(candidate_pairs), total_pairs)
+
+        with open_report(output_csv, ["File1", "File2", "Overlap Count"]) as writer:
+            for i, j in candidate_pairs:
+                check_cancelled()
+                fc1 = feature_files[i]
+                fc2 = feature_files[j]
+
+                if os.path.dirname(fc1) == os.path.dirname(fc2):
+                    log.debug("[overlaps] Skipping comparison within same MDB")
+                    continue
+
+                intersect_output = "in_memory/intersect_output"
+
+                try:
+                    log.debug("[overlaps] Checking overlap: %s vs %s", fc1, fc2)
+                    if self.status_var:
+                        self.status_var.set("Checking {} vs {}".format(
+                            os.path.basename(fc1), os.path.basename(fc2)))
+
+                    arcpy.Intersect_analysis([fc1, fc2], intersect_output)
+                    count = int(arcpy.GetCount_management(intersect_output)[0])
+                    log.debug("[overlaps] Overlap count: %s", count)
+
+                    if count > 0:
+                        writer.writerow([fc1, fc2, count])
+
+                except Exception as e:
+                    error_msg = "[overlaps] Error checking {} vs {}: {}".format(fc1, fc2, str(e))
+                    log.error(error_msg)
+                    if self.status_var:
+                        self.status_var.set(error_msg)
+                    raise
+
+                finally:
+                    if arcpy.Exists(intersect_output):
+                        arcpy.Delete_management(intersect_output)
+                        log.debug("[overlaps] Deleted in-memory intersect output")
 
         if self.status_var:
             self.status_var.set("Overlap validation completed")
-        print("[overlaps] Overlap validation completed")
+        log.info("[overlaps] Overlap validation completed")
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import shutil
+import tempfile
+import traceback
+import multiprocessing
+from utils import find_mdb_files
+from engine import scan_mdb
+from catalog import open_catalog, active_catalog
+from column_cache import open_column_cache, active_column_cache
+from backends import get_backend, set_backend
+from progress import CountingWriter, set_reporter, active_reporter, mdb_progress, stage
+from profiling import configure_tasks, task_settings, start_task, finish_task
+from reports import open_report, report_format, set_report_format
+from logs import get_logger, configure_logging, logging_level
+
+log = get_logger("parallel")
+
+# Validators rebuilt inside each worker process by _init_worker
+_worker_validators = []
+_worker_partial_dir = None
+# Set in pool workers, which mark the task they are on for dead worker detection
+_worker_in_pool = False
+
+# Seconds between checks of the pool for dead workers
+POLL_INTERVAL = 0.5
+
+
+def _validator_state(validator):
+    """Picklable copy of a validator's settings (the Tk status variable stays in the parent)"""
+    return dict((key, value) for key, value in validator.__dict__.items() if key != 'status_var')
+
+
+def _init_worker(validator_specs, partial_dir, catalog_folder=None, backend_name=None, profile_settings=None,
+                 log_level=None, report_format_name=None, column_cache_folder=None):
+    global _worker_validators, _worker_partial_dir, _worker_in_pool
+    configure_logging(log_level)
+    if backend_name:
+        set_backend(backend_name)
+    if report_format_name:
+        set_report_format(report_format_name)
+    configure_tasks(profile_settings)
+    if catalog_folder:
+        open_catalog(catalog_folder)
+    if column_cache_folder:
+        open_column_cache(column_cache_folder)
+    _worker_validators = []
+    for validator_class, state in validator_specs:
+        validator = validator_class()
+        validator.__dict__.update(state)
+        _worker_validators.append(validator)
+    _worker_partial_dir = partial_dir
+    _worker_in_pool = True
+
+
+def fragment_path(partial_dir, validator_index, mdb_index):
+    return os.path.join(partial_dir, "{:03d}_{:06d}.csv".format(validator_index, mdb_index))
+
+
+def _marker_path(partial_dir, pid):
+    return os.path.join(partial_dir, "worker_{}.task".format(pid))
+
+
+def _mark_task(mdb_index):
+    """Record the MDB this worker is on; the file outlives a worker that crashes on it"""
+    with open(_marker_path(_worker_partial_dir, os.getpid()), 'w') as f:
+        f.write(str(mdb_index))
+
+
+def _pool_processes(pool):
+    """The worker Process objects of pool.
+
+    Relies on Pool._pool, private in Python 2.7's multiprocessing (the list the pool
+    refills as workers exit); the public API has no way to see a worker that died.
+    """
+    return list(pool._pool)
+
+
+def _dead_worker_tasks(pool, partial_dir):
+    """{(pid, mdb_index)} of the tasks last started by workers no longer alive in pool"""
+    marked = set()
+    # Markers first: a worker that wrote one is already among the pool's processes
+    for name in os.listdir(partial_dir):
+        if name.startswith("worker_") and name.endswith(".task"):
+            try:
+                with open(os.path.join(partial_dir, name)) as f:
+                    marked.add((int(name[len("worker_"):-len(".task")]), int(f.read())))
+            except (IOError, ValueError):
+                continue
+    alive = set(process.pid for process in _pool_processes(pool) if process.exitcode is None)
+    return set((pid, mdb_index) for pid, mdb_index in marked if pid not in alive)
+
+
+def _validate_in_worker(task):
+    """Run the selected validators on one MDB, writing each report's rows to its own fragment file.
+
+    A task is (mdb_index, mdb, validator_indexes); validator_indexes of None means all of them.
+    Returns (mdb_index, {validator_index: result}, {validator_index: error message}, (rows, findings),
+    run profile record of the MDB or None).
+    """
+    mdb_index, mdb, validator_indexes = task
+    if _worker_in_pool:
+        _mark_task(mdb_index)
+    if validator_indexes is None:
+        validator_indexes = range(len(_worker_validators))
+    selected = [(validator_index, _worker_validators[validator_index]) for validator_index in validator_indexes]
+    results = {}
+    errors = {}
+
+    files = {}
+    writers = {}
+    # Count this MDB's rows and findings here; the parent forwards them to its own reporter
+    parent_reporter = active_reporter()
+    tally = start_task(mdb)
+    set_reporter(tally)
+    try:
+        for validator_index, validator in selected:
+            if validator.report_name:
+                files[validator] = open(fragment_path(_worker_partial_dir, validator_index, mdb_index), 'wb')
+                writers[validator] = CountingWriter(csv.writer(files[validator]))
+
+        # Row-level checks share one columnar read, the rest run on their own
+        row_checks = [(validator_index, validator) for validator_index, validator in selected
+                      if hasattr(validator, 'begin_feature_class')]
+        if row_checks:
+            try:
+                with stage("scan_mdb"):
+                    scan_mdb(mdb, [validator for _, validator in row_checks], writers)
+            except Exception as e:
+                for validator_index, validator in row_checks:
+                    errors[validator_index] = "{}: {}".format(type(e).__name__, str(e))
+
+        for validator_index, validator in selected:
+            if hasattr(validator, 'begin_feature_class'):
+                continue
+            try:
+                with stage("validate:" + validator.__class__.__name__):
+                    results[validator_index] = validator.validate_mdb(mdb, writers.get(validator))
+            except Exception as e:
+                traceback.print_exc()
+                errors[validator_index] = "{}: {}".format(type(e).__name__, str(e))
+    finally:
+        record = finish_task(tally)
+        set_reporter(parent_reporter)
+        for csvfile in files.values():
+            csvfile.close()
+
+    return mdb_index, results, errors, (tally.rows, tally.findings), record
+
+
+def merge_fragments(validator, output_csv, parts):
+    """Write a validator's report from (mdb, fragment_path, error) parts, in the given order"""
+    with open_report(output_csv, validator.report_header) as writer:
+        for mdb, fragment, error in parts:
+            if fragment and os.path.exists(fragment):
+                writer.copy_csv(fragment)
+
+            if error and hasattr(validator, 'record_error'):
+                validator.record_error(mdb, error, writer)
+
+    log.info("[parallel] Merged report %s", writer.path)
+
+
+def validate_files(validators, tasks, partial_dir, workers=1, progress=None):
+    """Run (mdb_index, mdb, validator_indexes) tasks and leave the report rows as fragments in partial_dir.
+
+    With more than one worker the tasks go to a multiprocessing pool, otherwise they run
+    in this process. progress(done, total, mdb_index, results, errors) is called after every MDB
+    with its {validator_index: result} and {validator_index: error message}.
+    An MDB whose worker process dies is reported as an error of each of its validators.
+    Returns ({(validator_index, mdb_index): result}, {(validator_index, mdb_index): error}).
+    """
+    global _worker_validators, _worker_partial_dir
+    catalog = active_catalog()
+    catalog_folder = catalog.folder_path if catalog else None
+    column_cache = active_column_cache()
+    results = {}
+    errors = {}
+
+    reporter = active_reporter()
+    task_mdbs = dict((task[0], task[1]) for task in tasks)
+
+    def collect(done, outcome):
+        mdb_index, mdb_results, mdb_errors, (rows, findings), record = outcome
+        if reporter:
+            reporter.rows_scanned(rows)
+            reporter.findings_written(findings)
+        for validator_index, result in mdb_results.items():
+            results[(validator_index, mdb_index)] = result
+        for validator_index, error in mdb_errors.items():
+            errors[(validator_index, mdb_index)] = error
+        if progress:
+            progress(done, len(tasks), mdb_index, mdb_results, mdb_errors)
+        # Stops the run here, between MDBs, if it was cancelled
+        mdb_progress(done, len(tasks), task_mdbs[mdb_index])
+        if record is not None and reporter:
+            reporter.merge_task(record)
+
+    profile_settings = task_settings(reporter)
+    if workers <= 1:
+        # In-process: validators are used as they are, no pickling needed
+        _worker_validators = list(validators)
+        _worker_partial_dir = partial_dir
+        configure_tasks(profile_settings)
+        for done, task in enumerate(tasks, start=1):
+            collect(done, _validate_in_worker(task))
+        return results, errors
+
+    specs = [(validator.__class__, _validator_state(validator)) for validator in validators]
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (specs, partial_dir, catalog_folder, get_backend().name, profile_settings,
+                                 logging_level(), report_format(),
+                                 column_cache.folder_path if column_cache else None))
+    pending = dict((task[0], (task, pool.apply_async(_validate_in_worker, (task,)))) for task in tasks)
+    lost = set()
+    suspects = set()
+    done = 0
+    try:
+        while pending:
+            # Wait on the first pending task, then collect whatever has finished
+            pending[min(pending)][1].wait(POLL_INTERVAL)
+            for mdb_index in sorted(pending):
+                if pending[mdb_index][1].ready():
+                    done += 1
+                    collect(done, pending.pop(mdb_index)[1].get())
+
+            # A worker that dies (a crash in a driver, say) takes its task with it and the
+            # pool never answers for it. Only trust what two checks in a row agree on.
+            dead = _dead_worker_tasks(pool, partial_dir)
+            for pid, mdb_index in dead & suspects:
+                os.remove(_marker_path(partial_dir, pid))
+                if mdb_index not in pending:
+                    continue
+                task = pending.pop(mdb_index)[0]
+                lost.add(mdb_index)
+                validator_indexes = task[2] if task[2] is not None else range(len(validators))
+                for validator_index in validator_indexes:
+                    # Rows written before the crash are incomplete
+                    fragment = fragment_path(partial_dir, validator_index, mdb_index)
+                    if os.path.exists(fragment):
+                        os.remove(fragment)
+                log.error("[parallel] Worker process %s died while validating %s", pid, task[1])
+                done += 1
+                collect(done, (mdb_index, {},
+                               dict((validator_index, "Worker process died while validating this MDB")
+                                    for validator_index in validator_indexes), (0, 0), None))
+            suspects = dead
+
+        if lost:
+            # The pool still waits for the lost tasks and would never finish closing
+            pool.terminate()
+        else:
+            pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results, errors
+
+
+class ParallelValidationRunner(object):
+    """Validate the MDBs of a folder with a pool of worker processes.
+
+    Each worker runs all selected validators on one MDB at a time and writes the rows
+    to partial CSV files; the parent merges them into the numbered reports in the order
+    of find_mdb_files. A failing MDB is reported and skipped without stopping the run.
+    """
+
+    def __init__(self, validators, workers=None):
+        self.validators = list(validators)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.folder_path = ""
+        self.status_var = None
+        self.failures = []
+        log.debug("[__init__] Initialized ParallelValidationRunner with %s workers", self.workers)
+
+    def set_status_var(self, status_var):
+        log.debug("[set_status_var] Setting status_var")
+        self.status_var = status_var
+
+    def set_folder_path(self, folder_path):
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
+        self.folder_path = folder_path
+
+    def _update_status(self, message):
+        if self.status_var:
+            self.status_var.set(message)
+        log.info(message)
+
+    def _merge_reports(self, partial_dir, mdb_files, errors):
+        for validator_index, validator in enumerate(self.validators):
+            if not validator.report_name:
+                continue
+
+            parts = [(mdb, fragment_path(partial_dir, validator_index, mdb_index),
+                      errors.get((validator_index, mdb_index)))
+                     for mdb_index, mdb in enumerate(mdb_files)]
+            merge_fragments(validator, os.path.join(self.folder_path, validator.report_name), parts)
+
+    def run_validation(self):
+        log.info("[parallel] Starting parallel validation")
+
+        if not self.folder_path:
+            raise ValueError("[parallel] Folder path not set")
+        if not self.validators:
+            raise ValueError("[parallel] No validators selected")
+
+        for validator in self.validators:
+            validator.prepare_validation()
+
+        mdb_files = find_mdb_files(self.folder_path)
+        if not mdb_files:
+            raise ValueError("[parallel] No MDB files found in the specified folder")
+
+        self._update_status("[parallel] Validating {} MDB files with {} workers".format(len(mdb_files), self.workers))
+
+        partial_dir = tempfile.mkdtemp(prefix="mdb_validator_")
+        self.failures = []
+
+        def progress(done, total, mdb_index, mdb_results, mdb_errors):
+            mdb = mdb_files[mdb_index]
+            for validator_index, error in mdb_errors.items():
+                self.failures.append((mdb, self.validators[validator_index].__class__.__name__, error))
+                log.error("[parallel] Error in %s for %s: %s",
+                          self.validators[validator_index].__class__.__name__, mdb, error)
+            self._update_status("[parallel] Processed ({}/{}) {}".format(done, total, os.path.basename(mdb)))
+
+        try:
+            tasks = [(mdb_index, mdb, None) for mdb_index, mdb in enumerate(mdb_files)]
+            results, errors = validate_files(self.validators, tasks, partial_dir, self.workers, progress)
+
+            self._merge_reports(partial_dir, mdb_files, errors)
+
+            for validator_index, validator in enumerate(self.validators):
+                if hasattr(validator, 'finish_validation'):
+                    validator.finish_validation(
+                        mdb_files, [results[(validator_index, mdb_index)]
+                                    for mdb_index in range(len(mdb_files))
+                                    if (validator_index, mdb_index) in results])
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+
+        if self.failures:
+            self._update_status("[parallel] Completed with {} failed MDB checks".format(len(self.failures)))
+        else:
+            self._update_status("[parallel] Parallel validation completed")
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""Run profiles: where a validation run spends its time.
+
+A RunProfile is installed as the run's reporter. It keeps wall time, rows scanned,
+findings written and arcpy tool calls per validator job, per MDB and per stage, and
+writes them as run_profile.json next to the reports. Stages are named sections of the
+code timed through progress.stage(); their times are inclusive, so nested stages overlap.
+"""
+import os
+import json
+import time
+import heapq
+import shutil
+import tempfile
+import cProfile
+import itertools
+from timeit import default_timer
+from backends import arcpy
+from progress import Tally, active_reporter
+
+PROFILE_NAME = "run_profile.json"
+CPROFILE_DIR_NAME = "run_profile"
+
+# MDBs listed as the slowest of the run in the profile summary
+SLOWEST_LISTED = 10
+
+# arcpy functions counted as tool calls while a profile is active
+ARCPY_TOOLS = ("Exists", "Describe", "ListFields", "ListDatasets", "ListFeatureClasses",
+               "AddField_management", "AddFeatureClassToTopology_management", "AddRuleToTopology_management",
+               "CopyFeatures_management", "CreateFeatureclass_management", "CreateFeatureDataset_management",
+               "CreateFileGDB_management", "CreatePersonalGDB_management", "CreateTopology_management",
+               "Delete_management", "ExportTopologyErrors_management", "GetCount_management", "Intersect_analysis",
+               "ValidateTopology_management")
+ARCPY_DA_TOOLS = ("SearchCursor", "InsertCursor", "TableToNumPyArray")
+
+_tool_counters_installed = False
+
+# Settings of the RunProfile that started validate_files, for the tasks it runs (None when not profiling)
+_task_settings = None
+
+_dump_numbers = itertools.count()
+
+
+def _figures():
+    return {"seconds": 0.0, "rows": 0, "findings": 0, "stages": {}, "tools": {}}
+
+
+def _add_timing(table, name, seconds, calls=1):
+    entry = table.get(name)
+    if entry is None:
+        entry = table[name] = {"calls": 0, "seconds": 0.0}
+    entry["calls"] += calls
+    entry["seconds"] += seconds
+
+
+def _counted(name, tool):
+    """Wrap an arcpy function so that calls made while a RunProfile is active are counted and timed"""
+    def call(*args, **kwargs):
+        profile = active_reporter()
+        if not isinstance(profile, RunProfile):
+            return tool(*args, **kwargs)
+        started = default_timer()
+        try:
+            return tool(*args, **kwargs)
+        finally:
+            profile.tool_called(name, default_timer() - started)
+    call.__doc__ = tool.__doc__
+    return call
+
+
+def install_tool_counters():
+    """Count the arcpy tools of ARCPY_TOOLS and ARCPY_DA_TOOLS (once per process; a no-op without arcpy)"""
+    global _tool_counters_installed
+    if _tool_counters_installed or arcpy is None:
+        return
+    for name in ARCPY_TOOLS:
+        if hasattr(arcpy, name):
+            setattr(arcpy, name, _counted(name, getattr(arcpy, name)))
+    for name in ARCPY_DA_TOOLS:
+        if hasattr(arcpy.da, name):
+            setattr(arcpy.da, name, _counted("da." + name, getattr(arcpy.da, name)))
+    _tool_counters_installed = True
+
+
+class _Stage(object):
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.add_stage(self.name, default_timer() - self.started)
+        return False
+
+
+class _ValidatorScope(object):
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.begin_validator(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.end_validator()
+        return False
+
+
+class _TimedCursor(object):
+    """Search cursor adding the time spent fetching its rows to the "cursor" stage"""
+
+    def __init__(self, cursor, profile):
+        self.cursor = cursor
+        self.profile = profile
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.cursor.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        rows = iter(self.cursor)
+        spent = 0.0
+        try:
+            while True:
+                started = default_timer()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    spent += default_timer() - started
+                    return
+                spent += default_timer() - started
+                yield row
+        finally:
+            self.profile.add_stage("cursor", spent)
+
+
+def timed_cursor(cursor):
+    """cursor itself, or a wrapper timing its rows while a RunProfile is active"""
+    profile = active_reporter()
+    if isinstance(profile, RunProfile):
+        return _TimedCursor(cursor, profile)
+    return cursor
+
+
+class RunProfile(object):
+    """Reporter recording where the time of a run goes.
+
+    Progress, counts, status messages and cancellation are passed on to inner (the
+    reporter the run would use otherwise, may be None). Figures go to the current
+    validator job (see progress.validator_scope) and to the MDB last announced through
+    mdb_progress. With cprofile_top, every MDB runs under cProfile and the dumps of the
+    cprofile_top slowest are kept.
+    """
+
+    def __init__(self, inner=None, cprofile_top=0, dump_dir=None):
+        self.inner = inner
+        self.cprofile_top = cprofile_top
+        self.dump_dir = dump_dir
+        if cprofile_top and not dump_dir:
+            self.dump_dir = tempfile.mkdtemp(prefix="mdb_validator_profile_")
+        self.started = time.time()
+        self._started_timer = default_timer()
+        self.rows = 0
+        self.findings = 0
+        self.validators = []
+        self._validator = None
+        self._validator_started = None
+        self._mdb = None
+        self._mdb_started = None
+        self._profiler = None
+        # Min-heap of (seconds, number, record) of the MDBs whose cProfile dumps are kept
+        self._dumps = []
+        install_tool_counters()
+
+    # Reporter protocol
+
+    def set(self, message):
+        if self.inner is not None and hasattr(self.inner, 'set'):
+            self.inner.set(message)
+
+    def mdb_progress(self, index, total, mdb):
+        self.close_mdb()
+        if self.inner is not None:
+            self.inner.mdb_progress(index, total, mdb)
+        self._mdb = dict(_figures(), mdb=mdb)
+        if self._validator is not None:
+            self._validator["mdbs"].append(self._mdb)
+        if self.dump_dir:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._mdb_started = default_timer()
+
+    def rows_scanned(self, count):
+        self.rows += count
+        for record in self._records():
+            record["rows"] += count
+        if self.inner is not None:
+            self.inner.rows_scanned(count)
+
+    def findings_written(self, count):
+        self.findings += count
+        for record in self._records():
+            record["findings"] += count
+        if self.inner is not None:
+            self.inner.findings_written(count)
+
+    def check_cancelled(self):
+        if self.inner is not None:
+            self.inner.check_cancelled()
+
+    # Profiling
+
+    def _records(self):
+        return [record for record in (self._validator, self._mdb) if record is not None]
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add_stage(self, name, seconds, calls=1):
+        for record in self._records():
+            _add_timing(record["stages"], name, seconds, calls)
+
+    def tool_called(self, name, seconds):
+        for record in self._records():
+            _add_timing(record["tools"], name, seconds)
+
+    def validator_scope(self, name):
+        return _ValidatorScope(self, name)
+
+    def begin_validator(self, name):
+        self.end_validator()
+        self._validator = dict(_figures(), name=name, mdbs=[])
+        self.validators.append(self._validator)
+        self._validator_started = default_timer()
+
+    def end_validator(self):
+        self.close_mdb()
+        if self._validator is not None:
+            self._validator["seconds"] = default_timer() - self._validator_started
+            self._validator = None
+
+    def close_mdb(self):
+        """Finish the figures of the current MDB and return them (None when there is none)"""
+        record = self._mdb
+        if record is None:
+            return None
+        self._mdb = None
+        record["seconds"] = default_timer() - self._mdb_started
+        if self._profiler is not None:
+            self._profiler.disable()
+            path = os.path.join(self.dump_dir, "{}_{}.prof".format(os.getpid(), next(_dump_numbers)))
+            self._profiler.dump_stats(path)
+            self._profiler = None
+            record["cprofile"] = path
+            self._keep_dump(record)
+        return record
+
+    def _keep_dump(self, record):
+        """Keep the cProfile dump of record if it is among the cprofile_top slowest MDBs so far"""
+        if not self.cprofile_top:
+            return
+        heapq.heappush(self._dumps, (record["seconds"], next(_dump_numbers), record))
+        if len(self._dumps) > self.cprofile_top:
+            dropped = heapq.heappop(self._dumps)[2]
+            if os.path.exists(dropped["cprofile"]):
+                os.remove(dropped["cprofile"])
+            del dropped["cprofile"]
+
+    def task_settings(self):
+        """What the tasks of parallel.validate_files need to profile the MDBs they validate"""
+        return {"dump_dir": self.dump_dir}
+
+    def merge_task(self, record):
+        """Take the figures of an MDB validated by a task (maybe in a worker process).
+
+        The record stands in for the one mdb_progress just opened for the same MDB. Rows
+        and findings were already passed on by the caller, so only stages and tools are
+        added to the validator job.
+        """
+        discarded = self._mdb
+        self._mdb = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler = None
+        if self._validator is not None:
+            if discarded is not None:
+                self._validator["mdbs"].remove(discarded)
+            self._validator["mdbs"].append(record)
+            for kind in ("stages", "tools"):
+                for name, entry in record[kind].items():
+                    _add_timing(self._validator[kind], name, entry["seconds"], entry["calls"])
+        if "cprofile" in record:
+            self._keep_dump(record)
+
+    def summary(self):
+        mdbs = [(record, validator["name"]) for validator in self.validators for record in validator["mdbs"]]
+        mdbs.sort(key=lambda item: -item[0]["seconds"])
+        return {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "seconds": default_timer() - self._started_timer,
+            "rows": self.rows,
+            "findings": self.findings,
+            "validators": self.validators,
+            "slowest_mdbs": [{"mdb": record["mdb"], "validator": name, "seconds": record["seconds"]}
+                             for record, name in mdbs[:SLOWEST_LISTED]],
+        }
+
+    def write(self, folder_path):
+        """Write run_profile.json (and the kept cProfile dumps) into folder_path; return the JSON path"""
+        self.end_validator()
+
+        if self.dump_dir:
+            dumps_dir = os.path.join(folder_path, CPROFILE_DIR_NAME)
+            if os.path.isdir(dumps_dir):
+                shutil.rmtree(dumps_dir, ignore_errors=True)
+            kept = sorted((item[2] for item in self._dumps), key=lambda record: -record["seconds"])
+            if kept:
+                os.makedirs(dumps_dir)
+            for rank, record in enumerate(kept, start=1):
+                name = "{:02d}_{}.prof".format(rank, os.path.splitext(os.path.basename(str(record["mdb"])))[0])
+                shutil.move(record["cprofile"], os.path.join(dumps_dir, name))
+                record["cprofile"] = os.path.join(CPROFILE_DIR_NAME, name)
+            self._dumps = []
+            shutil.rmtree(self.dump_dir, ignore_errors=True)
+
+        profile_path = os.path.join(folder_path, PROFILE_NAME)
+        with open(profile_path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+        return profile_path
+
+
+def configure_tasks(settings):
+    """Profile the tasks run by this process from now on with settings (None to stop)"""
+    global _task_settings
+    _task_settings = settings
+    if settings is not None:
+        install_tool_counters()
+
+
+def task_settings(reporter):
+    return reporter.task_settings() if isinstance(reporter, RunProfile) else None
+
+
+def start_task(mdb):
+    """Reporter for one MDB of parallel.validate_files: a Tally, or a RunProfile of that MDB while profiling"""
+    if _task_settings is None:
+        return Tally()
+    profile = RunProfile(dump_dir=_task_settings["dump_dir"])
+    profile.mdb_progress(1, 1, mdb)
+    return profile
+
+
+def finish_task(reporter):
+    """The figures of the MDB a start_task reporter ran for, or None when not profiling"""
+    if isinstance(reporter, RunProfile):
+        return reporter.close_mdb()
+    return None
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import threading
+
+_active_reporter = None
+
+
+class ValidationCancelled(BaseException):
+    """Raised at the next MDB or feature class once a run is cancelled.
+
+    Derived from BaseException so the per-MDB "except Exception: continue" handlers of
+    the validators let it through.
+    """
+
+
+class Tally(object):
+    """Reporter that only adds up rows and findings (used inside worker processes)"""
+
+    def __init__(self):
+        self.rows = 0
+        self.findings = 0
+
+    def mdb_progress(self, index, total, mdb):
+        pass
+
+    def rows_scanned(self, count):
+        self.rows += count
+
+    def findings_written(self, count):
+        self.findings += count
+
+    def check_cancelled(self):
+        pass
+
+
+class QueueReporter(Tally):
+    """Posts progress events to a queue for the GUI thread to poll.
+
+    Events are ("status", message) and ("mdb", index, total, mdb) tuples; row and
+    finding counts are only added up and read by the GUI when it polls. It also stands
+    in for the Tk status variable of validators running on the worker thread, so their
+    set() calls become "status" events instead of touching Tk from the wrong thread.
+    """
+
+    def __init__(self, queue):
+        Tally.__init__(self)
+        self.queue = queue
+        self.cancel_event = threading.Event()
+
+    def set(self, message):
+        self.queue.put(("status", message))
+
+    def mdb_progress(self, index, total, mdb):
+        self.queue.put(("mdb", index, total, mdb))
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise ValidationCancelled("Validation cancelled")
+
+
+def set_reporter(reporter):
+    """Make reporter receive the progress of validation runs in this process (None to stop)"""
+    global _active_reporter
+    _active_reporter = reporter
+
+
+def active_reporter():
+    return _active_reporter
+
+
+def mdb_progress(index, total, mdb):
+    """Report that the run is at the index-th of total MDBs; raises if the run was cancelled"""
+    if _active_reporter:
+        _active_reporter.check_cancelled()
+        _active_reporter.mdb_progress(index, total, mdb)
+
+
+def rows_scanned(count):
+    if _active_reporter:
+        _active_reporter.rows_scanned(count)
+
+
+def findings_written(count):
+    if _active_reporter and count:
+        _active_reporter.findings_written(count)
+
+
+def check_cancelled():
+    if _active_reporter:
+        _active_reporter.check_cancelled()
+
+
+class _Untimed(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_UNTIMED = _Untimed()
+
+
+def stage(name):
+    """Context timing a named stage of the run when the reporter keeps a run profile (see profiling)"""
+    if _active_reporter is not None and hasattr(_active_reporter, 'stage'):
+        return _active_reporter.stage(name)
+    return _UNTIMED
+
+
+def validator_scope(name):
+    """Context around one validator job, so that a run profile keeps its figures apart"""
+    if _active_reporter is not None and hasattr(_active_reporter, 'validator_scope'):
+        return _active_reporter.validator_scope(name)
+    return _UNTIMED
+
+
+class CountingWriter(object):
+    """csv writer wrapper that reports every row written as a finding"""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def writerow(self, row):
+        with stage("write"):
+            self.writer.writerow(row)
+        findings_written(1)
+
+    def writerows(self, rows):
+        rows = list(rows)
+        with stage("write"):
+            self.writer.writerows(rows)
+        findings_written(len(rows))
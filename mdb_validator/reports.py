@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""Report sinks: where the rows of a validator's report go.
+
+open_report(path, header) returns a sink with the writerow/writerows of a csv writer,
+writing the report in the format chosen with set_report_format. Whatever the format,
+a report holds the text the CSV report would have (None as an empty string), so the
+formats agree with each other and a report merged from CSV fragments is the same as
+one written directly.
+
+Memory is bounded: CSV and gzip reports go through a file buffer of BUFFER_BYTES, the
+other formats keep at most batch_size rows before writing them in one call (one
+executemany, one Parquet row group). Internal files such as the parallel fragments
+and the sorted runs stay plain CSV.
+"""
+import os
+import csv
+import gzip
+import json
+import shutil
+import sqlite3
+from collections import OrderedDict
+from progress import stage
+
+pyarrow_available = True
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow_available = False
+
+# Format name: file extension replacing ".csv"
+REPORT_FORMATS = OrderedDict([
+    ("csv", ".csv"),
+    ("csv.gz", ".csv.gz"),
+    ("jsonl", ".jsonl"),
+    ("sqlite", ".sqlite"),
+    ("parquet", ".parquet"),
+])
+
+# Rows held by a JSON-lines, SQLite or Parquet sink before they are written
+BATCH_SIZE = 5000
+
+# Buffer of the CSV and gzip report files
+BUFFER_BYTES = 1024 * 1024
+
+_format = "csv"
+
+
+def available_formats():
+    return [name for name in REPORT_FORMATS if name != "parquet" or pyarrow_available]
+
+
+def set_report_format(name):
+    """Write the reports of this process as name, one of REPORT_FORMATS"""
+    global _format
+    if name not in REPORT_FORMATS:
+        raise ValueError("[reports] Unknown report format: {}".format(name))
+    if name == "parquet" and not pyarrow_available:
+        raise ValueError("[reports] The parquet report format needs pyarrow")
+    _format = name
+
+
+def report_format():
+    return _format
+
+
+def report_path(path):
+    """path of a ".csv" report, with the extension of the current format (other paths as they are)"""
+    if path.lower().endswith(".csv"):
+        return path[:-len(".csv")] + REPORT_FORMATS[_format]
+    return path
+
+
+def _text(value):
+    """value as the csv module would write it, as unicode"""
+    if value is None:
+        return u""
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, float):
+        return repr(value).decode("ascii")
+    return unicode(value)
+
+
+class _Sink(object):
+    """Report rows written to path, under header"""
+
+    def __init__(self, path, header, batch_size):
+        self.path = path
+        self.header = list(header)
+        self.batch_size = batch_size
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def copy_csv(self, fragment):
+        """Append the rows of a CSV file without header, e.g. a parallel fragment"""
+        with open(fragment, 'rb') as f:
+            for row in csv.reader(f):
+                self.writerow(row)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            with stage("write"):
+                self._close()
+
+
+class _CSVSink(_Sink):
+    def __init__(self, path, header, batch_size):
+        _Sink.__init__(self, path, header, batch_size)
+        self.file = self._open()
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header)
+
+    def _open(self):
+        return open(self.path, 'wb', BUFFER_BYTES)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+    def copy_csv(self, fragment):
+        with open(fragment, 'rb') as f:
+            shutil.copyfileobj(f, self.file, BUFFER_BYTES)
+
+    def _close(self):
+        self.file.close()
+
+
+class _GzipCSVSink(_CSVSink):
+    def _open(self):
+        # No timestamp in the gzip header, so the same rows give the same file
+        return gzip.GzipFile(self.path, 'wb', 6, open(self.path, 'wb', BUFFER_BYTES), 0)
+
+    def _close(self):
+        fileobj = self.file.fileobj
+        self.file.close()
+        fileobj.close()
+
+
+class _BatchSink(_Sink):
+    """Sink keeping up to batch_size rows as text before writing them with _write_batch"""
+
+    def __init__(self, path, header, batch_size):
+        _Sink.__init__(self, path, header, batch_size)
+        self._rows = []
+
+    def writerow(self, row):
+        self._rows.append([_text(value) for value in row])
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._write_batch(self._rows)
+            self._rows = []
+
+    def _close(self):
+        self.flush()
+        self._finish()
+
+
+class _JSONLinesSink(_BatchSink):
+    def __init__(self, path, header, batch_size):
+        _BatchSink.__init__(self, path, header, batch_size)
+        self.file = open(path, 'wb')
+
+    def _write_batch(self, rows):
+        keys = [_text(name) for name in self.header]
+        self.file.writelines(json.dumps(OrderedDict(zip(keys, row))) + "\n" for row in rows)
+
+    def _finish(self):
+        self.file.close()
+
+
+class _SQLiteSink(_BatchSink):
+    """One "report" table of text columns named after the header, committed on close"""
+
+    def __init__(self, path, header, batch_size):
+        _BatchSink.__init__(self, path, header, batch_size)
+        if os.path.exists(path):
+            os.remove(path)
+        self.connection = sqlite3.connect(path)
+        columns = ", ".join('"{}" TEXT'.format(_text(name).replace('"', '""')) for name in self.header)
+        self.connection.execute("CREATE TABLE report ({})".format(columns))
+        self.insert = "INSERT INTO report VALUES ({})".format(", ".join("?" * len(self.header)))
+
+    def _write_batch(self, rows):
+        self.connection.executemany(self.insert, rows)
+
+    def _finish(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class _ParquetSink(_BatchSink):
+    """String columns named after the header, one row group per batch"""
+
+    def __init__(self, path, header, batch_size):
+        _BatchSink.__init__(self, path, header, batch_size)
+        self.schema = pyarrow.schema([(_text(name), pyarrow.string()) for name in self.header])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def _write_batch(self, rows):
+        columns = [pyarrow.array(list(column), type=pyarrow.string()) for column in zip(*rows)]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def _finish(self):
+        self.writer.close()
+
+
+_SINKS = {
+    "csv": _CSVSink,
+    "csv.gz": _GzipCSVSink,
+    "jsonl": _JSONLinesSink,
+    "sqlite": _SQLiteSink,
+    "parquet": _ParquetSink,
+}
+
+
+def open_report(path, header, batch_size=BATCH_SIZE):
+    """Sink writing header and then the rows given to it to report_path(path).
+
+    Use it as a context manager, or close it; the file is complete once closed. The
+    path written to is its path attribute.
+    """
+    return _SINKS[_format](report_path(path), header, batch_size)
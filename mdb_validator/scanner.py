@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""The folder scan shared by every validator of a job.
+
+A folder is listed with scandir (one call per directory, no per-file stat on Windows),
+the top-level subfolders in parallel threads since most of a scan on a network share
+is waiting for the server. Include and exclude globs are matched against paths relative
+to the scanned folder, lower-cased and with "/" separators, so "*merged*" skips every
+folder or file with "merged" in its relative path.
+
+Between open_manifest and close_manifest the sorted result is kept and handed to every
+later find_files call for the same folder, so a job lists its folder once. Only the
+standard library is used, so the stand-alone scripts can share it.
+"""
+import os
+import fnmatch
+import logging
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+log = logging.getLogger("mdb_validator.scanner")
+
+# Skipped unless a job gives its own exclude globs: the merged outputs of earlier runs
+DEFAULT_EXCLUDE = ("*merged*",)
+
+# Threads listing the top-level subfolders of a scan
+SCAN_THREADS = 8
+
+_manifest = None
+
+
+def _entries(path):
+    """(name, is_dir) of the entries of a directory; unreadable directories are logged and skipped"""
+    try:
+        if scandir is not None:
+            return [(entry.name, entry.is_dir()) for entry in scandir(path)]
+        return [(name, os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]
+    except OSError as e:
+        log.warning("[scanner] Cannot list %s: %s", path, e)
+        return []
+
+
+class _Filter(object):
+    def __init__(self, extensions, include, exclude):
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.include = [pattern.lower() for pattern in include or []]
+        self.exclude = [pattern.lower() for pattern in exclude or []]
+
+    def _excluded(self, relative):
+        return any(fnmatch.fnmatchcase(relative, pattern) for pattern in self.exclude)
+
+    def keep_dir(self, relative):
+        relative = relative.lower()
+        return not (self._excluded(relative) or self._excluded(relative + "/"))
+
+    def keep_file(self, relative):
+        relative = relative.lower()
+        if not relative.endswith(self.extensions) or self._excluded(relative):
+            return False
+        return not self.include or any(fnmatch.fnmatchcase(relative, pattern) for pattern in self.include)
+
+
+def _walk(path, relative, folder_filter):
+    """Files kept by folder_filter below path, whose path relative to the scanned folder is relative"""
+    found = []
+    stack = [(path, relative)]
+    while stack:
+        path, relative = stack.pop()
+        for name, is_dir in _entries(path):
+            child = relative + "/" + name if relative else name
+            if is_dir:
+                if folder_filter.keep_dir(child):
+                    stack.append((os.path.join(path, name), child))
+            elif folder_filter.keep_file(child):
+                found.append(os.path.join(path, name))
+    return found
+
+
+def scan_folder(directory, extensions=(".mdb",), include=None, exclude=DEFAULT_EXCLUDE, threads=SCAN_THREADS):
+    """Sorted paths of the files under directory with one of extensions, filtered by the globs"""
+    folder_filter = _Filter(extensions, include, exclude)
+    files = []
+    subfolders = []
+    for name, is_dir in _entries(directory):
+        if is_dir:
+            if folder_filter.keep_dir(name):
+                subfolders.append((os.path.join(directory, name), name))
+        elif folder_filter.keep_file(name):
+            files.append(os.path.join(directory, name))
+
+    if threads > 1 and len(subfolders) > 1:
+        pool = ThreadPool(min(threads, len(subfolders)))
+        try:
+            found = pool.map(lambda subfolder: _walk(subfolder[0], subfolder[1], folder_filter), subfolders)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        found = [_walk(path, relative, folder_filter) for path, relative in subfolders]
+    for subfolder_files in found:
+        files.extend(subfolder_files)
+
+    return sorted(files, key=lambda path: (path.lower(), path))
+
+
+class Manifest(object):
+    """The scan settings of a job's folder and the sorted files found, by extension set"""
+
+    def __init__(self, directory, include=None, exclude=DEFAULT_EXCLUDE, threads=SCAN_THREADS):
+        self.directory = directory
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.threads = threads
+        self.files = {}
+
+    def covers(self, directory):
+        return os.path.normcase(os.path.abspath(directory)) == os.path.normcase(os.path.abspath(self.directory))
+
+    def find_files(self, extensions):
+        extensions = tuple(extensions)
+        if extensions not in self.files:
+            self.files[extensions] = scan_folder(self.directory, extensions, self.include, self.exclude,
+                                                 self.threads)
+            log.info("[scanner] Found %d %s files in %s", len(self.files[extensions]), "/".join(extensions),
+                     self.directory)
+        return list(self.files[extensions])
+
+
+def open_manifest(directory, include=None, exclude=DEFAULT_EXCLUDE, threads=SCAN_THREADS):
+    """Scan directory at most once per extension set until close_manifest, with these globs"""
+    global _manifest
+    _manifest = Manifest(directory, include, exclude, threads)
+    return _manifest
+
+
+def close_manifest():
+    global _manifest
+    _manifest = None
+
+
+def active_manifest():
+    return _manifest
+
+
+def find_files(directory, extensions):
+    """Sorted files of directory with one of extensions, from the open manifest when it covers directory"""
+    if _manifest is not None and _manifest.covers(directory):
+        return _manifest.find_files(extensions)
+    return scan_folder(directory, extensions)
@@ -1,49 +1,58 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
+from backends import arcpy, require_geoprocessing
 from utils import find_mdb_files
+from gridsheet import load_gridsheet
+from progress import mdb_progress, rows_scanned, CountingWriter
 import sys
 import subprocess
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("sheet_number")
 
 pathlib_available = True
 try:
     from pathlib import Path
 except ImportError:
-    print("[init] pathlib not found. Trying to install...")
+    log.warning("[init] pathlib not found. Trying to install...")
     try:
         subprocess.call(["python", "-m", "pip", "install", "pathlib"])
         from pathlib import Path
     except ImportError:
         pathlib_available = False
-        print("[init] Failed to install pathlib. Disabling pathlib support.")
+        log.warning("[init] Failed to install pathlib. Disabling pathlib support.")
 
 class SheetNumberValidator:
+    # Mismatches are written per MDB into 03_SheetNumberReports
+    report_name = None
+
     def __init__(self):
-        print("[__init__] Initializing SheetNumberValidator")
+        log.debug("[__init__] Initializing SheetNumberValidator")
         self.folder_path = ""
         self.gridsheet = ""
         self.status_var = None
+        # Place parcels by label point and only intersect those crossing a sheet line
+        self.point_in_sheet = False
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
     def set_gridsheet(self, gridsheet):
-        print("[set_gridsheet] Setting gridsheet to: {}".format(gridsheet))
+        log.debug("[set_gridsheet] Setting gridsheet to: %s", gridsheet)
         self.gridsheet = gridsheet
 
-    def run_validation(self):
-        print("[sheet_number] Starting sheet number validation")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[sheet_number] Folder path not set")
         if not self.gridsheet:
             raise ValueError("[sheet_number] Gridsheet not set")
+        require_geoprocessing("[sheet_number]")
 
         if pathlib_available:
             if getattr(sys, 'frozen', False):
@@ -53,69 +62,113 @@ class SheetNumberValidator:
         else:
             base_path = os.path.dirname(os.path.abspath(__file__))
 
-        gridsheet_path = base_path / "templates" / self.gridsheet
-        print("[sheet_number] Using gridsheet at: {}".format(gridsheet_path))
+        gridsheet_path = os.path.join(str(base_path), "templates", self.gridsheet)
+        log.info("[sheet_number] Using gridsheet at: %s", gridsheet_path)
 
         if not arcpy.Exists(gridsheet_path):
             raise ValueError("[sheet_number] Gridsheet not found at: {}".format(gridsheet_path))
+        if "PageNumber" not in [f.name for f in arcpy.ListFields(gridsheet_path)]:
+            raise ValueError("[sheet_number] PageNumber field missing in {}".format(gridsheet_path))
+        self.gridsheet_path = gridsheet_path
+
+        self.output_dir = os.path.join(self.folder_path, "03_SheetNumberReports")
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+            log.info("[sheet_number] Created output directory: %s", self.output_dir)
+
+    def validate_mdb(self, mdb, writer=None):
+        """Write the mismatch report of one MDB into the report directory"""
+        parcel_path = os.path.join(mdb, "Parcel")
+        if not arcpy.Exists(parcel_path):
+            log.debug("[sheet_number] Parcel not found in %s", mdb)
+            return
+
+        mdb_name = os.path.basename(mdb)
+        # Loaded on the first MDB of each process and reused for the rest
+        gridsheet = load_gridsheet(self.gridsheet_path)
+
+        if self.point_in_sheet:
+            self._check_label_points(mdb, parcel_path, gridsheet)
+            return
+
+        mismatch_csv = os.path.join(self.output_dir, "03_Mismatch_{}.csv".format(mdb_name))
+        with open_report(mismatch_csv, ["Source", "WARDNO", "FID_Parcel", "PARCELNO", "PageNumber", "GRIDS1"]) as sink:
+            writer = CountingWriter(sink)
+
+            mismatch_count = 0
+            rows = 0
+            with arcpy.da.SearchCursor(parcel_path, ["OID@", "WARDNO", "PARCELNO", "GRIDS1", "SHAPE@"]) as cursor:
+                for oid, ward, parcel_no, grids1, shape in cursor:
+                    rows += 1
+                    if shape is None:
+                        continue
+                    for page in gridsheet.pages_of(shape):
+                        if str(page) != str(grids1):
+                            writer.writerow([parcel_path, ward, oid, parcel_no, page, grids1])
+                            mismatch_count += 1
+            rows_scanned(rows)
+            log.debug("[sheet_number] Found %s mismatches in %s", mismatch_count, mdb_name)
+
+    def _check_label_points(self, mdb, parcel_path, gridsheet):
+        """Write the wrong sheet and multiple sheet reports of one MDB (point_in_sheet mode).
+
+        A parcel is on the wrong sheet when the sheet under its label point is not its
+        GRIDS1, and spans multiple sheets when it shares area with more than one sheet.
+        """
+        mdb_name = os.path.basename(mdb)
+        wrong_csv = os.path.join(self.output_dir, "03_WrongSheet_{}.csv".format(mdb_name))
+        multiple_csv = os.path.join(self.output_dir, "03_MultipleSheets_{}.csv".format(mdb_name))
+        wrong_header = ["Source", "WARDNO", "FID_Parcel", "PARCELNO", "PageNumber", "GRIDS1"]
+        multiple_header = ["Source", "WARDNO", "FID_Parcel", "PARCELNO", "GRIDS1", "PageNumbers"]
+        with open_report(wrong_csv, wrong_header) as wrong, open_report(multiple_csv, multiple_header) as multiple:
+            wrong_writer = CountingWriter(wrong)
+            multiple_writer = CountingWriter(multiple)
+
+            wrong_count = 0
+            multiple_count = 0
+            rows = 0
+            with arcpy.da.SearchCursor(parcel_path, ["OID@", "WARDNO", "PARCELNO", "GRIDS1", "SHAPE@"]) as cursor:
+                for oid, ward, parcel_no, grids1, shape in cursor:
+                    rows += 1
+                    if shape is None:
+                        continue
+                    page, pages = gridsheet.locate(shape)
+                    if page is not None and str(page) != str(grids1):
+                        wrong_writer.writerow([parcel_path, ward, oid, parcel_no, page, grids1])
+                        wrong_count += 1
+                    if len(pages) > 1:
+                        multiple_writer.writerow([parcel_path, ward, oid, parcel_no, grids1,
+                                                  "; ".join(str(value) for value in pages)])
+                        multiple_count += 1
+            rows_scanned(rows)
+            log.debug("[sheet_number] Found %s parcels on the wrong sheet and %s spanning multiple sheets in %s",
+                      wrong_count, multiple_count, mdb_name)
 
-        output_dir = os.path.join(self.folder_path, "03_SheetNumberReports")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print("[sheet_number] Created output directory: {}".format(output_dir))
+    def run_validation(self):
+        log.info("[sheet_number] Starting sheet number validation")
+
+        self.prepare_validation()
 
         mdb_files = find_mdb_files(self.folder_path)
-        print("[sheet_number] Found {} MDB files".format(len(mdb_files)))
+        log.info("[sheet_number] Found %s MDB files", len(mdb_files))
 
         for index, mdb in enumerate(mdb_files, start=1):
-            parcel_path = os.path.join(mdb, "Parcel")
-            if not arcpy.Exists(parcel_path):
-                print("[sheet_number] Parcel not found in {}".format(mdb))
-                continue
-
             try:
+                mdb_progress(index, len(mdb_files), mdb)
                 mdb_name = os.path.basename(mdb)
                 if self.status_var:
                     self.status_var.set("Processing {}...".format(mdb_name))
-                print("[sheet_number] Processing ({}/{}) {}".format(index, len(mdb_files), mdb))
-
-                intersect_shp = os.path.join(output_dir, "Intersect.shp")
-                if arcpy.Exists(intersect_shp):
-                    arcpy.Delete_management(intersect_shp)
-                    print("[sheet_number] Deleted previous intersect shapefile")
-
-                arcpy.Intersect_analysis([str(gridsheet_path), str(parcel_path)], intersect_shp, "ALL")
-                print("[sheet_number] Created intersection shapefile")
-
-                fields = [f.name for f in arcpy.ListFields(intersect_shp)]
-                if "PageNumber" not in fields:
-                    msg = "[sheet_number] PageNumber field missing in {}".format(intersect_shp)
-                    print(msg)
-                    if self.status_var:
-                        self.status_var.set(msg)
-                    continue
-
-                mismatch_csv = os.path.join(output_dir, "03_Mismatch_{}.csv".format(mdb_name))
-                with open(mismatch_csv, 'wb') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(["Source", "WARDNO", "FID_Parcel", "PARCELNO", "PageNumber", "GRIDS1"])
-
-                    with arcpy.da.SearchCursor(intersect_shp,
-                                               ["PageNumber", "GRIDS1", "WARDNO", "FID_Parcel", "PARCELNO"]) as cursor:
-                        mismatch_count = 0
-                        for row in cursor:
-                            if str(row[0]) != str(row[1]):
-                                writer.writerow([parcel_path, row[2], row[3], row[4], row[0], row[1]])
-                                mismatch_count += 1
-                        print("[sheet_number] Found {} mismatches in {}".format(mismatch_count, mdb_name))
+                log.debug("[sheet_number] Processing (%s/%s) %s", index, len(mdb_files), mdb)
+
+                self.validate_mdb(mdb)
 
             except Exception as e:
                 error_msg = "[sheet_number] Error processing {}: {}".format(mdb, str(e))
-                print(error_msg)
+                log.error(error_msg)
                 if self.status_var:
                     self.status_var.set(error_msg)
                 raise
 
         if self.status_var:
             self.status_var.set("Sheet number validation completed")
-        print("[sheet_number] Sheet number validation completed")
+        log.info("[sheet_number] Sheet number validation completed")
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Shape measures of polygon features, computed in batches from their vertex arrays.
+
+Features are read through the SHAPE@ARRAYS cursor token, so nothing depends on a stored
+Shape_Area column and any polygon class a backend opens can be measured. For each
+batch the rings are concatenated into one coordinate array and area and perimeter come
+out of a handful of NumPy calls, whatever the number of features.
+
+thinness is 4πA/P²: 1 for a circle, about 0.785 for a square, near 0 for a strip.
+min_width is the width of the rectangle with the same area and perimeter, exact for
+rectangles; compact shapes (P² < 16A) get P/4, the side of the square.
+"""
+import copy
+import math
+import numpy as np
+from backends import SHAPE_ARRAYS
+from geometry import close_ring
+from progress import rows_scanned
+from utils import search_cursor
+
+# Features measured per batch
+BATCH_SIZE = 10000
+
+THRESHOLD_NAMES = ("min_area", "min_thinness", "min_width")
+
+# A feature failing any test of its class is reported; 0 turns a test off
+DEFAULT_THRESHOLDS = {
+    "Parcel": {"min_area": 5.0, "min_thinness": 0.05, "min_width": 0.5},
+    "Construction": {"min_area": 5.0, "min_thinness": 0.05, "min_width": 0.5},
+}
+
+# Report reason of each threshold
+REASONS = {"min_area": "area", "min_thinness": "thin", "min_width": "narrow"}
+
+
+def default_thresholds():
+    return copy.deepcopy(DEFAULT_THRESHOLDS)
+
+
+def parse_thresholds(spec):
+    """Thresholds from "Parcel:min_area=5,min_width=0.5;Construction:min_area=2" or a mapping
+    {class: {name: value}}, over the defaults of the classes named"""
+    if isinstance(spec, dict):
+        entries = spec.items()
+    else:
+        entries = []
+        for part in str(spec).split(";"):
+            if not part.strip():
+                continue
+            if ":" not in part:
+                raise ValueError("[slivers] Expected <feature class>:<name>=<value>,...: {}".format(part.strip()))
+            fc_name, settings = part.split(":", 1)
+            values = {}
+            for setting in settings.split(","):
+                if not setting.strip():
+                    continue
+                if "=" not in setting:
+                    raise ValueError("[slivers] Expected <name>=<value>: {}".format(setting.strip()))
+                name, value = setting.split("=", 1)
+                values[name.strip()] = value.strip()
+            entries.append((fc_name.strip(), values))
+
+    thresholds = default_thresholds()
+    for fc_name, values in entries:
+        limits = thresholds.setdefault(str(fc_name), dict((name, 0.0) for name in THRESHOLD_NAMES))
+        for name, value in values.items():
+            if name not in THRESHOLD_NAMES:
+                raise ValueError("[slivers] Unknown threshold {} (choose from {})".format(
+                    name, ", ".join(THRESHOLD_NAMES)))
+            try:
+                limits[str(name)] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError("[slivers] Invalid value for {}.{}: {}".format(fc_name, name, value))
+            if limits[name] < 0:
+                raise ValueError("[slivers] Negative value for {}.{}: {}".format(fc_name, name, value))
+    return thresholds
+
+
+def format_thresholds(thresholds):
+    """The parse_thresholds text of thresholds"""
+    return ";".join("{}:{}".format(fc_name, ",".join("{}={:g}".format(name, thresholds[fc_name][name])
+                                                    for name in THRESHOLD_NAMES))
+                    for fc_name in sorted(thresholds))
+
+
+def measure(geometries):
+    """(area, perimeter) arrays of a list of polygon Geometry objects (None or empty gives 0, 0)"""
+    rings = []
+    owners = []
+    signs = []
+    for index, geometry in enumerate(geometries):
+        if geometry is None or geometry.shape_type != "Polygon":
+            continue
+        for polygon in geometry.parts:
+            for ring_index, ring in enumerate(polygon):
+                if len(ring):
+                    rings.append(close_ring(ring))
+                    owners.append(index)
+                    # Outer ring first, holes after it
+                    signs.append(-1.0 if ring_index else 1.0)
+
+    count = len(geometries)
+    if not rings:
+        return np.zeros(count), np.zeros(count)
+
+    lengths = np.array([len(ring) for ring in rings])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    coords = np.concatenate(rings)
+    x0, y0 = coords[:-1, 0], coords[:-1, 1]
+    x1, y1 = coords[1:, 0], coords[1:, 1]
+    # Edge i runs from vertex i to i + 1; the last vertex of a ring starts no edge
+    inside = np.ones(len(coords) - 1, dtype=bool)
+    inside[(starts + lengths - 1)[:-1]] = False
+    cross = np.where(inside, x0 * y1 - x1 * y0, 0.0)
+    edges = np.where(inside, np.hypot(x1 - x0, y1 - y0), 0.0)
+
+    # Sum per ring: append a zero edge so every ring, the last one included, has an edge slot
+    cross = np.append(cross, 0.0)
+    edges = np.append(edges, 0.0)
+    ring_areas = np.abs(0.5 * np.add.reduceat(cross, starts))
+    ring_lengths = np.add.reduceat(edges, starts)
+
+    owners = np.array(owners)
+    areas = np.bincount(owners, weights=ring_areas * np.array(signs), minlength=count)
+    perimeters = np.bincount(owners, weights=ring_lengths, minlength=count)
+    return areas, perimeters
+
+
+def shape_measures(areas, perimeters):
+    """(thinness, min_width) arrays from area and perimeter arrays"""
+    squared = perimeters * perimeters
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thinness = np.where(squared > 0, 4.0 * math.pi * areas / squared, 0.0)
+    min_width = (perimeters - np.sqrt(np.maximum(squared - 16.0 * areas, 0.0))) / 4.0
+    return thinness, min_width
+
+
+def failed_tests(limits, areas, thinness, min_width):
+    """{threshold name: boolean mask} of the features below each non-zero threshold in limits"""
+    values = {"min_area": areas, "min_thinness": thinness, "min_width": min_width}
+    return dict((name, values[name] < limits[name]) for name in THRESHOLD_NAMES if limits.get(name))
+
+
+def iter_batches(full_path, fields, batch_size=BATCH_SIZE):
+    """(rows of fields, areas, perimeters, thinness, min_width) per batch of a polygon feature class"""
+    with search_cursor(full_path, list(fields) + [SHAPE_ARRAYS]) as cursor:
+        rows = []
+        geometries = []
+        for row in cursor:
+            rows.append(row[:-1])
+            geometries.append(row[-1])
+            if len(rows) >= batch_size:
+                rows_scanned(len(rows))
+                yield _measured(rows, geometries)
+                rows = []
+                geometries = []
+        if rows:
+            rows_scanned(len(rows))
+            yield _measured(rows, geometries)
+
+
+def _measured(rows, geometries):
+    areas, perimeters = measure(geometries)
+    thinness, min_width = shape_measures(areas, perimeters)
+    return rows, areas, perimeters, thinness, min_width
+
+
+def find_slivers(full_path, limits, fields, batch_size=BATCH_SIZE):
+    """(row of fields, area, perimeter, thinness, min_width, reasons) of every feature failing limits"""
+    for rows, areas, perimeters, thinness, min_width in iter_batches(full_path, fields, batch_size):
+        failed = failed_tests(limits, areas, thinness, min_width)
+        if not failed:
+            continue
+        flagged = np.zeros(len(rows), dtype=bool)
+        for mask in failed.values():
+            flagged |= mask
+        for index in np.flatnonzero(flagged):
+            reasons = [REASONS[name] for name in THRESHOLD_NAMES if name in failed and failed[name][index]]
+            yield (rows[index], float(areas[index]), float(perimeters[index]), float(thinness[index]),
+                   float(min_width[index]), reasons)
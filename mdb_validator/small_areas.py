@@ -1,86 +1,106 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-from utils import find_mdb_files, get_feature_classes
+from utils import find_mdb_files, get_feature_classes, describe_feature_class
+from progress import mdb_progress, CountingWriter
+from slivers import default_thresholds, parse_thresholds, format_thresholds, find_slivers
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("small_areas")
 
 
 class SmallAreasValidator:
+    """Polygons that are too small, too thin or too narrow (slivers), by the thresholds of their class.
+
+    Area, perimeter, thinness and width are measured from the geometry (see slivers), so
+    a sliver with a large enough area is still found and classes without a stored
+    Shape_Area are checked too.
+    """
+    report_name = "05_small_areas_report.csv"
+    report_header = ["Source File", "Feature Class", "Parcel Number", "ParFID", "Area (sq.m)",
+                     "Perimeter (m)", "Thinness", "Min Width (m)", "Reason"]
+
     def __init__(self):
-        print("[__init__] Initializing SmallAreasValidator")
+        log.debug("[__init__] Initializing SmallAreasValidator")
         self.folder_path = ""
         self.status_var = None
+        self.failures = []
+        # {feature class: {threshold name: value}}
+        self.thresholds = default_thresholds()
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_folder_path] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_folder_path] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
-    def run_validation(self):
-        print("[small_areas] Starting small areas validation")
+    def set_thresholds(self, thresholds):
+        """Thresholds per feature class, as a mapping or parse_thresholds text"""
+        self.thresholds = parse_thresholds(thresholds)
+        log.debug("[set_thresholds] Setting thresholds to: %s", format_thresholds(self.thresholds))
+
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[small_areas] Folder path not set")
 
-        output_csv = os.path.join(self.folder_path, "05_small_areas_report.csv")
+    def validate_mdb(self, mdb, writer):
+        """Write the small and sliver features of one MDB"""
+        features = get_feature_classes(mdb, list(self.thresholds))
+        log.debug("[small_areas] Found %s relevant feature classes in %s", len(features), os.path.basename(mdb))
+
+        for fc_name, full_path in features:
+            shape_type, fields = describe_feature_class(full_path)
+            if shape_type != "Polygon":
+                log.debug("[small_areas] Skipping non-polygon feature class: %s", fc_name)
+                continue
+
+            if fc_name == "Parcel":
+                id_field = "PARCELNO"
+            else:
+                id_field = "ParFID" if "ParFID" in fields else "OID@"
+
+            small_count = 0
+            for row, area, perimeter, thinness, min_width, reasons in find_slivers(
+                    full_path, self.thresholds[fc_name], [id_field]):
+                small_count += 1
+                parcel_no, par_fid = (row[0], "") if fc_name == "Parcel" else ("", row[0])
+                writer.writerow([full_path, fc_name, parcel_no, par_fid, area, perimeter,
+                                 round(thinness, 4), round(min_width, 3), "; ".join(reasons)])
+            log.debug("[small_areas] %s small features in %s (%s)", small_count, fc_name, os.path.basename(mdb))
+
+    def run_validation(self):
+        log.info("[small_areas] Starting small areas validation")
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
-        print("[small_areas] Found {} MDB files".format(len(mdb_files)))
+        log.info("[small_areas] Found %s MDB files", len(mdb_files))
 
         if not mdb_files:
             raise ValueError("[small_areas] No MDB files found in the specified folder")
 
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Source File", "Feature Class", "Parcel Number", "ParFID", "Area (sq.m)"])
-
+        with open_report(output_csv, self.report_header) as writer:
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     mdb_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing {}...".format(mdb_name))
-                    print("[small_areas] Processing ({}/{}) {}".format(index, len(mdb_files), mdb_name))
-
-                    features = get_feature_classes(mdb, ["Parcel", "Construction"])
-                    print("[small_areas] Found {} relevant feature classes in {}".format(len(features), mdb_name))
-
-                    for fc_name, full_path in features:
-                        shape_type = arcpy.Describe(full_path).shapeType
-                        if shape_type != "Polygon":
-                            print("[small_areas] Skipping non-polygon feature class: {}".format(fc_name))
-                            continue
-
-                        fields = [f.name for f in arcpy.ListFields(full_path)]
-                        if "Shape_Area" not in fields:
-                            print("[small_areas] Shape_Area field missing in: {}".format(fc_name))
-                            continue
-
-                        if fc_name == "Parcel":
-                            field_list = ["PARCELNO", "Shape_Area"]
-                            min_area = 5
-                        else:  # Construction
-                            field_list = ["ParFID", "Shape_Area"]
-                            min_area = 5
-
-                        small_count = 0
-                        with arcpy.da.SearchCursor(full_path, field_list) as cursor:
-                            for row in cursor:
-                                if row[1] < min_area:
-                                    small_count += 1
-                                    if fc_name == "Parcel":
-                                        writer.writerow([full_path, fc_name, row[0], "", row[1]])
-                                    else:
-                                        writer.writerow([full_path, fc_name, "", row[0], row[1]])
-                        print("[small_areas] {} small features in {} ({})".format(small_count, fc_name, mdb_name))
+                    log.debug("[small_areas] Processing (%s/%s) %s", index, len(mdb_files), mdb_name)
+
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_msg = "[small_areas] Error processing {}: {}".format(mdb, str(e))
-                    print(error_msg)
+                    log.error(error_msg)
                     if self.status_var:
                         self.status_var.set(error_msg)
-                    raise
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
 
         if self.status_var:
             self.status_var.set("Small areas validation completed")
-        print("[small_areas] Small areas validation completed")
+        log.info("[small_areas] Small areas validation completed")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Folder-wide key counts kept on disk as one sorted run per MDB and merged externally.
+
+A run is a csv of key fields followed by a count, sorted by key. Merging streams the
+runs with a k-way merge, so memory holds one line per open run whatever the folder size.
+"""
+import os
+import csv
+import heapq
+import itertools
+from progress import check_cancelled
+
+# Sorted runs merged at once; more runs are merged in rounds so open files stay bounded
+MERGE_FAN_IN = 64
+
+
+def key_text(value):
+    """Key values as byte strings, so keys stored as numbers in one MDB and text in another still match"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if not isinstance(value, str) and hasattr(value, 'encode'):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def write_run(path, counts):
+    """Write {key tuple of byte strings: count} as a sorted run"""
+    with open(path, 'wb') as f:
+        writer = csv.writer(f)
+        for key, count in sorted(counts.items()):
+            writer.writerow(list(key) + [count])
+
+
+def _read_run(path, mdb_index=None):
+    """Yield (key, mdb_index, count) from a run; per-MDB runs get mdb_index from the caller"""
+    with open(path, 'rb') as f:
+        for row in csv.reader(f):
+            if mdb_index is None:
+                yield tuple(row[:-2]), int(row[-2]), int(row[-1])
+            else:
+                yield tuple(row[:-1]), mdb_index, int(row[-1])
+
+
+def _merge(runs, temp_dir, fan_in):
+    """Merge [(path, mdb_index or None)] down to at most fan_in runs, then into one stream"""
+    round_number = 0
+    while len(runs) > fan_in:
+        round_number += 1
+        merged = []
+        for start in range(0, len(runs), fan_in):
+            check_cancelled()
+            path = os.path.join(temp_dir, "{:03d}_{:06d}.csv".format(round_number, start))
+            with open(path, 'wb') as f:
+                writer = csv.writer(f)
+                for key, mdb_index, count in heapq.merge(*[_read_run(*run) for run in runs[start:start + fan_in]]):
+                    writer.writerow(list(key) + [mdb_index, count])
+            merged.append((path, None))
+        runs = merged
+    return heapq.merge(*[_read_run(*run) for run in runs])
+
+
+def merged_groups(run_paths, temp_dir):
+    """Yield (key, frequency, sorted indexes into run_paths) for every key of the runs, in key order"""
+    merged = _merge([(path, mdb_index) for mdb_index, path in enumerate(run_paths)], temp_dir, MERGE_FAN_IN)
+    for key, entries in itertools.groupby(merged, lambda entry: entry[0]):
+        entries = list(entries)
+        yield (key, sum(count for entry_key, mdb_index, count in entries),
+               sorted(set(mdb_index for entry_key, mdb_index, count in entries)))
+
+
+def prune_runs(runs_dir, run_paths):
+    """Delete the runs in runs_dir that are not in run_paths (left over from MDBs that are gone)"""
+    current = set(os.path.normcase(os.path.abspath(path)) for path in run_paths)
+    for name in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, name)
+        if os.path.normcase(os.path.abspath(path)) not in current:
+            os.remove(path)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import math
+
+
+def boxes_overlap(box1, box2):
+    """True if two (xmin, ymin, xmax, ymax) boxes share any area or boundary"""
+    return box1[0] <= box2[2] and box2[0] <= box1[2] and box1[1] <= box2[3] and box2[1] <= box1[3]
+
+
+class GridIndex(object):
+    """Bounding-box index on a uniform grid.
+
+    Every item is registered in each cell its box touches, so a query only looks at
+    the items sharing a cell with the query box instead of at every item.
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("[spatial_index] Cell size must be positive")
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.boxes = {}
+
+    @classmethod
+    def for_boxes(cls, boxes):
+        """Build an index sized for a collection of (key, box) pairs and insert them"""
+        boxes = list(boxes)
+        widths = sorted(max(box[2] - box[0], box[3] - box[1]) for _, box in boxes)
+        # Median item size keeps most items in a handful of cells
+        cell_size = widths[len(widths) // 2] if widths else 1.0
+        if boxes:
+            # ... but never more than about a million cells over the whole extent
+            span = max(max(box[2] for _, box in boxes) - min(box[0] for _, box in boxes),
+                       max(box[3] for _, box in boxes) - min(box[1] for _, box in boxes))
+            cell_size = max(cell_size, span / 1024.0)
+        index = cls(cell_size if cell_size > 0 else 1.0)
+        for key, box in boxes:
+            index.insert(key, box)
+        return index
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (int(math.floor(box[0] / size)), int(math.floor(box[1] / size)),
+                int(math.floor(box[2] / size)), int(math.floor(box[3] / size)))
+
+    def insert(self, key, box):
+        self.boxes[key] = box
+        col_min, row_min, col_max, row_max = self._cell_range(box)
+        for col in range(col_min, col_max + 1):
+            for row in range(row_min, row_max + 1):
+                self.cells.setdefault((col, row), []).append(key)
+
+    def query(self, box):
+        """Keys whose boxes overlap the given box"""
+        found = set()
+        col_min, row_min, col_max, row_max = self._cell_range(box)
+        for col in range(col_min, col_max + 1):
+            for row in range(row_min, row_max + 1):
+                for key in self.cells.get((col, row), ()):
+                    if key not in found and boxes_overlap(self.boxes[key], box):
+                        found.add(key)
+        return found
+
+    def candidate_pairs(self):
+        """All (key1, key2) pairs with overlapping boxes, each pair once, in insertion-independent order"""
+        pairs = set()
+        for keys in self.cells.values():
+            for i in range(len(keys)):
+                for j in range(i + 1, len(keys)):
+                    key1, key2 = keys[i], keys[j]
+                    if key2 < key1:
+                        key1, key2 = key2, key1
+                    if (key1, key2) not in pairs and boxes_overlap(self.boxes[key1], self.boxes[key2]):
+                        pairs.add((key1, key2))
+        return sorted(pairs)
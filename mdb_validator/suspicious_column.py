@@ -1,79 +1,98 @@
 # -*- coding: utf-8 -*-
 import os
-import arcpy
-import csv
-from utils import find_mdb_files, get_feature_classes
+from utils import find_mdb_files
+from engine import scan_mdb
+from columnar import flag_values, flagged_rows
+from progress import mdb_progress, CountingWriter
+from reports import open_report
+from logs import get_logger
+
+log = get_logger("suspicious_column")
 
 
 class SuspiciousColumnValidator:
+    report_name = "10_suspicious_column_report.csv"
+    report_header = ["Source File", "Parcel Number", "Status", "Value"]
+    row_feature_classes = ["Parcel"]
+
     def __init__(self):
-        print("[__init__] Initializing SuspiciousColumnValidator")
+        log.debug("[__init__] Initializing SuspiciousColumnValidator")
         self.folder_path = ""
         self.status_var = None
+        self.failures = []
 
     def set_status_var(self, status_var):
-        print("[set_status_var] Setting status_var")
+        log.debug("[set_status_var] Setting status_var")
         self.status_var = status_var
 
     def set_folder_path(self, folder_path):
-        print("[set_status_var] Setting folder path to: {}".format(folder_path))
+        log.debug("[set_status_var] Setting folder path to: %s", folder_path)
         self.folder_path = folder_path
 
-    def run_validation(self):
-        print("[SuspiciousColumnValidator] Starting validation process")
-
+    def prepare_validation(self):
         if not self.folder_path:
             raise ValueError("[SuspiciousColumnValidator] Folder path not set")
 
-        output_csv = os.path.join(self.folder_path, "10_suspicious_column_report.csv")
+    def begin_feature_class(self, mdb, fc_name, full_path, shape_type, field_names, writer):
+        self._current_mdb = mdb
+        # Check if suspicious column exists
+        if "suspicious" not in field_names:
+            writer.writerow([mdb, "N/A", "Column missing", "suspicious column not found"])
+            return None
+        return ["PARCELNO", "suspicious"]
+
+    def is_flagged(self, value):
+        # yes/YES/y values mark a parcel as suspicious
+        return (str(value).strip().upper() if value is not None else "") in ["YES", "Y"]
+
+    def check_columns(self, columns, writer):
+        flagged = flag_values(columns[1], self.is_flagged)
+        for parcel_no, value in flagged_rows(columns, flagged):
+            writer.writerow([self._current_mdb, parcel_no, "Flagged as suspicious", value])
+
+    def record_error(self, mdb, error, writer):
+        writer.writerow([mdb, "ERROR", "Processing error", str(error)])
+
+    def validate_mdb(self, mdb, writer):
+        scan_mdb(mdb, [self], {self: writer})
+
+    def run_validation(self):
+        log.info("[SuspiciousColumnValidator] Starting validation process")
+
+        self.prepare_validation()
+        self.failures = []
+
+        output_csv = os.path.join(self.folder_path, self.report_name)
         mdb_files = find_mdb_files(self.folder_path)
 
         if not mdb_files:
             raise ValueError("[SuspiciousColumnValidator] No MDB files found in the specified folder")
 
-        print("[SuspiciousColumnValidator] Found {} MDB files".format(len(mdb_files)))
-
-        with open(output_csv, 'wb') as csvfile:
-            writer = csv.writer(csvfile)
-            # Updated header to include status type
-            writer.writerow(["Source File", "Parcel Number", "Status", "Value"])
+        log.info("[SuspiciousColumnValidator] Found %s MDB files", len(mdb_files))
 
+        with open_report(output_csv, self.report_header) as writer:
             for index, mdb in enumerate(mdb_files, start=1):
                 try:
+                    mdb_progress(index, len(mdb_files), mdb)
                     base_name = os.path.basename(mdb)
                     if self.status_var:
                         self.status_var.set("Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
 
-                    print("[SuspiciousColumnValidator] Processing ({}/{}) {}".format(index, len(mdb_files), base_name))
-
-                    parcels = get_feature_classes(mdb, ["Parcel"])
-                    print("[SuspiciousColumnValidator] Found {} Parcel feature classes in {}".format(len(parcels), base_name))
-
-                    for fc_name, full_path in parcels:
-                        # Check if suspicious column exists
-                        field_names = [f.name for f in arcpy.ListFields(full_path)]
-                        if "suspicious" not in field_names:
-                            writer.writerow([mdb, "N/A", "Column missing", "suspicious column not found"])
-                            continue
+                    log.debug("[SuspiciousColumnValidator] Processing (%s/%s) %s", index, len(mdb_files), base_name)
 
-                        # If column exists, check for yes/YES values
-                        with arcpy.da.SearchCursor(full_path, ["PARCELNO", "suspicious"]) as cursor:
-                            for row in cursor:
-                                parcel_no = row[0]
-                                suspicious_val = str(row[1]).strip().upper() if row[1] is not None else ""
-                                if suspicious_val in ["YES", "Y"]:
-                                    writer.writerow([mdb, parcel_no, "Flagged as suspicious", row[1]])
+                    self.validate_mdb(mdb, CountingWriter(writer))
 
                 except Exception as e:
                     error_message = "[SuspiciousColumnValidator] Error processing {}: {}".format(mdb, str(e))
                     if self.status_var:
                         self.status_var.set(error_message)
-                    print(error_message)
-                    # Continue with next file instead of raising exception
-                    writer.writerow([mdb, "ERROR", "Processing error", str(e)])
+                    log.error(error_message)
+                    # One bad MDB must not stop the run; it is reported with the job's failures
+                    self.failures.append((mdb, self.__class__.__name__, str(e)))
+                    self.record_error(mdb, e, writer)
                     continue
 
         if self.status_var:
             self.status_var.set("Suspicious column validation completed")
 
-        print("[SuspiciousColumnValidator] Suspicious column validation completed")
\ No newline at end of file
+        log.info("[SuspiciousColumnValidator] Suspicious column validation completed")
\ No newline at end of file
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import os
+import glob
+import json
+import shutil
+import tempfile
+import unittest
+from mdb_validator import backends, catalog, checkpoint
+from mdb_validator.benchmark import generate_dataset
+from mdb_validator.checkpoint import Journal, ResumableValidationRunner
+from mdb_validator.incremental import RESULTS_DIR_NAME
+from mdb_validator.jobs import create_validators, configure_validator
+
+VALIDATOR_KEYS = ["invalid_sheet", "invalid_ward", "duplicate_parcels", "cross_mdb_duplicates",
+                  "duplicate_const_and_segments", "small_areas", "segment_counts", "invalid_parcel_no",
+                  "suspicious_column"]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.mdb = os.path.join(self.folder, "a.gpkg")
+        open(self.mdb, 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_torn_last_line_is_skipped(self):
+        journal = Journal(self.folder)
+        journal.open()
+        journal.record(self.mdb, [("InvalidWardValidator_1", None, None)])
+        # A crash in the middle of the next line
+        journal._file.write('{"validator": "SmallAreasValid')
+        journal.close()
+
+        journal = Journal(self.folder)
+        journal.open()
+        self.assertTrue(journal.completed("InvalidWardValidator_1", self.mdb))
+        self.assertFalse(journal.completed("SmallAreasValidator_1", self.mdb))
+        journal.record(self.mdb, [("SmallAreasValidator_1", [1, 2], None)])
+        journal.close()
+
+        # The next line starts after the torn one, not on it
+        with open(journal.path) as f:
+            lines = f.read().split("\n")
+        self.assertEqual(lines[1], '{"validator": "SmallAreasValid')
+        self.assertEqual(json.loads(lines[2])["validator"], "SmallAreasValidator_1")
+        journal = Journal(self.folder)
+        journal.open()
+        self.assertTrue(journal.completed("SmallAreasValidator_1", self.mdb))
+        self.assertEqual(journal.result("SmallAreasValidator_1", self.mdb), (1, 2))
+        journal.close()
+
+    def test_changed_mdb_is_not_completed(self):
+        journal = Journal(self.folder)
+        journal.open()
+        journal.record(self.mdb, [("InvalidWardValidator_1", None, None)])
+        with open(self.mdb, 'ab') as f:
+            f.write(b"changed")
+        self.assertFalse(journal.completed("InvalidWardValidator_1", self.mdb))
+        journal.close()
+
+
+class ResumeTest(unittest.TestCase):
+    """An interrupted and resumed run writes the same reports as a run in one go"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        backends.set_backend("geopackage")
+        generate_dataset(self.folder, mdbs=4, rows=5, cols=5, seed=7)
+        self.record = checkpoint.Journal.record
+        self.validate_files = checkpoint.validate_files
+
+    def tearDown(self):
+        checkpoint.Journal.record = self.record
+        checkpoint.validate_files = self.validate_files
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def _run(self):
+        validators = [validator for name, validator in create_validators(VALIDATOR_KEYS)]
+        for validator in validators:
+            configure_validator(validator, self.folder, scale="500")
+        runner = ResumableValidationRunner(validators)
+        runner.set_folder_path(self.folder)
+        runner.run_validation()
+        return runner
+
+    def _reports(self):
+        reports = {}
+        for path in glob.glob(os.path.join(self.folder, "*.csv")):
+            with open(path, 'rb') as f:
+                reports[os.path.basename(path)] = f.read()
+        return reports
+
+    def _clear_outputs(self):
+        for path in glob.glob(os.path.join(self.folder, "*.csv")):
+            os.remove(path)
+        shutil.rmtree(os.path.join(self.folder, RESULTS_DIR_NAME), ignore_errors=True)
+
+    def test_resume_after_interruption(self):
+        self.assertEqual(self._run().failures, [])
+        expected = self._reports()
+        self.assertEqual(len(expected), len(VALIDATOR_KEYS))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, checkpoint.JOURNAL_DIR_NAME)))
+        self._clear_outputs()
+
+        # Stop after the second MDB, leaving a torn line as a power cut would
+        record = self.record
+
+        def interrupted_record(journal, mdb, units):
+            record(journal, mdb, units)
+            if len(set(entry["mdb"] for entry in journal.units.values())) == 2:
+                journal._file.write('{"validator": "Sma')
+                journal._file.flush()
+                raise Interrupted()
+        checkpoint.Journal.record = interrupted_record
+        self.assertRaises(Interrupted, self._run)
+        checkpoint.Journal.record = record
+        self.assertTrue(os.path.exists(os.path.join(self.folder, checkpoint.JOURNAL_DIR_NAME)))
+
+        tasks = []
+        validate_files = self.validate_files
+
+        def recording_validate_files(validators, run_tasks, *args):
+            tasks.extend(run_tasks)
+            return validate_files(validators, run_tasks, *args)
+        checkpoint.validate_files = recording_validate_files
+        self.assertEqual(self._run().failures, [])
+
+        # Only the MDBs the interrupted run did not finish are validated again
+        self.assertEqual([os.path.basename(mdb) for mdb_index, mdb, pending in tasks],
+                         ["Synthetic_0003.gpkg", "Synthetic_0004.gpkg"])
+        self.assertEqual(sorted(self._reports()), sorted(expected))
+        for name, data in sorted(self._reports().items()):
+            self.assertEqual(data, expected[name], name)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, checkpoint.JOURNAL_DIR_NAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
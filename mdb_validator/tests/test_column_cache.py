@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from mdb_validator import backends, catalog, column_cache, utils
+from mdb_validator.benchmark import write_geopackage
+from mdb_validator.column_cache import (INDEX_NAME, ColumnCache, open_column_cache,
+                                        close_column_cache, storable)
+
+FIELDS = ["PARCELNO", "WARDNO", "GRIDS1", "suspicious", "Shape_Area"]
+
+
+def square(i, size=1.0):
+    return [(i, 0.0), (i + size, 0.0), (i + size, size), (i, size), (i, 0.0)]
+
+
+class StorableTest(unittest.TestCase):
+
+    def _object_column(self, values):
+        column = np.ma.masked_array(np.empty(len(values), dtype=object), mask=[value is None for value in values])
+        column.data[:] = values
+        return column
+
+    def test_object_columns_are_narrowed(self):
+        for values, kind in [([1, None, 2L], "i"), ([1.5, None], "f"), (["a", None, "bcd"], "S"),
+                             ([u"क", None], "U"), ([None, None], "S")]:
+            stored = storable(self._object_column(values))
+            self.assertEqual(stored[0].dtype.kind, kind, values)
+            self.assertEqual(stored[1].tolist(), [value is None for value in values])
+            self.assertEqual([value for value, masked in zip(stored[0].tolist(), stored[1]) if not masked],
+                             [value for value in values if value is not None])
+
+    def test_unstorable_columns(self):
+        for values in [[1, "a"], [1, 2.5], ["a\x00"], [2 ** 63], [u"a", "b"], [True]]:
+            self.assertIsNone(storable(self._object_column(values)), values)
+        self.assertIsNone(storable(np.ma.masked_array(np.array(["2020-01-01"], dtype="M8[D]"))))
+
+    def test_fixed_width_columns_are_kept(self):
+        values, mask = storable(np.ma.masked_array([1.0, 2.0], mask=[False, True]))
+        self.assertEqual(values.tolist(), [1.0, 2.0])
+        self.assertEqual(mask.tolist(), [False, True])
+
+
+class ColumnCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        backends.set_backend("geopackage")
+        self.mdb = os.path.join(self.folder, "a.gpkg")
+        self.parcel = os.path.join(self.mdb, "Parcel")
+        self._write([[1, 3, u"5554001", u"yes"], [2, None, u"5554001", None], [None, 3, None, u"क"]])
+        self.read_source = utils._read_source_columns
+        self.source_reads = 0
+
+        def counting_read_source(full_path, fields):
+            self.source_reads += 1
+            return self.read_source(full_path, fields)
+        utils._read_source_columns = counting_read_source
+
+    def tearDown(self):
+        utils._read_source_columns = self.read_source
+        close_column_cache()
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def _write(self, rows, mtime=None):
+        fields = [("PARCELNO", "INTEGER"), ("WARDNO", "INTEGER"), ("GRIDS1", "TEXT"), ("suspicious", "TEXT")]
+        write_geopackage(self.mdb, {"Parcel": ("Polygon", fields,
+                                               [(values, square(i, i + 1.0)) for i, values in enumerate(rows)])})
+        if mtime is not None:
+            os.utime(self.mdb, (mtime, mtime))
+
+    def _entries(self):
+        """{(state, feature class) directories under the MDB's cache directory: files}"""
+        mdb_dir, entry_dir = ColumnCache(self.folder)._entry_dir(self.mdb, "Parcel")
+        entries = {}
+        for root, dirs, files in os.walk(mdb_dir):
+            if files:
+                entries[os.path.relpath(root, mdb_dir)] = sorted(files)
+        return entries
+
+    def _assert_same_columns(self, cached, uncached):
+        self.assertEqual(len(cached), len(uncached))
+        for cached_column, column in zip(cached, uncached):
+            self.assertEqual(cached_column.tolist(), column.tolist())
+            self.assertEqual(np.ma.getmaskarray(cached_column).tolist(), np.ma.getmaskarray(column).tolist())
+
+    def test_masked_round_trip(self):
+        uncached = utils.read_columns(self.parcel, FIELDS)
+        self.assertEqual(uncached[0].tolist(), [1, 2, None])
+        self.assertEqual(uncached[3].tolist(), ["yes", None, u"क".encode('utf-8')])
+
+        open_column_cache(self.folder)
+        self._assert_same_columns(utils.read_columns(self.parcel, FIELDS), uncached)
+        # The other columns come from the files, not the GeoPackage
+        reads = self.source_reads
+        self._assert_same_columns(utils.read_columns(self.parcel, ["suspicious", "PARCELNO"]),
+                                  [uncached[3], uncached[0]])
+        self.assertEqual(self.source_reads, reads)
+        # Same in a later run
+        close_column_cache()
+        open_column_cache(self.folder)
+        self._assert_same_columns(utils.read_columns(self.parcel, FIELDS), uncached)
+        self.assertEqual(self.source_reads, reads)
+
+    def test_other_fields_are_read_from_the_mdb(self):
+        open_column_cache(self.folder)
+        self.assertEqual(utils.read_columns(self.parcel, ["PARCELNO", "Shape_Length"])[0].tolist(), [1, 2, None])
+        self.assertEqual(self._entries(), {})
+
+    def test_changed_mdb_replaces_its_entry(self):
+        open_column_cache(self.folder)
+        utils.read_columns(self.parcel, FIELDS)
+        before = self._entries()
+        self.assertEqual(len(before), 1)
+        self.assertIn(INDEX_NAME, list(before.values())[0])
+
+        # Other mtime
+        self._write([[1, 3, u"5554001", u"yes"], [2, None, u"5554001", None], [7, 3, None, u"क"]],
+                     mtime=os.stat(self.mdb).st_mtime + 10)
+        self.assertEqual(utils.read_columns(self.parcel, ["PARCELNO"])[0].tolist(), [1, 2, 7])
+        after = self._entries()
+        self.assertEqual(len(after), 1)
+        self.assertNotEqual(sorted(after), sorted(before))
+
+        # Other size, same mtime (enough rows for more pages)
+        mtime = os.stat(self.mdb).st_mtime
+        size = os.stat(self.mdb).st_size
+        self._write([[number, 3, u"5554001", None] for number in range(500)], mtime=mtime)
+        self.assertNotEqual(os.stat(self.mdb).st_size, size)
+        self.assertEqual(utils.read_columns(self.parcel, ["PARCELNO"])[0].tolist(), range(500))
+        self.assertEqual(len(self._entries()), 1)
+        self.assertNotEqual(sorted(self._entries()), sorted(after))
+        self.assertEqual(self.source_reads, 3)
+
+    def test_index_is_written_last(self):
+        open_column_cache(self.folder)
+        save = ColumnCache._save
+        saved = []
+
+        def failing_save(cache, path, array):
+            if len(saved) == 3:
+                raise IOError("disk full")
+            saved.append(path)
+            save(cache, path, array)
+        ColumnCache._save = failing_save
+        try:
+            # An extraction that fails half way falls back to the MDB and leaves no index
+            self.assertEqual(utils.read_columns(self.parcel, ["PARCELNO"])[0].tolist(), [1, 2, None])
+        finally:
+            ColumnCache._save = save
+        entries = self._entries()
+        self.assertEqual(len(entries), 1)
+        self.assertNotIn(INDEX_NAME, list(entries.values())[0])
+
+        # The next read does the extraction again
+        self.assertEqual(utils.read_columns(self.parcel, ["PARCELNO"])[0].tolist(), [1, 2, None])
+        self.assertIn(INDEX_NAME, list(self._entries().values())[0])
+        reads = self.source_reads
+        utils.read_columns(self.parcel, ["PARCELNO"])
+        self.assertEqual(self.source_reads, reads)
+
+    def test_unreadable_index_is_extracted_again(self):
+        open_column_cache(self.folder)
+        utils.read_columns(self.parcel, FIELDS)
+        mdb_dir, entry_dir = column_cache.active_column_cache()._entry_dir(self.mdb, "Parcel")
+        with open(os.path.join(entry_dir, INDEX_NAME), 'w') as f:
+            f.write('{"rows": 3, "colu')
+        self.assertEqual(utils.read_columns(self.parcel, ["WARDNO"])[0].tolist(), [3, None, 3])
+        self.assertEqual(self.source_reads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
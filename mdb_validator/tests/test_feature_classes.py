@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from mdb_validator import backends, catalog
+from mdb_validator.utils import get_feature_classes
+from mdb_validator.topology_check import ParcelOverlapValidator
+
+
+def _entry(mdb_path, name, dataset=""):
+    return {
+        "name": name,
+        "dataset": dataset,
+        "path": os.path.join(mdb_path, dataset, name) if dataset else os.path.join(mdb_path, name),
+        "shape_type": "Polygon",
+        "extent": [0.0, 0.0, 1.0, 1.0],
+        "fields": [["OBJECTID", "OID"]],
+        "row_count": 1,
+    }
+
+
+class FakeBackend(object):
+    """An MDB with root feature classes next to feature datasets, as a kept topology leaves it"""
+    name = "fake"
+    file_extensions = (".mdb",)
+    supports_geoprocessing = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def list_feature_classes(self, mdb_path):
+        self.calls += 1
+        return [_entry(mdb_path, "Parcel"), _entry(mdb_path, "Construction"),
+                _entry(mdb_path, "Parcel1", "Cadastre"), _entry(mdb_path, "Parcel", "Survey")]
+
+
+class FakeArcpy(object):
+    """The arcpy calls ArcpyBackend.list_feature_classes makes, over {dataset: [feature class]}"""
+
+    class env(object):
+        workspace = None
+
+    class _Extent(object):
+        XMin, YMin, XMax, YMax = 0.0, 0.0, 1.0, 1.0
+
+    class _Describe(object):
+        shapeType = "Polygon"
+
+    def __init__(self, mdb_path, layout):
+        self.mdb_path = mdb_path
+        self.layout = layout
+        self.env.workspace = None
+
+    def ListDatasets(self):
+        return [dataset for dataset in sorted(self.layout) if dataset] or None
+
+    def ListFeatureClasses(self):
+        dataset = os.path.relpath(self.env.workspace, self.mdb_path)
+        return list(self.layout.get("" if dataset == os.curdir else dataset, []))
+
+    def Describe(self, full_path):
+        describe = self._Describe()
+        describe.extent = self._Extent()
+        return describe
+
+    def ListFields(self, full_path):
+        return []
+
+    def GetCount_management(self, full_path):
+        return ["1"]
+
+
+class ArcpyListingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.arcpy = backends.arcpy
+
+    def tearDown(self):
+        backends.arcpy = self.arcpy
+
+    def test_root_is_listed_next_to_datasets(self):
+        mdb_path = os.path.join(tempfile.gettempdir(), "ward.mdb")
+        backends.arcpy = FakeArcpy(mdb_path, {"": ["Parcel"], "Cadastre": ["Parcel1"]})
+        entries = backends.ArcpyBackend().list_feature_classes(mdb_path)
+        self.assertEqual([(entry["dataset"], entry["name"]) for entry in entries],
+                         [("", "Parcel"), ("Cadastre", "Parcel1")])
+        self.assertEqual(entries[1]["path"], os.path.join(mdb_path, "Cadastre", "Parcel1"))
+
+    def test_root_only(self):
+        mdb_path = os.path.join(tempfile.gettempdir(), "ward.mdb")
+        backends.arcpy = FakeArcpy(mdb_path, {"": ["Parcel", "Segments"]})
+        entries = backends.ArcpyBackend().list_feature_classes(mdb_path)
+        self.assertEqual([(entry["dataset"], entry["name"]) for entry in entries],
+                         [("", "Parcel"), ("", "Segments")])
+
+
+class FeatureClassesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.mdb = os.path.join(self.folder, "ward.mdb")
+        open(self.mdb, 'wb').close()
+        self.backend = FakeBackend()
+        self.previous_backend = backends._active_backend
+        backends._backends["fake"] = self.backend
+        backends._active_backend = self.backend
+
+    def tearDown(self):
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        del backends._backends["fake"]
+        shutil.rmtree(self.folder)
+
+    def test_datasets_hide_the_root(self):
+        # As the baseline ListDatasets() or [""]: only the feature datasets are read
+        expected = [("Parcel", os.path.join(self.mdb, "Survey", "Parcel"))]
+        self.assertEqual(get_feature_classes(self.mdb, ["Parcel"]), expected)
+        catalog.open_catalog(self.folder)
+        self.assertEqual(get_feature_classes(self.mdb, ["Parcel"]), expected)
+
+    def test_topology_sees_the_root_parcel_with_the_catalog(self):
+        validator = ParcelOverlapValidator()
+        catalog.open_catalog(self.folder)
+        self.assertEqual(validator._get_feature_classes(self.mdb), ["Parcel", "Construction"])
+        # Same from the stored catalog in a later run
+        catalog.close_catalog()
+        catalog.open_catalog(self.folder)
+        self.assertEqual(validator._get_feature_classes(self.mdb), ["Parcel", "Construction"])
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_older_catalogs_are_emptied(self):
+        catalog.open_catalog(self.folder).describe_mdb(self.mdb)
+        catalog.active_catalog().connection.execute("PRAGMA user_version = 1")
+        catalog.active_catalog().connection.commit()
+        catalog.close_catalog()
+
+        catalog.open_catalog(self.folder).describe_mdb(self.mdb)
+        self.assertEqual(self.backend.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+from mdb_validator.geometry import Geometry, fingerprint
+
+TOLERANCE = 0.001
+
+
+def polygon(*parts):
+    """Polygon Geometry from parts given as lists of rings of (x, y)"""
+    return Geometry("Polygon", [[np.array(ring, dtype=float) for ring in part] for part in parts])
+
+
+def polyline(*paths):
+    return Geometry("Polyline", [np.array(path, dtype=float) for path in paths])
+
+
+SQUARE = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+HOLE = [(2, 2), (4, 2), (4, 4), (2, 4), (2, 2)]
+
+
+def shifted(ring, dx, dy):
+    return [(x + dx, y + dy) for x, y in ring]
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def assertSame(self, first, second):
+        self.assertEqual(fingerprint(first, TOLERANCE), fingerprint(second, TOLERANCE))
+
+    def assertDifferent(self, first, second):
+        self.assertNotEqual(fingerprint(first, TOLERANCE), fingerprint(second, TOLERANCE))
+
+    def test_ring_start_vertex_and_direction(self):
+        other_start = [(10, 10), (0, 10), (0, 0), (10, 0), (10, 10)]
+        reversed_ring = SQUARE[::-1]
+        reversed_other_start = other_start[::-1]
+        for ring in (other_start, reversed_ring, reversed_other_start):
+            self.assertSame(polygon([SQUARE]), polygon([ring]))
+
+    def test_open_rings_and_repeated_vertices(self):
+        self.assertSame(polygon([SQUARE]), polygon([SQUARE[:-1]]))
+        self.assertSame(polygon([SQUARE]), polygon([[(0, 0), (10, 0), (10, 0), (10, 10), (0, 10), (0, 0)]]))
+
+    def test_path_direction_and_part_order(self):
+        self.assertSame(polyline([(0, 0), (5, 0), (5, 5)]), polyline([(5, 5), (5, 0), (0, 0)]))
+        far = shifted(SQUARE, 100, 0)
+        self.assertSame(polygon([SQUARE], [far]), polygon([far], [SQUARE[::-1]]))
+        self.assertSame(polygon([SQUARE, HOLE]), polygon([SQUARE, HOLE[::-1]]))
+
+    def test_within_tolerance(self):
+        # Every vertex moved less than the tolerance, none across a grid line
+        self.assertSame(polygon([SQUARE]), polygon([shifted(SQUARE, 0.0003, -0.0004)]))
+        self.assertSame(polyline([(0.0001, 0), (5, 0)]), polyline([(-0.0002, 0.0001), (5.0004, 0)]))
+
+    def test_across_a_grid_line(self):
+        # 0.0002 apart, but rounding to 0.000 and 0.001
+        self.assertDifferent(polygon([shifted(SQUARE, 0.0004, 0)]), polygon([shifted(SQUARE, 0.0006, 0)]))
+        self.assertSame(polygon([shifted(SQUARE, 0.0006, 0)]), polygon([shifted(SQUARE, 0.0014, 0)]))
+
+    def test_different_geometries(self):
+        self.assertDifferent(polygon([SQUARE]), polygon([shifted(SQUARE, 0.002, 0)]))
+        self.assertDifferent(polygon([SQUARE]), polygon([SQUARE, HOLE]))
+        self.assertDifferent(polygon([SQUARE]), polyline(SQUARE))
+        # A path is not a ring: its start and end count
+        self.assertDifferent(polyline([(0, 0), (5, 0), (5, 5)]), polyline([(5, 0), (5, 5), (0, 0)]))
+
+    def test_holes_and_outer_rings_are_not_told_apart(self):
+        # Documented: the rings of a polygon are sorted together
+        self.assertSame(polygon([SQUARE, HOLE]), polygon([SQUARE], [HOLE]))
+
+
+if __name__ == '__main__':
+    unittest.main()
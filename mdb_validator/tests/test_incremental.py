@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import glob
+import shutil
+import tempfile
+import unittest
+from mdb_validator import backends, catalog, incremental
+from mdb_validator.benchmark import generate_dataset
+from mdb_validator.incremental import (RESULTS_DIR_NAME, MANIFEST_NAME, IncrementalValidationRunner, mdb_key,
+                                       validator_key)
+from mdb_validator.invalid_sheet import InvalidSheetValidator
+from mdb_validator.jobs import create_validators, configure_validator
+
+VALIDATOR_KEYS = ["invalid_sheet", "invalid_ward", "small_areas", "segment_counts"]
+
+
+class ValidatorKeyTest(unittest.TestCase):
+
+    def _key(self, **settings):
+        validator = InvalidSheetValidator()
+        validator.__dict__.update(settings)
+        return validator_key(validator)
+
+    def test_settings_change_the_key(self):
+        self.assertNotEqual(self._key(scale="500"), self._key(scale="600"))
+        # From the Tk GUI the settings are unicode
+        self.assertNotEqual(self._key(scale="500"), self._key(scale=u"600"))
+        self.assertNotEqual(self._key(scale=u"500"), self._key(scale=u"600"))
+        self.assertNotEqual(self._key(folder_path=u"C:\\वार्ड 1"), self._key(folder_path=u"C:\\वार्ड 2"))
+
+    def test_same_settings_give_the_same_key(self):
+        self.assertEqual(self._key(scale="500"), self._key(scale=u"500"))
+        self.assertEqual(self._key(folder_path=u"C:\\वार्ड"), self._key(folder_path=u"C:\\वार्ड".encode('utf-8')))
+        # Private state is not a setting
+        self.assertEqual(self._key(scale="500"), self._key(scale="500", _scale_value="5554"))
+
+
+class IncrementalRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        backends.set_backend("geopackage")
+        generate_dataset(self.folder, mdbs=3, rows=4, cols=4, seed=5)
+        self.mdbs = sorted(glob.glob(os.path.join(self.folder, "*.gpkg")))
+        self.validate_files = incremental.validate_files
+        self.tasks = []
+
+        def recording_validate_files(validators, tasks, *args):
+            self.tasks.extend(tasks)
+            return self.validate_files(validators, tasks, *args)
+        incremental.validate_files = recording_validate_files
+
+    def tearDown(self):
+        incremental.validate_files = self.validate_files
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def _run(self, scale=u"500"):
+        validators = [validator for name, validator in create_validators(VALIDATOR_KEYS)]
+        for validator in validators:
+            configure_validator(validator, self.folder, scale=scale)
+        runner = IncrementalValidationRunner(validators)
+        runner.set_folder_path(self.folder)
+        del self.tasks[:]
+        runner.run_validation()
+        self.assertEqual(runner.failures, [])
+        return validators
+
+    def _manifest(self):
+        with open(os.path.join(self.folder, RESULTS_DIR_NAME, MANIFEST_NAME)) as f:
+            return json.load(f)
+
+    def _validated(self):
+        return [(os.path.basename(mdb), stale) for mdb_index, mdb, stale in self.tasks]
+
+    def test_changed_setting_reruns_its_validator(self):
+        self._run()
+        self.assertEqual(self._validated(), [(os.path.basename(mdb), [0, 1, 2, 3]) for mdb in self.mdbs])
+        self._run()
+        self.assertEqual(self.tasks, [])
+
+        # Only the invalid sheet check depends on the scale; every MDB is checked again
+        validators = self._run(scale=u"600")
+        self.assertEqual(self._validated(), [(os.path.basename(mdb), [0]) for mdb in self.mdbs])
+        self.assertIn(validator_key(validators[0]), self._manifest()["validators"])
+        with open(os.path.join(self.folder, validators[0].report_name)) as f:
+            rows_600 = f.read()
+
+        # The same scale as unicode or str reuses the results
+        self._run(scale="600")
+        self.assertEqual(self.tasks, [])
+        with open(os.path.join(self.folder, validators[0].report_name)) as f:
+            self.assertEqual(f.read(), rows_600)
+        self._run(scale="500")
+        self.assertEqual(self.tasks, [])
+
+    def test_deleted_mdb_is_dropped(self):
+        validators = self._run()
+        deleted = self.mdbs[1]
+        os.remove(deleted)
+        self._run()
+        self.assertEqual(self.tasks, [])
+
+        manifest = self._manifest()
+        self.assertEqual(sorted(manifest["files"]), sorted(mdb_key(mdb) for mdb in self.mdbs if mdb != deleted))
+        for key in [validator_key(validator) for validator in validators]:
+            self.assertNotIn(mdb_key(deleted), manifest["validators"][key])
+            self.assertFalse(os.path.exists(os.path.join(self.folder, RESULTS_DIR_NAME, key,
+                                                         mdb_key(deleted) + ".csv")))
+        for validator in validators:
+            if validator.report_name:
+                with open(os.path.join(self.folder, validator.report_name)) as f:
+                    self.assertNotIn(os.path.basename(deleted), f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
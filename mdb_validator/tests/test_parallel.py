@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from mdb_validator import parallel
+from mdb_validator.parallel import validate_files
+
+DIED = "Worker process died while validating this MDB"
+
+
+class DyingValidator(object):
+    """Takes its worker process down on the MDBs named bad*, as a crashing driver would"""
+    report_name = None
+
+    def validate_mdb(self, mdb, writer=None):
+        if mdb.startswith("bad"):
+            os._exit(1)
+        return mdb.upper()
+
+
+class DeadWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.partial_dir = tempfile.mkdtemp()
+        self.poll_interval = parallel.POLL_INTERVAL
+        parallel.POLL_INTERVAL = 0.1
+
+    def tearDown(self):
+        parallel.POLL_INTERVAL = self.poll_interval
+        shutil.rmtree(self.partial_dir)
+
+    def test_dead_worker_fails_only_its_mdb(self):
+        mdbs = ["a", "bad1", "c", "d", "bad2", "f"]
+        tasks = [(mdb_index, mdb, None) for mdb_index, mdb in enumerate(mdbs)]
+        reported = []
+
+        def progress(done, total, mdb_index, mdb_results, mdb_errors):
+            reported.append((done, total, mdb_index))
+
+        results, errors = validate_files([DyingValidator(), DyingValidator()], tasks, self.partial_dir, 2, progress)
+
+        self.assertEqual(errors, dict(((validator_index, mdb_index), DIED)
+                                      for validator_index in (0, 1) for mdb_index in (1, 4)))
+        self.assertEqual(results, dict(((validator_index, mdb_index), mdbs[mdb_index].upper())
+                                       for validator_index in (0, 1) for mdb_index in (0, 2, 3, 5)))
+        # Every MDB is reported once, the lost ones included
+        self.assertEqual([done for done, total, mdb_index in reported], range(1, len(mdbs) + 1))
+        self.assertEqual(sorted(mdb_index for done, total, mdb_index in reported), range(len(mdbs)))
+
+    def test_in_process_run(self):
+        tasks = [(0, "a", None), (1, "b", [1])]
+        results, errors = validate_files([DyingValidator(), DyingValidator()], tasks, self.partial_dir)
+        self.assertEqual(results, {(0, 0): "A", (1, 0): "A", (1, 1): "B"})
+        self.assertEqual(errors, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
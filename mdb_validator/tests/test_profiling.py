@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from mdb_validator import backends, catalog, cli
+from mdb_validator.benchmark import generate_dataset
+from mdb_validator.profiling import PROFILE_NAME
+
+# The validators reading through read_columns, iter_batches and their own cursors
+VALIDATOR_KEYS = ["duplicate_const_and_segments", "small_areas", "segment_counts"]
+
+
+class RunProfileRowsTest(unittest.TestCase):
+    """run_profile.json counts the rows every validator and MDB scanned"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        self.dataset = generate_dataset(self.folder, mdbs=2, rows=4, cols=4, seed=3)
+
+    def tearDown(self):
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def _profile(self, *options):
+        argv = [self.folder, "--validators", ",".join(VALIDATOR_KEYS), "--backend", "geopackage",
+                "--scale", "500", "--profile", "--log-level", "ERROR"] + list(options)
+        self.assertEqual(cli.main(argv), cli.EXIT_OK)
+        with open(os.path.join(self.folder, PROFILE_NAME)) as f:
+            return json.load(f)
+
+    def _assert_rows(self, profile, validator_count):
+        self.assertEqual(len(profile["validators"]), validator_count)
+        for validator in profile["validators"]:
+            self.assertEqual(len(validator["mdbs"]), self.dataset["mdbs"], validator["name"])
+            for record in validator["mdbs"]:
+                self.assertGreater(record["rows"], 0, "{} {}".format(validator["name"], record["mdb"]))
+            self.assertEqual(validator["rows"], sum(record["rows"] for record in validator["mdbs"]))
+        self.assertEqual(profile["rows"], sum(validator["rows"] for validator in profile["validators"]))
+
+    def test_rows_per_validator_and_mdb(self):
+        profile = self._profile()
+        self._assert_rows(profile, len(VALIDATOR_KEYS))
+        rows = dict((validator["name"], validator["rows"]) for validator in profile["validators"])
+        # Segment Counts reads every Segments row once
+        self.assertEqual(rows["Segment Counts"], self.dataset["features"]["Segments"])
+
+    def test_rows_from_worker_processes(self):
+        # One parallel job; rows scanned in the workers are passed back with the results
+        self._assert_rows(self._profile("--workers", "2"), 1)
+
+    def test_rows_with_the_column_cache(self):
+        # A second run served from the column cache still counts its rows
+        first = self._profile()
+        self.assertEqual(self._profile()["rows"], first["rows"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import math
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from mdb_validator import backends, catalog
+from mdb_validator.benchmark import write_geopackage
+from mdb_validator.geometry import Geometry
+from mdb_validator.slivers import (DEFAULT_THRESHOLDS, parse_thresholds, format_thresholds, measure, shape_measures,
+                                   failed_tests, find_slivers)
+
+
+def polygon(*rings):
+    return [np.array(ring, dtype=float).reshape(-1, 2) for ring in rings]
+
+
+def rectangle(x, y, width, height, closed=True):
+    ring = [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+    return ring + ring[:1] if closed else ring
+
+
+SQUARE_WITH_HOLE = Geometry("Polygon", [polygon(rectangle(0, 0, 10, 10), rectangle(2, 2, 2, 2, closed=False))])
+STRIP = Geometry("Polygon", [polygon(rectangle(0, 0, 20, 0.3))])
+
+
+class MeasureTest(unittest.TestCase):
+
+    def test_holes_are_subtracted_and_counted_in_the_perimeter(self):
+        areas, perimeters = measure([SQUARE_WITH_HOLE])
+        self.assertAlmostEqual(areas[0], 96.0)
+        self.assertAlmostEqual(perimeters[0], 48.0)
+
+    def test_every_feature_gets_its_own_rings(self):
+        multipart = Geometry("Polygon", [polygon(rectangle(0, 0, 1, 1)), polygon(rectangle(5, 5, 2, 3))])
+        line = Geometry("Polyline", [np.array([(0.0, 0.0), (5.0, 0.0)])])
+        geometries = [STRIP, None, multipart, Geometry("Polygon", []), line,
+                      Geometry("Polygon", [polygon([])]), SQUARE_WITH_HOLE]
+        areas, perimeters = measure(geometries)
+        np.testing.assert_allclose(areas, [6.0, 0, 7.0, 0, 0, 0, 96.0])
+        np.testing.assert_allclose(perimeters, [40.6, 0, 14.0, 0, 0, 0, 48.0])
+        # Same as the per-geometry properties
+        for geometry, area, perimeter in zip(geometries, areas, perimeters):
+            if geometry is not None and geometry.shape_type == "Polygon":
+                self.assertAlmostEqual(area, geometry.area)
+                self.assertAlmostEqual(perimeter, geometry.length)
+
+    def test_last_ring_is_measured(self):
+        # The ring sums rely on a padding slot after the last ring
+        areas, perimeters = measure([STRIP, SQUARE_WITH_HOLE, STRIP])
+        np.testing.assert_allclose(areas, [6.0, 96.0, 6.0])
+        np.testing.assert_allclose(perimeters, [40.6, 48.0, 40.6])
+
+    def test_nothing_to_measure(self):
+        areas, perimeters = measure([None, Geometry("Polygon", [])])
+        self.assertEqual(areas.tolist(), [0.0, 0.0])
+        self.assertEqual(perimeters.tolist(), [0.0, 0.0])
+        self.assertEqual(len(measure([])[0]), 0)
+
+
+class ShapeMeasuresTest(unittest.TestCase):
+
+    def test_rectangle_width_is_exact(self):
+        thinness, min_width = shape_measures(np.array([6.0, 50.0]), np.array([40.6, 30.0]))
+        self.assertAlmostEqual(min_width[0], 0.3)
+        self.assertAlmostEqual(min_width[1], 5.0)
+        self.assertAlmostEqual(thinness[0], 4 * math.pi * 6.0 / 40.6 ** 2)
+
+    def test_compact_shapes(self):
+        # A square is as compact as the formula allows; rounder shapes get the square's side
+        circle_area = math.pi
+        thinness, min_width = shape_measures(np.array([100.0, circle_area]), np.array([40.0, 2 * math.pi]))
+        self.assertAlmostEqual(min_width[0], 10.0)
+        self.assertAlmostEqual(thinness[0], math.pi / 4)
+        self.assertAlmostEqual(thinness[1], 1.0)
+        self.assertAlmostEqual(min_width[1], math.pi / 2)
+
+    def test_empty_geometry(self):
+        thinness, min_width = shape_measures(np.array([0.0]), np.array([0.0]))
+        self.assertEqual(thinness.tolist(), [0.0])
+        self.assertEqual(min_width.tolist(), [0.0])
+
+    def test_failed_tests(self):
+        areas, perimeters = measure([STRIP, SQUARE_WITH_HOLE])
+        thinness, min_width = shape_measures(areas, perimeters)
+        failed = failed_tests({"min_area": 10.0, "min_thinness": 0.0, "min_width": 0.5}, areas, thinness, min_width)
+        # A threshold of 0 is no test
+        self.assertEqual(sorted(failed), ["min_area", "min_width"])
+        self.assertEqual(failed["min_area"].tolist(), [True, False])
+        self.assertEqual(failed["min_width"].tolist(), [True, False])
+
+
+class ThresholdsTest(unittest.TestCase):
+
+    def test_text_over_the_defaults(self):
+        thresholds = parse_thresholds("Parcel:min_area=2, min_width=0.25; Plot:min_thinness=0.1")
+        self.assertEqual(thresholds["Parcel"], {"min_area": 2.0, "min_thinness": 0.05, "min_width": 0.25})
+        self.assertEqual(thresholds["Construction"], DEFAULT_THRESHOLDS["Construction"])
+        # Classes not in the defaults test only what is given
+        self.assertEqual(thresholds["Plot"], {"min_area": 0.0, "min_thinness": 0.1, "min_width": 0.0})
+        self.assertEqual(parse_thresholds(""), DEFAULT_THRESHOLDS)
+
+    def test_mapping_and_round_trip(self):
+        thresholds = parse_thresholds({"Construction": {"min_area": "1.5"}})
+        self.assertEqual(thresholds["Construction"]["min_area"], 1.5)
+        self.assertEqual(parse_thresholds(format_thresholds(thresholds)), thresholds)
+        # The defaults are not changed by parsing
+        self.assertEqual(DEFAULT_THRESHOLDS["Construction"]["min_area"], 5.0)
+
+    def test_errors(self):
+        for spec, message in [("Parcel", "Expected <feature class>"),
+                              ("Parcel:min_area", "Expected <name>=<value>"),
+                              ("Parcel:max_area=5", "Unknown threshold max_area"),
+                              ("Parcel:min_area=small", "Invalid value for Parcel.min_area"),
+                              ("Parcel:min_width=-1", "Negative value for Parcel.min_width"),
+                              ({"Parcel": {"min_area": None}}, "Invalid value for Parcel.min_area")]:
+            with self.assertRaises(ValueError) as context:
+                parse_thresholds(spec)
+            self.assertIn(message, str(context.exception))
+            self.assertTrue(str(context.exception).startswith("[slivers] "))
+
+
+class FindSliversTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        backends.set_backend("geopackage")
+
+    def tearDown(self):
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def test_batches_from_a_geopackage(self):
+        path = os.path.join(self.folder, "a.gpkg")
+        rows = [([1], rectangle(0, 0, 10, 10)), ([2], rectangle(20, 0, 20, 0.3)), ([3], rectangle(50, 0, 2, 2)),
+                ([4], rectangle(60, 0, 10, 10)), ([5], rectangle(80, 0, 30, 0.4))]
+        write_geopackage(path, {"Parcel": ("Polygon", [("PARCELNO", "INTEGER")], rows)})
+
+        limits = DEFAULT_THRESHOLDS["Parcel"]
+        # Batches of 2 put the last sliver alone in the last batch
+        found = list(find_slivers(os.path.join(path, "Parcel"), limits, ["PARCELNO"], batch_size=2))
+        self.assertEqual([(row, reasons) for row, area, perimeter, thinness, min_width, reasons in found],
+                         [((2,), ["thin", "narrow"]), ((3,), ["area"]), ((5,), ["thin", "narrow"])])
+        self.assertAlmostEqual(found[0][1], 6.0)
+        self.assertAlmostEqual(found[0][2], 40.6)
+        self.assertAlmostEqual(found[0][4], 0.3)
+        self.assertEqual(found, list(find_slivers(os.path.join(path, "Parcel"), limits, ["PARCELNO"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
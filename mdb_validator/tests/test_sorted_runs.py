@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+from mdb_validator import sorted_runs, backends, catalog
+from mdb_validator.sorted_runs import key_text, write_run, merged_groups, prune_runs
+from mdb_validator.benchmark import write_geopackage
+from mdb_validator.cross_mdb_duplicates import CrossMDBDuplicatesValidator
+
+
+class KeyTextTest(unittest.TestCase):
+
+    def test_numbers_and_text_give_the_same_key(self):
+        self.assertEqual(key_text(12), "12")
+        self.assertEqual(key_text(12.0), "12")
+        self.assertEqual(key_text(12L), "12")
+        self.assertEqual(key_text("12"), "12")
+        self.assertEqual(key_text(u"12"), "12")
+
+    def test_other_values(self):
+        self.assertEqual(key_text(None), "")
+        self.assertEqual(key_text(12.5), "12.5")
+        self.assertEqual(key_text(u"क"), u"क".encode('utf-8'))
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.runs_dir = os.path.join(self.folder, "runs")
+        self.temp_dir = os.path.join(self.folder, "temp")
+        os.makedirs(self.runs_dir)
+        os.makedirs(self.temp_dir)
+        self.fan_in = sorted_runs.MERGE_FAN_IN
+
+    def tearDown(self):
+        sorted_runs.MERGE_FAN_IN = self.fan_in
+        shutil.rmtree(self.folder)
+
+    def _runs(self, counts_per_mdb):
+        paths = []
+        for mdb_index, counts in enumerate(counts_per_mdb):
+            path = os.path.join(self.runs_dir, "{:03d}.csv".format(mdb_index))
+            write_run(path, dict(((key_text(ward), key_text(sheet), key_text(number)), count)
+                                 for (ward, sheet, number), count in counts.items()))
+            paths.append(path)
+        return paths
+
+    def test_run_is_sorted(self):
+        path = self._runs([{(2, "5554001", 1): 1, (1, "5554001", 3): 2, (1, "5554001", 10): 1}])[0]
+        with open(path, 'rb') as f:
+            self.assertEqual(list(csv.reader(f)), [["1", "5554001", "10", "1"], ["1", "5554001", "3", "2"],
+                                                   ["2", "5554001", "1", "1"]])
+
+    def test_groups_give_frequency_and_mdbs(self):
+        paths = self._runs([
+            {(1, "5554001", 1): 2, (1, "5554001", 2): 1},
+            {(1, "5554001", 1): 1, (1, "5554001", 3): 1},
+            {(1.0, u"5554001", "1"): 1, (1, "5554001", 2): 1},
+        ])
+        self.assertEqual(list(merged_groups(paths, self.temp_dir)), [
+            (("1", "5554001", "1"), 4, [0, 1, 2]),
+            (("1", "5554001", "2"), 2, [0, 2]),
+            (("1", "5554001", "3"), 1, [1]),
+        ])
+
+    def test_merge_in_rounds_past_the_fan_in(self):
+        counts = [dict(((1, "5554001", number), 1) for number in range(mdb_index % 5, 40, 3))
+                  for mdb_index in range(11)]
+        paths = self._runs(counts)
+        expected = list(merged_groups(paths, self.temp_dir))
+
+        # 11 runs, 3 at a time: two rounds of intermediate runs before the final merge
+        sorted_runs.MERGE_FAN_IN = 3
+        self.assertEqual(list(merged_groups(paths, self.temp_dir)), expected)
+        self.assertEqual(sorted(name[:3] for name in os.listdir(self.temp_dir)), ["001"] * 4 + ["002"] * 2)
+
+        for key, frequency, mdb_indexes in expected:
+            holders = [mdb_index for mdb_index, mdb_counts in enumerate(counts)
+                       if (1, "5554001", int(key[2])) in mdb_counts]
+            self.assertEqual(mdb_indexes, holders)
+            self.assertEqual(frequency, len(holders))
+        self.assertEqual([key for key, frequency, mdb_indexes in expected], sorted(set(
+            ("1", "5554001", str(number)) for mdb_counts in counts for ward, sheet, number in mdb_counts)))
+
+    def test_single_round_leaves_no_intermediate_runs(self):
+        paths = self._runs([{(1, "5554001", 1): 1}, {(1, "5554001", 1): 1}])
+        sorted_runs.MERGE_FAN_IN = 2
+        self.assertEqual(list(merged_groups(paths, self.temp_dir)), [(("1", "5554001", "1"), 2, [0, 1])])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_prune_runs(self):
+        paths = self._runs([{(1, "5554001", 1): 1}, {(1, "5554001", 2): 1}, {(1, "5554001", 3): 1}])
+        # Paths are compared normalised, as finish_validation may spell them differently
+        prune_runs(self.runs_dir, [paths[0], os.path.join(self.runs_dir, os.curdir, "002.csv")])
+        self.assertEqual(sorted(os.listdir(self.runs_dir)), ["000.csv", "002.csv"])
+
+
+class CrossMDBDuplicatesTest(unittest.TestCase):
+    """The whole validator on GeoPackages, one storing PARCELNO as a number and one as text"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.previous_backend = backends._active_backend
+        backends.set_backend("geopackage")
+
+    def tearDown(self):
+        catalog.close_catalog()
+        backends._active_backend = self.previous_backend
+        shutil.rmtree(self.folder)
+
+    def _write(self, name, parcel_type, keys):
+        fields = [("WARDNO", "INTEGER"), ("GRIDS1", "TEXT"), ("PARCELNO", parcel_type)]
+        rows = [(list(key), [(i, 0.0), (i + 1.0, 0.0), (i + 1.0, 1.0), (i, 1.0), (i, 0.0)])
+                for i, key in enumerate(keys)]
+        write_geopackage(os.path.join(self.folder, name), {"Parcel": ("Polygon", fields, rows)})
+
+    def test_keys_repeated_across_mdbs(self):
+        self._write("a.gpkg", "INTEGER", [(1, "5554001", 7), (1, "5554001", 8), (1, "5554001", 0)])
+        self._write("b.gpkg", "TEXT", [(1, "5554001", "7"), (1, "5554001", "9"), (1, "5554001", "0")])
+        self._write("c.gpkg", "INTEGER", [(1, "5554001", 9), (1, "5554001", 9)])
+
+        validator = CrossMDBDuplicatesValidator()
+        validator.set_folder_path(self.folder)
+        validator.run_validation()
+
+        with open(os.path.join(self.folder, validator.output_name), 'rb') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], validator.report_header)
+        sources = [os.path.join(self.folder, name) for name in ("a.gpkg", "b.gpkg", "c.gpkg")]
+        # PARCELNO 0 is left out like in the per-feature-class report
+        self.assertEqual(rows[1:], [
+            ["1", "5554001", "7", "2", "2", "; ".join(sources[:2])],
+            ["1", "5554001", "9", "3", "2", "; ".join(sources[1:])],
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
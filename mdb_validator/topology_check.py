@@ -1,14 +1,54 @@
 # -*- coding: utf-8 -*-
 import os
 import string
+import logging
+import tempfile
+import multiprocessing.util
 
-import arcpy
-import csv
+from backends import arcpy, require_geoprocessing
 import shutil
 from datetime import datetime
+from catalog import active_catalog
+from utils import find_mdb_files
+from topology_engine import parse_tolerance, load_parcels, find_overlaps, find_gaps, gap_neighbours
+from progress import mdb_progress, stage
+from reports import open_report, report_path
+from logs import get_logger
+
+log = get_logger("topology_check")
+
+# OIDs per query when reading the attributes of the parcels in overlaps
+OID_BATCH = 500
+
+# Parcel fields naming the parcels and wards around a gap
+PARCEL_NUMBER_FIELD = "PARCELNO"
+WARD_FIELD = "WARDNO"
+
+# Process id and temporary folder holding this process's snapshot geodatabases
+_scratch = [None, None]
+
+
+def _majority(values):
+    """Most frequent of values (the smallest on a tie), None when there are none"""
+    if not values:
+        return None
+    return max(sorted(set(values)), key=values.count)
+
+
+def _scratch_folder():
+    """Temporary folder of this process (each worker has its own), removed when the process exits"""
+    if _scratch[0] != os.getpid():
+        folder = tempfile.mkdtemp(prefix="mdb_validator_scratch_")
+        # A Finalize, unlike atexit, also runs when a pool worker process exits
+        multiprocessing.util.Finalize(None, shutil.rmtree, args=(folder, True), exitpriority=10)
+        _scratch[:] = [os.getpid(), folder]
+    return _scratch[1]
 
 
 class ParcelOverlapValidator(object):
+    # Reports are written per MDB into the Overlap_Reports folder
+    report_name = None
+
     def __init__(self):
         self.folder_path = ""
         self.status_var = None
@@ -17,56 +57,56 @@ class ParcelOverlapValidator(object):
         self.report_prefix = "Parcel_Overlap_Report"
         self.cluster_tolerance = "0.001 Meters"
         self.keep_topology = False  # Default to delete topology
-        print("[__init__] Initialized ParcelOverlapValidator")
+        self.in_memory = True  # Check geometries in memory instead of building a topology in the MDB
+        self.snapshot = True  # Build the geodatabase topology in a scratch copy, never in the MDB itself
+        self.min_gap_area = 0.0  # Smallest gap reported, in sq.m (0: anything above the cluster tolerance)
+        self.failures = []
+        log.debug("[__init__] Initialized ParcelOverlapValidator")
 
     def set_parameters(self, folder_path, parcel_layer_name="Parcel", output_folder=None):
         self.folder_path = folder_path
         self.parcel_layer_name = parcel_layer_name
         self.output_folder = output_folder if output_folder else os.path.join(folder_path, "Overlap_Reports")
-        print("[set_parameters] Parameters set: folder_path = {}, parcel_layer_name = {}, output_folder = {}".format(
-            folder_path, parcel_layer_name, self.output_folder))
+        log.debug("[set_parameters] Parameters set: folder_path = %s, parcel_layer_name = %s, output_folder = %s",
+                  folder_path, parcel_layer_name, self.output_folder)
 
     def set_status_var(self, status_var):
         self.status_var = status_var
-        print("[set_status_var] Status variable set.")
+        log.debug("[set_status_var] Status variable set.")
 
     def set_folder_path(self, folder_path):
         """For compatibility with existing framework"""
         self.set_parameters(folder_path)
-        print("[set_folder_path] Folder path set: {}".format(folder_path))
+        log.debug("[set_folder_path] Folder path set: %s", folder_path)
 
-    def _update_status(self, message):
+    def _update_status(self, message, level=logging.DEBUG):
+        """Show message in the status bar; it is logged at DEBUG unless a level is given"""
         if self.status_var:
             self.status_var.set(message)
-        print(message)
-
-    def _find_mdb_files(self):
-        mdb_files = []
-        for root, dirs, files in os.walk(self.folder_path):
-            for f in files:
-                if f.lower().endswith('.mdb'):
-                    mdb_files.append(os.path.join(root, f))
-        print("[_find_mdb_files] Found {} MDB files".format(len(mdb_files)))
-        return mdb_files
+        log.log(level, message)
 
     def _get_feature_classes(self, mdb_path):
+        catalog = active_catalog()
+        if catalog:
+            # Only stand-alone feature classes, as ListFeatureClasses on the MDB root returns
+            return [entry["name"] for entry in catalog.describe_mdb(mdb_path) if not entry["dataset"]]
         try:
             arcpy.env.workspace = mdb_path
             return arcpy.ListFeatureClasses()
         except:
-            print("[_get_feature_classes] Error getting feature classes from: {}".format(mdb_path))
+            log.error("[_get_feature_classes] Error getting feature classes from: %s", mdb_path)
             return []
 
-    def _prepare_feature_dataset(self, mdb_path):
-        """Prepare feature dataset and ensure parcel layer is in it"""
+    def _prepare_feature_dataset(self, mdb_path, workspace):
+        """Prepare the Cadastre feature dataset in workspace and copy the MDB's parcel layer into it"""
         try:
             # Create Cadastre dataset if it doesn't exist
-            cadastre_dataset = os.path.join(mdb_path, "Cadastre")
+            cadastre_dataset = os.path.join(workspace, "Cadastre")
             if arcpy.Exists(cadastre_dataset):
                 arcpy.Delete_management(cadastre_dataset)
 
             spatial_ref = arcpy.Describe(os.path.join(mdb_path, self.parcel_layer_name)).spatialReference
-            arcpy.CreateFeatureDataset_management(mdb_path, "Cadastre", spatial_ref)
+            arcpy.CreateFeatureDataset_management(workspace, "Cadastre", spatial_ref)
 
             # Define the destination parcel feature class
             parcel_in_dataset = os.path.join(cadastre_dataset, "Parcel1")
@@ -79,19 +119,42 @@ class ParcelOverlapValidator(object):
             # Use CopyFeatures_management instead of FeatureClassToFeatureClass_conversion
             arcpy.CopyFeatures_management(os.path.join(mdb_path, "Parcel"), parcel_in_dataset)
 
-            print("[_prepare_feature_dataset] Feature dataset prepared for MDB: {}".format(mdb_path))
+            log.debug("[_prepare_feature_dataset] Feature dataset prepared for MDB: %s", mdb_path)
             return cadastre_dataset
 
         except Exception as e:
             self._update_status("Error preparing feature dataset: {}".format(str(e)))
-            print("[_prepare_feature_dataset] Error: {}".format(str(e)))
+            log.error("[_prepare_feature_dataset] Error: %s", e)
             return None
 
-    def _create_topology(self, mdb_path):
-        """Create topology and find overlap errors"""
+    def _open_snapshot(self, mdb_path):
+        """Create the file geodatabase the topology of one MDB is built in, instead of the MDB.
+
+        It is a scratch geodatabase of this process, or with keep_topology one named after
+        the MDB in the output folder, which is kept.
+        """
+        if self.keep_topology:
+            folder = self.output_folder
+            name = "{}_Topology.gdb".format(os.path.splitext(os.path.basename(mdb_path))[0])
+        else:
+            folder, name = _scratch_folder(), "snapshot.gdb"
+        snapshot = os.path.join(folder, name)
+        if arcpy.Exists(snapshot):
+            arcpy.Delete_management(snapshot)
+        arcpy.CreateFileGDB_management(folder, name)
+        log.debug("[_open_snapshot] Building the topology of %s in %s", mdb_path, snapshot)
+        return snapshot
+
+    def _close_snapshot(self, snapshot):
+        """Drop a snapshot geodatabase and everything in it with one delete (unless keep_topology)"""
+        if not self.keep_topology and arcpy.Exists(snapshot):
+            arcpy.Delete_management(snapshot)
+
+    def _create_topology(self, mdb_path, workspace):
+        """Create the topology of the MDB's parcels in workspace and export its errors"""
         try:
             # Prepare feature dataset
-            cadastre_dataset = self._prepare_feature_dataset(mdb_path)
+            cadastre_dataset = self._prepare_feature_dataset(mdb_path, workspace)
             if not cadastre_dataset:
                 return None
 
@@ -120,197 +183,387 @@ class ParcelOverlapValidator(object):
             error_fc = os.path.join(cadastre_dataset, "temp_overlap_errors")
             arcpy.ExportTopologyErrors_management(topology, cadastre_dataset, "temp_overlap_errors")
 
-            print("[_create_topology] Topology created and errors exported for MDB: {}".format(mdb_path))
+            log.debug("[_create_topology] Topology created and errors exported for MDB: %s", mdb_path)
             return error_fc + "_poly"  # ArcGIS appends _poly to the output
 
         except arcpy.ExecuteError:
             self._update_status("Topology Error: {}".format(arcpy.GetMessages(2)))
-            print("[_create_topology] Topology Error: {}".format(arcpy.GetMessages(2)))
-            return None
+            log.error("[_create_topology] Topology Error: %s", arcpy.GetMessages(2))
+            raise
         except Exception as e:
             self._update_status("Topology Creation Error: {}".format(str(e)))
-            print("[_create_topology] Error: {}".format(str(e)))
-            return None
-
-    def _generate_outputs(self, mdb_path, error_fc):
-        """Generate both CSV report and SHP file from topology errors"""
-        try:
-            # Create output directory for this MDB
-            file_path = mdb_path
-            base_name = os.path.splitext(os.path.basename(mdb_path))[0]
-            # Clean the base_name to remove invalid characters
-            valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-            clean_base_name = ''.join(c for c in base_name if c in valid_chars)
-            clean_base_name = clean_base_name.replace(' ', '_')  # Replace spaces with underscores
-
-            mdb_output_folder = os.path.join(self.output_folder, base_name)
-
-            # Clean up existing output folder if it exists
-            if os.path.exists(mdb_output_folder):
-                self._update_status(" Cleaning up existing output folder...")
-                for root, dirs, files in os.walk(mdb_output_folder, topdown=False):
-                    for name in files:
-                        try:
-                            os.remove(os.path.join(root, name))
-                        except Exception as e:
-                            self._update_status("    Failed to delete file {}: {}".format(name, str(e)))
-                            print("[_generate_outputs] Failed to delete file {}: {}".format(name, str(e)))
-                    for name in dirs:
-                        try:
-                            os.rmdir(os.path.join(root, name))
-                        except Exception as e:
-                            self._update_status("    Failed to delete directory {}: {}".format(name, str(e)))
-                            print("[_generate_outputs] Failed to delete directory {}: {}".format(name, str(e)))
-                try:
-                    os.rmdir(mdb_output_folder)
-                except Exception as e:
-                    self._update_status("  Failed to delete output folder: {}".format(str(e)))
-                    print("[_generate_outputs] Failed to delete output folder: {}".format(str(e)))
-                    return None, None, 0
-
-            # Create fresh output folder
-            if not os.path.exists(mdb_output_folder):
-                os.makedirs(mdb_output_folder)
-
-            csv_path = os.path.join(mdb_output_folder,
-                                    "{}_Overlaps.csv".format(clean_base_name))
-            shp_path = os.path.join(mdb_output_folder,
-                                    "{}_Overlaps.shp".format(clean_base_name))
-
-            # Get original parcel attributes
-            parcel_data = {}
-            parcel1 = os.path.join(file_path, "Cadastre", "Parcel1")
-            fields = [f.name for f in arcpy.ListFields(parcel1)
-                      if f.type not in ['Geometry', 'OID'] and not f.name.startswith(('Shape_', 'OBJECTID'))]
-
-            with arcpy.da.SearchCursor(parcel1, ["OID@"] + fields) as cursor:
+            log.error("[_create_topology] Error: %s", e)
+            raise
+
+    def _prepare_output_folder(self, mdb_path):
+        """Create a fresh output folder for an MDB and return it with the base name of its outputs"""
+        base_name = os.path.splitext(os.path.basename(mdb_path))[0]
+        # Clean the base_name to remove invalid characters
+        valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
+        clean_base_name = ''.join(c for c in base_name if c in valid_chars)
+        clean_base_name = clean_base_name.replace(' ', '_')  # Replace spaces with underscores
+
+        mdb_output_folder = os.path.join(self.output_folder, base_name)
+
+        # Clean up existing output folder if it exists
+        if os.path.exists(mdb_output_folder):
+            self._update_status(" Cleaning up existing output folder...")
+            for root, dirs, files in os.walk(mdb_output_folder, topdown=False):
+                for name in files:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except Exception as e:
+                        self._update_status("    Failed to delete file {}: {}".format(name, str(e)))
+                        log.error("[_generate_outputs] Failed to delete file %s: %s", name, e)
+                for name in dirs:
+                    try:
+                        os.rmdir(os.path.join(root, name))
+                    except Exception as e:
+                        self._update_status("    Failed to delete directory {}: {}".format(name, str(e)))
+                        log.error("[_generate_outputs] Failed to delete directory %s: %s", name, e)
+            try:
+                os.rmdir(mdb_output_folder)
+            except Exception as e:
+                self._update_status("  Failed to delete output folder: {}".format(str(e)))
+                log.error("[_generate_outputs] Failed to delete output folder: %s", e)
+                return None, None
+
+        # Create fresh output folder
+        if not os.path.exists(mdb_output_folder):
+            os.makedirs(mdb_output_folder)
+        return mdb_output_folder, clean_base_name
+
+    def _output_paths(self, mdb_output_folder, base_name, kind):
+        """(report path, shp_path) of one kind of error ("Overlaps", "Gaps") of an MDB"""
+        csv_path = report_path(os.path.join(mdb_output_folder, "{}_{}.csv".format(base_name, kind)))
+        shp_path = os.path.join(mdb_output_folder, "{}_{}.shp".format(base_name, kind))
+        return csv_path, shp_path
+
+    def _remove_outputs(self, csv_path, shp_path):
+        """Delete a report and its shapefile (with the shapefile's side files)"""
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+        if arcpy.Exists(shp_path):
+            arcpy.Delete_management(shp_path)
+
+    def _read_parcel_attributes(self, parcel_fc, oids):
+        """Return (attribute field names, {oid: attribute values}) of the parcels of parcel_fc with these OIDs"""
+        parcel_data = {}
+        fields = [f.name for f in arcpy.ListFields(parcel_fc)
+                  if f.type not in ['Geometry', 'OID'] and not f.name.startswith(('Shape_', 'OBJECTID'))]
+
+        oids = sorted(oids)
+        if not oids:
+            return fields, parcel_data
+        oid_field = arcpy.AddFieldDelimiters(parcel_fc, arcpy.Describe(parcel_fc).OIDFieldName)
+        for start in range(0, len(oids), OID_BATCH):
+            where = "{} IN ({})".format(oid_field, ", ".join(str(oid) for oid in oids[start:start + OID_BATCH]))
+            with arcpy.da.SearchCursor(parcel_fc, ["OID@"] + fields, where) as cursor:
                 for row in cursor:
                     parcel_data[row[0]] = row[1:]
+        return fields, parcel_data
+
+    def _write_overlaps_csv(self, csv_path, mdb_path, parcel_fc, errors):
+        """Write the (origin_oid, dest_oid, overlap_area) errors with both parcels' attributes.
+
+        Only the parcels named in errors are read from parcel_fc.
+        """
+        errors = [(origin_oid, dest_oid, overlap_area) for origin_oid, dest_oid, overlap_area in errors
+                  if origin_oid != dest_oid]
+        fields, parcel_data = self._read_parcel_attributes(
+            parcel_fc, set(oid for origin_oid, dest_oid, _ in errors for oid in (origin_oid, dest_oid) if oid))
+
+        header = [
+                     "Overlap_ID", "Source_MDB", "Parcel_Layer",
+                     "Parcel1_ID", "Parcel2_ID", "Overlap_Area_SQM"
+                 ] + ["Parcel1_" + f for f in fields] + ["Parcel2_" + f for f in fields]
+        with open_report(csv_path, header) as writer:
+            # Process errors
+            overlap_count = 0
+            for origin_oid, dest_oid, overlap_area in errors:
+                # Skip pairs with a parcel that is not in the layer (e.g. gap errors)
+                if origin_oid not in parcel_data or dest_oid not in parcel_data:
+                    continue
 
+                # Write record
+                writer.writerow(
+                    [overlap_count + 1, os.path.basename(mdb_path), self.parcel_layer_name,
+                     origin_oid, dest_oid, overlap_area] +
+                    list(parcel_data[origin_oid]) +
+                    list(parcel_data[dest_oid])
+                )
+                overlap_count += 1
+        return overlap_count
+
+    def _generate_outputs(self, mdb_path, error_fc, workspace, csv_path, shp_path):
+        """Generate both the overlap report and SHP file from topology errors; return the overlap count"""
+        try:
             # Export SHP file
             arcpy.CopyFeatures_management(error_fc, shp_path)
 
-            # Prepare to read topology errors for CSV
+            # Read topology errors, then the attributes of just the parcels they name. Gaps are
+            # line errors, so the polygon errors are overlaps; gaps come from _check_gaps.
             error_fields = ["OriginObjectID", "DestinationObjectID", "Shape_Area"]
+            with arcpy.da.SearchCursor(error_fc, error_fields) as cursor:
+                errors = [tuple(row) for row in cursor]
+            overlap_count = self._write_overlaps_csv(csv_path, mdb_path,
+                                                     os.path.join(workspace, "Cadastre", "Parcel1"), errors)
 
-            with open(csv_path, 'wb') as csvfile:
-                writer = csv.writer(csvfile)
-
-                # Write header
-                header = [
-                             "Overlap_ID", "Source_MDB", "Parcel_Layer",
-                             "Parcel1_ID", "Parcel2_ID", "Overlap_Area_SQM"
-                         ] + ["Parcel1_" + f for f in fields] + ["Parcel2_" + f for f in fields]
-                writer.writerow(header)
-
-                # Process errors
-                overlap_count = 0
-                with arcpy.da.SearchCursor(error_fc, error_fields) as cursor:
-                    for origin_oid, dest_oid, overlap_area in cursor:
-                        # Skip invalid pairs
-                        if origin_oid == dest_oid or origin_oid not in parcel_data or dest_oid not in parcel_data:
-                            continue
-
-                        # Get attributes for both parcels
-                        attrs1 = parcel_data.get(origin_oid, [None] * len(fields))
-                        attrs2 = parcel_data.get(dest_oid, [None] * len(fields))
-
-                        # Write record
-                        writer.writerow(
-                            [overlap_count + 1, os.path.basename(mdb_path), self.parcel_layer_name,
-                             origin_oid, dest_oid, overlap_area] +
-                            list(attrs1) +
-                            list(attrs2)
-                        )
-                        overlap_count += 1
-
-            print("[_generate_outputs] Generated outputs for MDB: {}".format(mdb_path))
+            log.debug("[_generate_outputs] Generated outputs for MDB: %s", mdb_path)
             # Clean up temporary feature class
             #arcpy.Delete_management(error_fc)
 
-            # Only delete cadastre dataset if keep_topology is False
-            if not self.keep_topology:
+            # Only delete cadastre dataset if keep_topology is False (a snapshot is dropped as a whole)
+            if self.keep_topology:
+                self._update_status("  Keeping topology layer as requested")
+            elif workspace == mdb_path:
                 cadastre_dataset = os.path.join(mdb_path, "Cadastre")
                 if arcpy.Exists(cadastre_dataset):
                     arcpy.Delete_management(cadastre_dataset)
-            else:
-                self._update_status("  Keeping topology layer as requested")
 
-            return csv_path, shp_path, overlap_count
+            return overlap_count
 
         except Exception as e:
             self._update_status("Output Generation Error: {}".format(str(e)))
-            print("[_generate_outputs] Error: {}".format(str(e)))
-            return None, None, 0
+            log.error("[_generate_outputs] Error: %s", e)
+            # Reported as this MDB's failure, not as 0 overlaps
+            raise
+
+    def _write_overlaps_shapefile(self, shp_path, overlaps, spatial_ref):
+        """Write overlap polygons with their origin/destination parcel IDs to a new shapefile"""
+        out_folder, out_name = os.path.split(shp_path)
+        arcpy.CreateFeatureclass_management(out_folder, out_name, "POLYGON", spatial_reference=spatial_ref)
+        arcpy.AddField_management(shp_path, "OriginOID", "LONG")
+        arcpy.AddField_management(shp_path, "DestOID", "LONG")
+        arcpy.AddField_management(shp_path, "RuleDesc", "TEXT", field_length=50)
+        with arcpy.da.InsertCursor(shp_path, ["SHAPE@", "OriginOID", "DestOID", "RuleDesc"]) as cursor:
+            for origin_oid, dest_oid, overlap in overlaps:
+                cursor.insertRow([overlap, origin_oid, dest_oid, "Must Not Overlap"])
+
+    def _write_gaps_shapefile(self, shp_path, gaps, rows, spatial_ref):
+        """Write gap polygons with their ID, area, ward and neighbouring parcel OIDs to a new shapefile"""
+        out_folder, out_name = os.path.split(shp_path)
+        arcpy.CreateFeatureclass_management(out_folder, out_name, "POLYGON", spatial_reference=spatial_ref)
+        arcpy.AddField_management(shp_path, "GapID", "LONG")
+        arcpy.AddField_management(shp_path, "Area", "DOUBLE")
+        arcpy.AddField_management(shp_path, "Ward", "TEXT", field_length=50)
+        arcpy.AddField_management(shp_path, "Parcels", "TEXT", field_length=254)
+        with arcpy.da.InsertCursor(shp_path, ["SHAPE@", "GapID", "Area", "Ward", "Parcels"]) as cursor:
+            for gap, row in zip(gaps, rows):
+                cursor.insertRow([gap, row[0], row[3], "" if row[4] is None else str(row[4]), row[5][:254]])
+
+    def _check_in_memory(self, mdb_path, parcels, csv_path, shp_path):
+        """Find overlaps from geometries held in memory; the MDB is only read. Returns the overlap count."""
+        try:
+            parcel_fc = os.path.join(mdb_path, self.parcel_layer_name)
+            tolerance = parse_tolerance(self.cluster_tolerance)
 
-    def run_validation(self):
-        if not self.folder_path:
-            raise ValueError("Folder path not set")
+            with stage("find_overlaps"):
+                overlaps = find_overlaps(parcels, tolerance)
+            log.debug("[_check_in_memory] %s parcels, %s overlaps in MDB: %s", len(parcels), len(overlaps), mdb_path)
 
-        mdb_files = self._find_mdb_files()
-        if not mdb_files:
-            raise ValueError("No MDB files found in: {}".format(self.folder_path))
+            if not overlaps:
+                return 0
 
-        self._update_status(
-            "\nStarting parcel overlap validation using topology on {} MDB files...".format(len(mdb_files)))
-        self._update_status("Output folder: {}".format(self.output_folder))
-        self._update_status("Looking for layer: '{}'".format(self.parcel_layer_name))
+            self._write_overlaps_shapefile(shp_path, overlaps, arcpy.Describe(parcel_fc).spatialReference)
+            overlap_count = self._write_overlaps_csv(
+                csv_path, mdb_path, parcel_fc,
+                [(origin_oid, dest_oid, overlap.area) for origin_oid, dest_oid, overlap in overlaps])
+
+            log.debug("[_check_in_memory] Generated outputs for MDB: %s", mdb_path)
+            return overlap_count
+
+        except Exception as e:
+            self._update_status("In-memory Topology Error: {}".format(str(e)))
+            log.error("[_check_in_memory] Error: %s", e)
+            # Reported as this MDB's failure, not as 0 overlaps
+            raise
+
+    def _check_gaps(self, mdb_path, parcels, csv_path, shp_path):
+        """Write the gaps between the parcels of an MDB with their area, ward and neighbouring parcels.
+
+        A gap belongs to the ward most of its neighbours are in. Returns (gap count,
+        [(MDB file name, ward, gap count, gap area)] by ward).
+        """
+        try:
+            parcel_fc = os.path.join(mdb_path, self.parcel_layer_name)
+            tolerance = parse_tolerance(self.cluster_tolerance)
+
+            with stage("find_gaps"):
+                gaps = find_gaps(parcels, tolerance, self.min_gap_area or None)
+                neighbours = gap_neighbours(gaps, parcels, tolerance)
+            self._update_status("  Found {} gaps between parcels".format(len(gaps)))
+            log.debug("[_check_gaps] %s parcels, %s gaps in MDB: %s", len(parcels), len(gaps), mdb_path)
+            if not gaps:
+                return 0, []
+
+            # Parcel number and ward of just the parcels next to a gap
+            fields, parcel_data = self._read_parcel_attributes(
+                parcel_fc, set(oid for oids in neighbours for oid in oids))
+            number_index = fields.index(PARCEL_NUMBER_FIELD) if PARCEL_NUMBER_FIELD in fields else None
+            ward_index = fields.index(WARD_FIELD) if WARD_FIELD in fields else None
+
+            rows = []
+            wards = {}
+            for gap_id, (gap, oids) in enumerate(zip(gaps, neighbours), start=1):
+                attributes = [parcel_data[oid] for oid in oids if oid in parcel_data]
+                numbers = [values[number_index] for values in attributes] if number_index is not None else []
+                neighbour_wards = [values[ward_index] for values in attributes
+                                   if ward_index is not None and values[ward_index] is not None]
+                ward = _majority(neighbour_wards)
+                rows.append([gap_id, os.path.basename(mdb_path), self.parcel_layer_name, gap.area, ward,
+                             "; ".join(str(oid) for oid in oids),
+                             "; ".join(str(number) for number in numbers),
+                             "; ".join(str(value) for value in sorted(set(neighbour_wards)))])
+                count, area = wards.get(ward, (0, 0.0))
+                wards[ward] = (count + 1, area + gap.area)
+
+            header = ["Gap_ID", "Source_MDB", "Parcel_Layer", "Gap_Area_SQM", "Ward",
+                      "Neighbour_Parcel_IDs", "Neighbour_Parcel_Numbers", "Neighbour_Wards"]
+            with open_report(csv_path, header) as writer:
+                writer.writerows(rows)
+            self._write_gaps_shapefile(shp_path, gaps, rows, arcpy.Describe(parcel_fc).spatialReference)
+
+            log.debug("[_check_gaps] Generated gap outputs for MDB: %s", mdb_path)
+            return len(gaps), [(os.path.basename(mdb_path), ward, count, area)
+                               for ward, (count, area) in sorted(wards.items())]
+
+        except Exception as e:
+            self._update_status("Gap Check Error: {}".format(str(e)))
+            log.error("[_check_gaps] Error: %s", e)
+            # Reported as this MDB's failure, not as 0 gaps
+            raise
+
+    def prepare_validation(self):
+        if not self.folder_path:
+            raise ValueError("Folder path not set")
+        require_geoprocessing("[topology_check]")
 
         # Create main output folder if it doesn't exist
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
 
-        reports = []
-        shapefiles = []
-        total_overlaps = 0
+    def validate_mdb(self, mdb, writer=None):
+        """Run the topology and gap checks on one MDB.
 
-        for index, mdb in enumerate(mdb_files, start=1):
-            try:
-                self._update_status("\nProcessing: {}".format(os.path.basename(mdb)))
-                print("[topology_check] Processing ({}/{}) {}".format(index, len(mdb_files), mdb_files))
+        Returns (overlap csv_path, overlap_count, gap csv_path, gap_count, gaps by ward as _check_gaps gives them).
+        """
+        self._update_status("\nProcessing: {}".format(os.path.basename(mdb)))
 
-                # Check if parcel layer exists
-                feature_classes = self._get_feature_classes(mdb)
-                if self.parcel_layer_name not in feature_classes:
-                    self._update_status("  Layer '{}' not found - skipping".format(self.parcel_layer_name))
-                    continue
+        # Check if parcel layer exists
+        feature_classes = self._get_feature_classes(mdb)
+        if self.parcel_layer_name not in feature_classes:
+            self._update_status("  Layer '{}' not found - skipping".format(self.parcel_layer_name))
+            return None, 0, None, 0, []
 
-                # Create topology and find errors
-                error_fc = self._create_topology(mdb)
-                if not error_fc or not arcpy.Exists(error_fc):
-                    self._update_status("  No topology errors found")
-                    continue
+        mdb_output_folder, base_name = self._prepare_output_folder(mdb)
+        if not mdb_output_folder:
+            return None, 0, None, 0, []
+        csv_path, shp_path = self._output_paths(mdb_output_folder, base_name, "Overlaps")
+        gap_csv_path, gap_shp_path = self._output_paths(mdb_output_folder, base_name, "Gaps")
 
-                # Generate outputs
-                csv_path, shp_path, overlap_count = self._generate_outputs(mdb, error_fc)
-                total_overlaps += overlap_count
-
-                if overlap_count > 0:
-                    reports.append(csv_path)
-                    shapefiles.append(shp_path)
-                    self._update_status("  Found {} overlaps".format(overlap_count))
-                    self._update_status("  CSV report: {}".format(os.path.basename(csv_path)))
-                    self._update_status("  Shapefile: {}".format(os.path.basename(shp_path)))
-                else:
-                    self._update_status("  No overlapping parcels found")
-                    # Clean up empty outputs
-                    for f in [csv_path, shp_path]:
-                        if f and os.path.exists(f):
-                            os.remove(f)
+        try:
+            with stage("load_parcels"):
+                parcels = load_parcels(os.path.join(mdb, self.parcel_layer_name))
 
-            except Exception as e:
-                self._update_status("  Error processing {}: {}".format(os.path.basename(mdb), str(e)))
-                print("Error processing {}: {}".format(os.path.basename(mdb), str(e)))
+            if self.in_memory:
+                overlap_count = self._check_in_memory(mdb, parcels, csv_path, shp_path)
+            else:
+                # The MDB is only read when the topology is built in a snapshot
+                workspace = self._open_snapshot(mdb) if self.snapshot else mdb
+                try:
+                    # Create topology and find errors
+                    error_fc = self._create_topology(mdb, workspace)
+                    if not error_fc or not arcpy.Exists(error_fc):
+                        self._update_status("  No topology errors found")
+                        overlap_count = 0
+                    else:
+                        # Generate outputs
+                        overlap_count = self._generate_outputs(mdb, error_fc, workspace, csv_path, shp_path)
+                finally:
+                    if self.snapshot:
+                        self._close_snapshot(workspace)
+
+            gap_count, ward_gaps = self._check_gaps(mdb, parcels, gap_csv_path, gap_shp_path)
+        except Exception:
+            # A failed MDB leaves no partial reports behind
+            shutil.rmtree(mdb_output_folder, ignore_errors=True)
+            raise
+
+        if overlap_count > 0:
+            self._update_status("  Found {} overlaps".format(overlap_count))
+            self._update_status("  Report: {}".format(os.path.basename(csv_path)))
+            self._update_status("  Shapefile: {}".format(os.path.basename(shp_path)))
+        else:
+            self._update_status("  No overlapping parcels found")
+            # Clean up empty outputs
+            self._remove_outputs(csv_path, shp_path)
+            csv_path = None
+
+        if gap_count > 0:
+            self._update_status("  Gap report: {}".format(os.path.basename(gap_csv_path)))
+            self._update_status("  Gap shapefile: {}".format(os.path.basename(gap_shp_path)))
+        else:
+            self._remove_outputs(gap_csv_path, gap_shp_path)
+            gap_csv_path = None
+
+        if not os.listdir(mdb_output_folder):
+            os.rmdir(mdb_output_folder)
+        return csv_path, overlap_count, gap_csv_path, gap_count, ward_gaps
+
+    def finish_validation(self, mdb_files, results):
+        """Write the summary and the gaps per ward from the validate_mdb result of every MDB"""
+        reports = [csv_path for csv_path, overlap_count, gap_csv_path, gap_count, ward_gaps in results
+                   if overlap_count > 0]
+        gap_reports = [gap_csv_path for csv_path, overlap_count, gap_csv_path, gap_count, ward_gaps in results
+                       if gap_count > 0]
+        total_overlaps = sum(result[1] for result in results)
+        total_gaps = sum(result[3] for result in results)
+
+        ward_summary_path = os.path.join(self.output_folder, "{}_Gaps_By_Ward.csv".format(self.report_prefix))
+        with open_report(ward_summary_path, ["Source_MDB", "Ward", "Gap_Count", "Gap_Area_SQM"]) as writer:
+            for csv_path, overlap_count, gap_csv_path, gap_count, ward_gaps in results:
+                writer.writerows(ward_gaps)
 
-        # Create summary
         summary_path = os.path.join(self.output_folder, "{}_Summary.txt".format(self.report_prefix))
         with open(summary_path, 'w') as f:
             f.write("Parcel Overlap Validation Summary\n")
             f.write("Processed {} MDB files\n".format(len(mdb_files)))
             f.write("Found {} overlaps\n".format(total_overlaps))
+            f.write("Found {} gaps\n".format(total_gaps))
             f.write("Reports generated at:\n")
-            for report in reports:
+            for report in reports + gap_reports:
                 f.write("{}\n".format(report))
+            f.write("Gaps by ward: {}\n".format(writer.path))
+
+        self._update_status("Validation complete. Summary report: {}".format(summary_path), logging.INFO)
+        log.info("[topology_check] Validation complete. Summary report generated.")
+
+    def run_validation(self):
+        self.prepare_validation()
+
+        mdb_files = find_mdb_files(self.folder_path)
+        log.info("[topology_check] Found %s MDB files", len(mdb_files))
+        if not mdb_files:
+            raise ValueError("No MDB files found in: {}".format(self.folder_path))
+
+        self._update_status(
+            "\nStarting parcel overlap validation using topology on {} MDB files...".format(len(mdb_files)),
+            logging.INFO)
+        self._update_status("Output folder: {}".format(self.output_folder), logging.INFO)
+        self._update_status("Looking for layer: '{}'".format(self.parcel_layer_name), logging.INFO)
+
+        results = []
+        self.failures = []
+        for index, mdb in enumerate(mdb_files, start=1):
+            try:
+                mdb_progress(index, len(mdb_files), mdb)
+                log.debug("[topology_check] Processing (%s/%s) %s", index, len(mdb_files), mdb)
+                results.append(self.validate_mdb(mdb))
+
+            except Exception as e:
+                self._update_status("  Error processing {}: {}".format(os.path.basename(mdb), str(e)))
+                log.error("Error processing %s: %s", os.path.basename(mdb), e)
+                self.failures.append((mdb, self.__class__.__name__, str(e)))
 
-        self._update_status("Validation complete. Summary report: {}".format(summary_path))
-        print("[topology_check] Validation complete. Summary report generated.")
+        self.finish_validation(mdb_files, results)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from backends import arcpy
+from spatial_index import GridIndex
+from progress import rows_scanned
+
+
+def parse_tolerance(tolerance, default=0.001):
+    """Cluster tolerance in map units from 0.001, "0.001 Meters" or "1 Meter" """
+    if isinstance(tolerance, (int, float)):
+        return float(tolerance)
+    try:
+        return float(str(tolerance).split()[0])
+    except (ValueError, IndexError):
+        return default
+
+
+def extent_box(shape):
+    extent = shape.extent
+    return extent.XMin, extent.YMin, extent.XMax, extent.YMax
+
+
+def load_parcels(full_path):
+    """{oid: polygon} of a parcel feature class, read straight from the source without copying it"""
+    parcels = {}
+    rows = 0
+    with arcpy.da.SearchCursor(full_path, ["OID@", "SHAPE@"]) as cursor:
+        for oid, shape in cursor:
+            rows += 1
+            if shape is not None and shape.area > 0:
+                parcels[oid] = shape
+    rows_scanned(rows)
+    return parcels
+
+
+def find_overlaps(parcels, tolerance):
+    """(oid1, oid2, overlap polygon) for every parcel pair sharing area ("Must Not Overlap").
+
+    Pairs come from a bounding-box grid, so only parcels whose extents meet are
+    intersected. Overlaps no larger than tolerance squared are the slivers a
+    topology would have snapped away and are ignored.
+    """
+    index = GridIndex.for_boxes((oid, extent_box(shape)) for oid, shape in parcels.items())
+    min_area = tolerance * tolerance
+    overlaps = []
+    for oid1, oid2 in index.candidate_pairs():
+        shape1 = parcels[oid1]
+        shape2 = parcels[oid2]
+        if shape1.disjoint(shape2) or shape1.touches(shape2):
+            continue
+        overlap = shape1.intersect(shape2, 4)
+        if overlap is not None and overlap.area > min_area:
+            overlaps.append((oid1, oid2, overlap))
+    return overlaps
+
+
+def dissolve(shapes):
+    """Union of polygons, merged pairwise in rounds so no single union grows one parcel at a time"""
+    shapes = list(shapes)
+    while len(shapes) > 1:
+        merged = [shapes[i].union(shapes[i + 1]) for i in range(0, len(shapes) - 1, 2)]
+        if len(shapes) % 2:
+            merged.append(shapes[-1])
+        shapes = merged
+    return shapes[0] if shapes else None
+
+
+def _rings(part):
+    """Split a polygon part (points with None between rings) into its rings"""
+    rings = [[]]
+    for point in part:
+        if point is None:
+            rings.append([])
+        else:
+            rings[-1].append(point)
+    return [ring for ring in rings if ring]
+
+
+def _box_within(inner, outer):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def find_gaps(parcels, tolerance, min_area=None):
+    """Polygons of the holes enclosed by the parcel fabric ("Must Not Have Gaps").
+
+    The parcels are dissolved with a cascaded union; what lies inside the outer boundary
+    of the union but outside the union itself is gap. That is every interior ring of the
+    union, less any other part of the fabric (an island of parcels) standing in it. The
+    outside of the fabric is not a gap. Gaps no larger than min_area (tolerance squared
+    by default) are dropped.
+    """
+    if not parcels:
+        return []
+    # Neighbours next to each other in the merge order keep the partial unions compact
+    cell = GridIndex.for_boxes((oid, extent_box(shape)) for oid, shape in parcels.items()).cell_size
+    order = sorted(parcels, key=lambda oid: (int(parcels[oid].extent.YMin // cell), parcels[oid].extent.XMin))
+    fabric = dissolve(parcels[oid] for oid in order)
+
+    if min_area is None:
+        min_area = tolerance * tolerance
+    parts = [_rings(fabric.getPart(part_index)) for part_index in range(fabric.partCount)]
+    part_boxes = [(min(point.X for point in rings[0]), min(point.Y for point in rings[0]),
+                   max(point.X for point in rings[0]), max(point.Y for point in rings[0])) for rings in parts]
+    gaps = []
+    for part_index, rings in enumerate(parts):
+        for ring in rings[1:]:
+            gap = arcpy.Polygon(arcpy.Array(ring), fabric.spatialReference)
+            box = extent_box(gap)
+            # Only a hole with another part of the fabric (an island of parcels) in it needs the difference
+            if any(_box_within(other, box) for index, other in enumerate(part_boxes) if index != part_index):
+                gap = gap.difference(fabric)
+            if gap.area > min_area:
+                gaps.append(gap)
+    return gaps
+
+
+def gap_neighbours(gaps, parcels, tolerance):
+    """For every gap, the sorted OIDs of the parcels within tolerance of it"""
+    index = GridIndex.for_boxes((oid, extent_box(shape)) for oid, shape in parcels.items())
+    neighbours = []
+    for gap in gaps:
+        xmin, ymin, xmax, ymax = extent_box(gap)
+        box = (xmin - tolerance, ymin - tolerance, xmax + tolerance, ymax + tolerance)
+        neighbours.append(sorted(oid for oid in index.query(box) if parcels[oid].distanceTo(gap) <= tolerance))
+    return neighbours
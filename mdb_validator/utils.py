@@ -1,33 +1,81 @@
 # -*- coding: utf-8 -*-
-import os
-import arcpy
+from catalog import active_catalog
+from column_cache import active_column_cache
+from backends import get_backend
+from progress import stage
+from profiling import timed_cursor
+from scanner import find_files
 
 
-def find_mdb_files(directory, exception=["merged"]):
-    """Find all .mdb files in directory, excluding those in exception folders"""
-    mdb_files = []
-    for root, dirnames, filenames in os.walk(directory):
-        if any(x in root.lower() for x in exception):
-            continue
-        dirnames[:] = [d for d in dirnames if not any(x in os.path.join(root, d).lower() for x in exception)]
-        for filename in filenames:
-            if filename.lower().endswith('.mdb') and not any(
-                    x in os.path.join(root, filename).lower() for x in exception):
-                mdb_files.append(os.path.join(root, filename))
-    return mdb_files
+def find_mdb_files(directory):
+    """Sorted .mdb files (or the active backend's files) under directory, scanned once per job (see scanner)"""
+    with stage("find_mdb_files"):
+        return find_files(directory, get_backend().file_extensions)
 
 
 def get_feature_classes(mdb_path, fc_names):
-    """Get full paths to feature classes in an MDB"""
-    arcpy.env.workspace = mdb_path
-    feature_classes = []
-
-    datasets = arcpy.ListDatasets() or [""]
-    for dataset in datasets:
-        arcpy.env.workspace = os.path.join(mdb_path, dataset) if dataset else mdb_path
-        for fc in arcpy.ListFeatureClasses():
-            if fc in fc_names:
-                full_path = os.path.join(mdb_path, dataset, fc) if dataset else os.path.join(mdb_path, fc)
-                feature_classes.append((fc, full_path))
-
-    return feature_classes
\ No newline at end of file
+    """Get full paths to feature classes in an MDB.
+
+    Like ListDatasets() or [""]: an MDB with feature datasets is read from those only,
+    one without from its root.
+    """
+    catalog = active_catalog()
+    with stage("list_feature_classes"):
+        entries = catalog.describe_mdb(mdb_path) if catalog else get_backend().list_feature_classes(mdb_path)
+    in_datasets = any(entry["dataset"] for entry in entries)
+    return [(entry["name"], entry["path"]) for entry in entries
+            if entry["name"] in fc_names and bool(entry["dataset"]) == in_datasets]
+
+
+def describe_feature_class(full_path):
+    """Get (shape type, field names) of a feature class, from the MDB catalog when one is open"""
+    catalog = active_catalog()
+    with stage("describe"):
+        entry = catalog.describe_feature_class(full_path) if catalog else None
+        if entry is None:
+            entry = get_backend().describe(full_path)
+    return entry["shape_type"], [name for name, field_type in entry["fields"]]
+
+
+def get_row_count(full_path):
+    """Get the number of rows in a feature class, from the MDB catalog when one is open"""
+    catalog = active_catalog()
+    entry = catalog.describe_feature_class(full_path) if catalog else None
+    if entry is None:
+        entry = get_backend().describe(full_path)
+    return entry["row_count"]
+
+
+def get_extent(full_path):
+    """Get (xmin, ymin, xmax, ymax) of a feature class, from the MDB catalog when one is open"""
+    catalog = active_catalog()
+    entry = catalog.describe_feature_class(full_path) if catalog else None
+    if not (entry and entry.get("extent")):
+        entry = get_backend().describe(full_path)
+    return tuple(entry["extent"])
+
+
+def search_cursor(full_path, fields):
+    """Read-only cursor over a feature class on the active backend (arcpy.da.SearchCursor semantics)"""
+    return timed_cursor(get_backend().search_cursor(full_path, fields))
+
+
+def _read_source_columns(full_path, fields):
+    catalog = active_catalog()
+    entry = catalog.describe_feature_class(full_path) if catalog else None
+    field_types = dict(entry["fields"]) if entry else None
+    return get_backend().read_columns(full_path, fields, field_types)
+
+
+def read_columns(full_path, fields):
+    """Read the given fields as one NumPy masked array per field (nulls masked).
+
+    Key Parcel columns come memory-mapped from the column cache when one is open.
+    """
+    cache = active_column_cache()
+    with stage("read_columns"):
+        if cache:
+            columns = cache.read_columns(full_path, fields, _read_source_columns, describe_feature_class)
+            if columns is not None:
+                return columns
+        return _read_source_columns(full_path, fields)